@@ -0,0 +1,129 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
+# 同時実行数の制限（アドミッションコントロール）
+# /api/chatはリクエストごとにCLIプロセスを使うので、無制限に受け付けると
+# アクセス集中時にプロセスが増え続けてメモリが尽きる
+# 同時実行数を超えた分は上限付きのキューで待たせ、あふれたら429、
+# 待ち時間の期限を過ぎたら503を返して、負荷が高いときも予測可能に劣化させる
+
+
+class AdmissionRejected(Exception):
+    """受け付けできなかったときの例外（HTTPのステータスとRetry-Afterを持つ）"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+        super().__init__(detail)
+
+
+class AdmissionController:
+    """同時実行数の上限 + 待ちキュー
+
+    - max_concurrent: 同時に処理するリクエスト数
+    - max_queue: 処理待ちで待たせるリクエスト数の上限（超えたら429）
+    - queue_timeout: キューで待てる秒数（超えたら503）
+    - retry_after: 拒否したときにRetry-Afterで返す秒数
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        max_queue: int = 32,
+        queue_timeout: float = 30.0,
+        retry_after: int = 5,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for w in self._waiters if not w.done())
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected_queue_full + self.rejected_timeout,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+    async def acquire(self) -> Callable[[], None]:
+        """実行枠を1つ取る。返り値の関数を呼ぶと枠を返す（何度呼んでも1回だけ返す）
+
+        Raises:
+            AdmissionRejected: キューが満杯（429）or 待ち時間切れ（503）
+        """
+        if self.in_flight < self.max_concurrent and not self.queued:
+            self.in_flight += 1
+        else:
+            await self._wait_in_queue()
+        self.admitted += 1
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._release()
+
+        return release
+
+    async def _wait_in_queue(self) -> None:
+        if self.queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(
+                429, "リクエストが多すぎます。しばらくしてから再度お試しください", self.retry_after
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # 枠が空くと_release()から結果がセットされる（in_flightはそのまま引き継ぐ）
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            raise AdmissionRejected(
+                503, "サーバーが混雑しています。しばらくしてから再度お試しください", self.retry_after
+            )
+        except asyncio.CancelledError:
+            # 枠を受け取った直後にキャンセルされた場合は、次の人に渡す
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _release(self) -> None:
+        # 待っている人がいれば枠をそのまま渡す
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        release = await self.acquire()
+        try:
+            yield
+        finally:
+            release()
@@ -1,10 +1,59 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from claude_code_sdk import query, ClaudeCodeOptions
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from sse_starlette.sse import EventSourceResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import UploadFile
+from claude_code_sdk import (
+    query,
+    AssistantMessage,
+    ClaudeCodeOptions,
+    ResultMessage,
+    StreamEvent,
+    SystemMessage,
+    TextBlock,
+    TextDelta,
+    ToolResultBlock,
+    ToolUseBlock,
+    UserMessage,
+)
+import anyio
+import asyncio
+import json
+import os
+import time
 import uuid
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
 from typing import Optional
 
+import chat_logging
+from admission import AdmissionController, AdmissionRejected
+from client_pool import ClaudeClientPool, SessionClientCache
+from job_queue import FAILED, SUCCEEDED, JobQueue, JobWorkerPool
+from request_log import RequestLogWriter
+from response_cache import cache_key, create_response_cache
+from singleflight import SingleFlight
+from chat_logging import begin_request, debug_enabled, logger, set_request_id, truncated
+from metrics import CONTENT_TYPE, Registry
+
+app = FastAPI(title="AI チャット API", description="Claude AIとのシンプルなチャット")
+
+SYSTEM_PROMPT = "あなたは親切なAIアシスタントです。質問に丁寧に答えてください。"
+MAX_TURNS = 10
+# トークン単位のストリーミング（/api/chat/streamで生成中のテキストを逐次送る）
+PARTIAL_MESSAGES = os.getenv("CHAT_PARTIAL_MESSAGES", "1") == "1"
+# CLIの実行ファイル（空ならPATHなどから探す）
+# CLAUDE_CLI_PATH=tools/fake_claude_cli.py でAPIを使わずに動かせる（負荷試験・ベンチマーク用）
+# 動作はFAKE_CLAUDE_SCENARIOのシナリオファイルで決まる（tools/scenarios/）
+CLI_PATH = os.getenv("CLAUDE_CLI_PATH") or None
+# CLIから読んだメッセージをメモリに溜めておく数と、それを超えたときの動作
+# spill: 超えた分は一時ファイルに書く / memory: 超えた分もメモリに溜める（上限なし）
+# どちらでもCLIの出力は読み続けるので、遅いクライアントで割り込みや権限確認が止まらない
+# 超えた分がCHAT_MESSAGE_OVERFLOW_LIMIT件に達したら、読むのをやめてエラーにする（0で無制限）
+MESSAGE_BUFFER_SIZE = int(os.getenv("CHAT_MESSAGE_BUFFER_SIZE", "100"))
+MESSAGE_OVERFLOW_POLICY = os.getenv("CHAT_MESSAGE_OVERFLOW_POLICY", "spill")
+MESSAGE_OVERFLOW_LIMIT = int(os.getenv("CHAT_MESSAGE_OVERFLOW_LIMIT", "10000")) or None
+
 # データモデル定義
 # FastAPIが：
 # 1.HTTPボディからJSONを読み取り
@@ -14,84 +63,987 @@ class ChatQuery(BaseModel):
     query: str
     request_id: Optional[str] = None # 個別のリクエストを追跡するため
     resume_session: Optional[str] = None  # セッションを再開するためのclaude codeが生成したid
+    timeout: Optional[float] = Field(None, gt=0)  # 秒。過ぎたら打ち切り、途中までの応答を返す（実行を始める前に過ぎたら504。X-Request-Timeoutヘッダーでも指定可）
+    no_cache: bool = False  # Trueならキャッシュを使わずに実行する（Cache-Control: no-cacheヘッダーでも指定可）
+
+def build_options() -> ClaudeCodeOptions:
+    """チャット用のClaudeCodeOptionsを作る（プールのプロセスもこの設定で起動する）"""
+    return ClaudeCodeOptions(
+        system_prompt=SYSTEM_PROMPT,
+        max_turns=MAX_TURNS,
+        include_partial_messages=PARTIAL_MESSAGES,
+        cli_path=CLI_PATH,
+        message_buffer_size=MESSAGE_BUFFER_SIZE,
+        message_overflow_policy=MESSAGE_OVERFLOW_POLICY,
+        message_overflow_limit=MESSAGE_OVERFLOW_LIMIT,
+    )
+
+# メトリクス（GET /metricsでPrometheusのテキスト形式）
+# 時間はすべて秒。first_message / first_text / requestはリクエストを受けた時点から測る（実行枠の待ち時間を含む）
+metrics = Registry()
+cli_spawn_seconds = metrics.histogram(
+    "chat_cli_spawn_seconds", "CLIプロセスの起動（SubprocessCLITransport.connect）にかかった時間")
+cli_initialize_seconds = metrics.histogram(
+    "chat_cli_initialize_seconds", "CLIの初期化（Query.initialize）にかかった時間")
+first_message_seconds = metrics.histogram(
+    "chat_first_message_seconds", "最初のメッセージを受け取るまでの時間", ["endpoint"])
+first_text_seconds = metrics.histogram(
+    "chat_first_text_seconds", "最初のテキストを受け取るまでの時間", ["endpoint"])
+request_seconds = metrics.histogram(
+    "chat_request_seconds", "リクエストの処理にかかった時間", ["endpoint"])
+requests_total = metrics.counter("chat_requests_total", "処理したリクエスト数", ["endpoint", "status"])
+tokens_total = metrics.counter(
+    "chat_tokens_total", "使ったトークン数（ResultMessage.usage。typeはinput / output / cache_read_inputなど）", ["type"])
+cost_usd_total = metrics.counter("chat_cost_usd_total", "コスト（ResultMessage.total_cost_usd）")
+
+def observe_spawn(pooled) -> None:
+    """プールやセッションキャッシュがCLIを起動したときの時間を記録する"""
+    stats = pooled.client.get_stats()
+    if stats["connect_duration"] is not None:
+        cli_spawn_seconds.observe(stats["connect_duration"])
+    if stats["initialize_duration"] is not None:
+        cli_initialize_seconds.observe(stats["initialize_duration"])
+
+# CLIプロセスのウォームプール
+# CLAUDE_POOL_MAX_SIZE=0 でプールを無効化（毎回query()でCLIを起動する）
+client_pool: Optional[ClaudeClientPool] = None
+if int(os.getenv("CLAUDE_POOL_MAX_SIZE", "4")) > 0:
+    client_pool = ClaudeClientPool(
+        build_options,
+        min_size=int(os.getenv("CLAUDE_POOL_MIN_SIZE", "1")),
+        max_size=int(os.getenv("CLAUDE_POOL_MAX_SIZE", "4")),
+        idle_timeout=float(os.getenv("CLAUDE_POOL_IDLE_TIMEOUT", "300")),
+        max_uses=int(os.getenv("CLAUDE_POOL_MAX_USES", "1")),
+        health_check_interval=float(os.getenv("CLAUDE_POOL_HEALTH_CHECK_INTERVAL", "10")),
+        on_spawn=observe_spawn,
+    )
+
+# セッションIDごとの起動済みプロセス（LRU）
+# CLAUDE_SESSION_CACHE_SIZE=0 で無効化（継続のたびに--resumeでCLIを起動する）
+session_cache: Optional[SessionClientCache] = None
+if int(os.getenv("CLAUDE_SESSION_CACHE_SIZE", "16")) > 0:
+    max_rss_mb = os.getenv("CLAUDE_SESSION_MAX_RSS_MB")
+    session_cache = SessionClientCache(
+        max_sessions=int(os.getenv("CLAUDE_SESSION_CACHE_SIZE", "16")),
+        idle_ttl=float(os.getenv("CLAUDE_SESSION_IDLE_TTL", "600")),
+        max_rss_bytes=int(max_rss_mb) * 1024 * 1024 if max_rss_mb else None,
+        reap_interval=float(os.getenv("CLAUDE_SESSION_REAP_INTERVAL", "30")),
+        on_spawn=observe_spawn,
+    )
+
+# 新規セッションの回答キャッシュ（同じ質問には同じ回答を返す）
+# CHAT_CACHE_BACKEND=memory / sqlite で有効化（デフォルトは無効）
+response_cache = create_response_cache(
+    os.getenv("CHAT_CACHE_BACKEND", ""),
+    path=os.getenv("CHAT_CACHE_PATH", "response_cache.sqlite3"),
+    ttl=float(os.getenv("CHAT_CACHE_TTL", "3600")),
+    max_bytes=int(os.getenv("CHAT_CACHE_MAX_MB", "64")) * 1024 * 1024,
+)
+
+# 同じ質問の実行中リクエストをまとめる（CHAT_COALESCE=1で有効）
+# 相乗りしたリクエストは同じ回答を受け取るが、セッションIDは最初のリクエストにだけ返す
+singleflight: Optional[SingleFlight] = SingleFlight() if os.getenv("CHAT_COALESCE", "0") == "1" else None
+
+# 1リクエストの制限時間（秒）のデフォルト。0で無制限
+# 時間切れになるとCLIをinterrupt→終了し、それまでの応答を返す
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", "600")) or None
+
+# クライアント切断の検知
+DISCONNECT_POLL_INTERVAL = float(os.getenv("CHAT_DISCONNECT_POLL_INTERVAL", "0.5"))
+INTERRUPT_GRACE = float(os.getenv("CHAT_INTERRUPT_GRACE", "5"))
+
+# 切断で中断した実行の件数
+# disconnected: 切断を検知した数 / interrupted: interruptで止めた数 / terminated: プロセスを終了した数
+cancel_stats = {"disconnected": 0, "interrupted": 0, "terminated": 0}
+
+# query()で起動して実行中のCLIプロセス数（プールとセッションキャッシュの外）
+oneshot_processes = {"running": 0}
+
+# 同時実行数の制限（超えた分はキューで待たせ、あふれたら429/503）
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("CHAT_MAX_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("CHAT_MAX_QUEUE", "32")),
+    queue_timeout=float(os.getenv("CHAT_QUEUE_TIMEOUT", "30")),
+    retry_after=int(os.getenv("CHAT_RETRY_AFTER", "5")),
+)
+
+# リクエストログ（1行1リクエストのJSONL。レイテンシ・コスト・トークン数・セッションID）
+# 書き込みはまとめてスレッドで行うので、リクエストの処理は待たない
+# CHAT_REQUEST_LOG_PATH= （空）で無効化
+request_log: Optional[RequestLogWriter] = None
+if os.getenv("CHAT_REQUEST_LOG_PATH", "logs/requests.jsonl"):
+    request_log = RequestLogWriter(
+        os.getenv("CHAT_REQUEST_LOG_PATH", "logs/requests.jsonl"),
+        flush_interval=float(os.getenv("CHAT_REQUEST_LOG_FLUSH_INTERVAL", "1")),
+        max_bytes=int(os.getenv("CHAT_REQUEST_LOG_MAX_MB", "100")) * 1024 * 1024,
+        max_age=float(os.getenv("CHAT_REQUEST_LOG_MAX_AGE", "86400")),
+        backup_count=int(os.getenv("CHAT_REQUEST_LOG_BACKUPS", "10")),
+        compress=os.getenv("CHAT_REQUEST_LOG_COMPRESS", "1") == "1",
+    )
+
+def record_request(endpoint: str, request_id: Optional[str], trace: dict, status: int,
+                   result: Optional[dict] = None, detail=None, **fields) -> None:
+    """1リクエストの結果をメトリクスとリクエストログに記録する
+
+    traceはrun_chatが埋める計測値（started_at, first_message_at, first_text_at, 最後のResultMessage）
+    相乗りした（coalesced）リクエストのコストは実行した側と同じ値なので、メトリクスには数えない
+    （リクエストログには残すので、集計では除くこと）
+    """
+    now = time.monotonic()
+    started_at = trace["started_at"]
+    message = trace.get("result")
+
+    requests_total.inc(endpoint=endpoint, status=status)
+    request_seconds.observe(now - started_at, endpoint=endpoint)
+    if "first_message_at" in trace:
+        first_message_seconds.observe(trace["first_message_at"] - started_at, endpoint=endpoint)
+    if "first_text_at" in trace:
+        first_text_seconds.observe(trace["first_text_at"] - started_at, endpoint=endpoint)
+    if message and not (result and result["coalesced"]):
+        for name, value in (message.usage or {}).items():
+            if name.endswith("_tokens") and isinstance(value, (int, float)):
+                tokens_total.inc(value, type=name[: -len("_tokens")])
+        if message.total_cost_usd:
+            cost_usd_total.inc(message.total_cost_usd)
+
+    if not request_log:
+        return
+    record = {
+        "ts": time.time(),
+        "endpoint": endpoint,
+        "request_id": request_id,
+        "status": status,
+        "session_id": result["session_id"] if result else (message.session_id if message else None),
+    }
+    if result:
+        for name in ("is_continuation", "timed_out", "is_error", "cached", "coalesced"):
+            record[name] = result[name]
+    record["latency_ms"] = round((now - started_at) * 1000, 1)
+    if "first_message_at" in trace:
+        record["first_message_ms"] = round((trace["first_message_at"] - started_at) * 1000, 1)
+    if "first_text_at" in trace:
+        record["first_text_ms"] = round((trace["first_text_at"] - started_at) * 1000, 1)
+    if message:
+        record.update({
+            "duration_ms": message.duration_ms,
+            "duration_api_ms": message.duration_api_ms,
+            "num_turns": message.num_turns,
+            "total_cost_usd": message.total_cost_usd,
+            "usage": message.usage,
+        })
+    if detail is not None:
+        record["detail"] = detail
+    record.update(fields)
+    request_log.log(record)
+
+async def admit():
+    """実行枠を取る。取れなければ429/503（Retry-After付き）を返す"""
+    try:
+        return await admission.acquire()
+    except AdmissionRejected as e:
+        logger.warning("リクエスト拒否: %s %s", e.status_code, e.detail)
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+@app.on_event("startup")
+async def start_client_pool():
+    chat_logging.start()
+    if client_pool:
+        await client_pool.start()
+    if session_cache:
+        await session_cache.start()
+    if job_workers:
+        await job_workers.start()
+    if request_log:
+        await request_log.start()
+
+@app.on_event("shutdown")
+async def stop_client_pool():
+    if session_cache:
+        await session_cache.stop()
+    if client_pool:
+        await client_pool.stop()
+    if job_workers:
+        await job_workers.stop()
+        job_workers.queue.close()
+    if response_cache:
+        response_cache.close()
+    if request_log:
+        await request_log.stop()
+    chat_logging.stop()
 
 # ヘルスチェックAPI
 # curl http://localhost:8002/health
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "admission": admission.stats(),
+        "cancelled": cancel_stats,
+        "pool": client_pool.stats() if client_pool else None,
+        "sessions": session_cache.stats() if session_cache else None,
+        "cache": response_cache.stats() if response_cache else None,
+        "coalescing": singleflight.stats() if singleflight else None,
+        "jobs": await job_workers.stats() if job_workers else None,
+        "request_log": request_log.stats() if request_log else None,
+        "logging": chat_logging.stats(),
+    }
+
+# 取得したときの値を返すメトリクス
+def cli_processes() -> dict:
+    counts = {("oneshot",): oneshot_processes["running"]}
+    if client_pool:
+        stats = client_pool.stats()
+        counts[("pool_idle",)] = stats["idle"]
+        counts[("pool_leased",)] = stats["leased"]
+        counts[("pool_spawning",)] = stats["spawning"]
+    if session_cache:
+        counts[("session",)] = session_cache.stats()["sessions"]
+    return counts
+
+def live_clients() -> list:
+    return (client_pool.clients() if client_pool else []) + (session_cache.clients() if session_cache else [])
+
+def message_backlog() -> int:
+    """起動済みプロセスのQueryで、CLIから読んだがまだ受け取っていないメッセージ数の合計"""
+    return sum(pooled.client.get_stats()["message_backlog"] for pooled in live_clients())
+
+def message_backlog_high_water() -> int:
+    """起動済みプロセスのうち、メッセージが最も溜まったときの数"""
+    return max((pooled.client.get_stats()["message_backlog_high_water"] for pooled in live_clients()), default=0)
+
+def spill_bytes() -> int:
+    """一時ファイルに書いて、まだ読み出していないメッセージのバイト数の合計"""
+    return sum(pooled.client.get_stats()["spill_bytes"] for pooled in live_clients())
+
+def write_queue_depth() -> int:
+    """起動済みプロセスのQueryで、CLIのstdinへの書き込みを待っているメッセージ数の合計"""
+    return sum(pooled.client.get_stats()["write_queue_depth"] for pooled in live_clients())
+
+metrics.gauge("chat_cli_processes", "CLIプロセス数（ownerは管理しているところ）", ["owner"], function=cli_processes)
+metrics.gauge("chat_admission_in_flight", "実行中のリクエスト数", function=lambda: admission.stats()["in_flight"])
+metrics.gauge("chat_admission_queued", "実行枠を待っているリクエスト数", function=lambda: admission.stats()["queued"])
+# ジョブ数はsqliteで数える（スレッドで行う）ので、/metricsのたびにset()する
+chat_jobs = metrics.gauge("chat_jobs", "状態ごとのジョブ数", ["status"])
+metrics.gauge("chat_message_backlog", "Queryのメッセージバッファに溜まっているメッセージ数", function=message_backlog)
+metrics.gauge("chat_message_backlog_high_water", "メッセージが最も溜まったときの数（プロセスごとの最大）", function=message_backlog_high_water)
+metrics.gauge("chat_message_spill_bytes", "一時ファイルに溜まっているメッセージのバイト数", function=spill_bytes)
+metrics.gauge("chat_write_queue_depth", "CLIへの書き込みを待っているメッセージ数", function=write_queue_depth)
+
+# メトリクスAPI（Prometheusのテキスト形式）
+# curl http://localhost:8002/metrics
+@app.get("/metrics")
+async def get_metrics():
+    if job_workers:
+        for status, count in (await job_workers.queue.stats()).items():
+            chat_jobs.set(count, status=status)
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+async def receive_chat_messages(prompt: str, options: ClaudeCodeOptions, message_types=None):
+    """CLIにpromptを送り、ResultMessageまでのメッセージを順に返す
+
+    message_typesを指定すると、それ以外のメッセージはパースせずに捨てる
+    （メッセージはcontentにアクセスするまでブロックを組み立てない遅延パース）
+
+    新規セッションはプールの起動済みプロセスを使い、会話後はそのプロセスを
+    セッションキャッシュに移して次のターンに備える
+    セッション継続はキャッシュにあるプロセスへそのまま送り、なければ--resumeで起動する
+    キャッシュやプールが無効な場合はquery()でCLIを起動する
+
+    制限時間（options.timeout）はここから数える。プロセスの順番待ちや起動で
+    使った分を引いた残りをSDKに渡し、ターンを始める前に過ぎたら504にする
+    """
+    expires_at = None if options.timeout is None else time.monotonic() + options.timeout
+
+    def remaining() -> Optional[float]:
+        return None if expires_at is None else max(0.0, expires_at - time.monotonic())
+
+    if options.resume and session_cache:
+        async with lease_within(session_cache.lease(options.resume, lambda: options), remaining()) as pooled:
+            await pooled.client.query(prompt, timeout=remaining())
+            try:
+                async for message in pooled.client.receive_response(message_types, lazy=True):
+                    yield message
+            except asyncio.CancelledError:
+                # クライアント切断・時間切れ: interruptでターンだけ止めて、セッションのプロセスは残す
+                # キャンセル中のスコープでawaitするとすぐにキャンセルし直されるので、保護して止める
+                stopped = False
+                with anyio.CancelScope(shield=True):
+                    with anyio.move_on_after(INTERRUPT_GRACE + 1):
+                        stopped = await pooled.stop_turn(INTERRUPT_GRACE)
+                if stopped:
+                    cancel_stats["interrupted"] += 1
+                else:
+                    pooled.broken = True
+                    cancel_stats["terminated"] += 1
+                raise
+        return
+
+    if client_pool and not options.resume:
+        async with lease_within(client_pool.lease(), remaining()) as pooled:
+            await pooled.client.query(prompt, timeout=remaining())
+            session_id = None
+            try:
+                async for message in pooled.client.receive_response(message_types, lazy=True):
+                    if isinstance(message, ResultMessage):
+                        session_id = message.session_id
+                    yield message
+            except asyncio.CancelledError:
+                # クライアント切断: セッションIDを受け取る相手がいないので、プロセスごと終了する
+                cancel_stats["terminated"] += 1
+                raise
+            # 会話を終えたプロセスはプールに戻さず、セッションIDで保持する
+            # （時間切れで終了させたプロセスは保持しない。次回は--resumeで起動し直す）
+            if session_cache and session_id and pooled.is_alive():
+                client_pool.detach(pooled)
+                await session_cache.adopt(session_id, pooled)
+        return
+
+    # queryメソッドで、リクエストし、messageを受ける
+    # キャンセルされるとquery()の終了処理でCLIプロセスが終了する
+    oneshot_processes["running"] += 1
+    try:
+        async for message in query(prompt=prompt, options=options, message_types=message_types, lazy=True):
+            yield message
+    except asyncio.CancelledError:
+        cancel_stats["terminated"] += 1
+        raise
+    finally:
+        oneshot_processes["running"] -= 1
+
+@asynccontextmanager
+async def lease_within(lease, timeout: Optional[float]):
+    """leaseでプロセスを借りる。借りられるまで（順番待ち・起動）がtimeout秒を過ぎたら504"""
+    async with AsyncExitStack() as stack:
+        try:
+            with anyio.fail_after(timeout):
+                pooled = await stack.enter_async_context(lease)
+        except TimeoutError:
+            logger.info("制限時間内にプロセスを借りられなかった")
+            raise HTTPException(status_code=504, detail="制限時間内に実行を開始できませんでした")
+        yield pooled
+
+def coalesce_key(query_data: ChatQuery, request: Request, kind: str) -> Optional[str]:
+    """相乗りのキー。まとめない場合（無効・セッション継続・キャッシュ無視の指定）はNone
+
+    kindは受け取るメッセージの種類（/api/chatとストリーミングで分ける）
+    """
+    if not singleflight or query_data.resume_session or query_data.no_cache:
+        return None
+    directives = {d.strip().lower() for d in request.headers.get("Cache-Control", "").split(",")}
+    if directives & {"no-cache", "no-store"}:
+        return None
+    return f"{kind}:{cache_key(query_data.query, build_options())}"
+
+@asynccontextmanager
+async def chat_messages(prompt: str, options: ClaudeCodeOptions, message_types=None, flight_key: Optional[str] = None):
+    """(メッセージのイテレーター, 自分が実行を開始したか)を返す
+
+    flight_keyがあれば、同じキーの実行中のものに相乗りする（実行枠は実行ごとに1つ取る）
+    """
+    if flight_key is None:
+        yield receive_chat_messages(prompt, options, message_types), True
+        return
+
+    async def admitted_run():
+        release = await admit()
+        try:
+            async for message in receive_chat_messages(prompt, options, message_types):
+                yield message
+        finally:
+            release()
+
+    async with singleflight.join(flight_key, admitted_run) as joined:
+        yield joined
+
+class ClientDisconnected(Exception):
+    """HTTPクライアントが切断した"""
+
+async def cancel_on_disconnect(request: Request, coro):
+    """coroを実行し、途中でクライアントが切断したらキャンセルしてClientDisconnectedを投げる
+
+    タイムアウトや再送でクライアントがいなくなった後もCLIを動かし続けないようにする
+    """
+    task = asyncio.create_task(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                cancel_stats["disconnected"] += 1
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+                raise ClientDisconnected()
+    finally:
+        # このハンドラー自体がキャンセルされた場合も実行を止める
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+def request_timeout(query_data: ChatQuery, request: Optional[Request] = None) -> Optional[float]:
+    """リクエストの制限時間（秒）: timeoutフィールド > X-Request-Timeoutヘッダー > CHAT_TIMEOUT
+
+    バッチの各件やジョブはrequestなし（ヘッダーを見ない）で呼ぶ
+    """
+    timeout = query_data.timeout
+    if timeout is None and request is not None and request.headers.get("X-Request-Timeout"):
+        try:
+            timeout = float(request.headers["X-Request-Timeout"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Request-Timeoutは秒数で指定してください")
+    if timeout is None:
+        timeout = CHAT_TIMEOUT
+    if timeout is not None and timeout <= 0:
+        raise HTTPException(status_code=400, detail="timeoutは正の秒数で指定してください")
+    return timeout
+
+def cache_policy(query_data: ChatQuery, cache_control: str = "") -> tuple[Optional[str], bool, bool]:
+    """キャッシュのキーと、読む/書くかどうかを返す
+
+    セッション継続は会話によって答えが変わるのでキャッシュしない
+    Cache-Control: no-cache（またはno_cache）はキャッシュを読まずに実行して結果を保存、
+    no-storeは読みも保存もしない
+    """
+    if not response_cache or query_data.resume_session:
+        return None, False, False
+    directives = {d.strip().lower() for d in cache_control.split(",")}
+    if "no-store" in directives:
+        return None, False, False
+    read = not (query_data.no_cache or "no-cache" in directives)
+    return cache_key(query_data.query, build_options()), read, True
+
+def cached_result(query_data: ChatQuery, request_id: str, cached: dict) -> dict:
+    """キャッシュした回答からレスポンスのdictを作る"""
+    return {
+        "request_id": request_id,
+        "session_id": None,  # 別の会話の回答なので、継続できるセッションはない
+        "query": query_data.query,
+        "response": cached["response"],
+        "is_continuation": False,
+        "timed_out": False,
+        "is_error": False,
+        "cached": True,
+        "coalesced": False,
+    }
+
+async def store_result(key: Optional[str], result: dict) -> None:
+    """正常に最後まで答えられたものだけキャッシュする（相乗りした分は実行した側が保存する）"""
+    if key and not (result["timed_out"] or result["is_error"] or result["coalesced"]):
+        await response_cache.set(key, {"response": result["response"]})
+
+def prepare_options(query_data: ChatQuery, timeout: Optional[float] = None) -> ClaudeCodeOptions:
+    """リクエストに応じて新規セッション or セッション継続のoptionsを作る"""
+    options = build_options()
+    options.timeout = timeout
+
+    if query_data.resume_session:
+        # セッション継続の場合
+        options.continue_conversation = True
+        options.resume = query_data.resume_session
+        logger.info("セッション継続: %s", query_data.resume_session)
+    else:
+        # 新規セッションの場合
+        options.continue_conversation = False
+        logger.info("新しいセッションを開始")
+    return options
+
+# /api/chatで使うメッセージ（テキストとセッションIDの取得に必要なものだけ）
+CHAT_MESSAGE_TYPES = (AssistantMessage, SystemMessage, ResultMessage)
 
 # メインチャットAPI
 # curl -X POST "http://localhost:8002/api/chat" \
 #      -H "Content-Type: application/json" \
 #      -d '{"query": "私の名前を覚えていますか？", "resume_session": "前のsession_id"}'
 @app.post("/api/chat") # このデコレータでルーティング登録し、受け付けられるようにする
-async def chat_with_ai(query_data: ChatQuery): # asyncで非同期処理なので、レスが早く平行処理も可能
+async def chat_with_ai(query_data: ChatQuery, request: Request): # asyncで非同期処理なので、レスが早く平行処理も可能
+    request_id = query_data.request_id or str(uuid.uuid4()) # request_idの生成
+    begin_request(request_id, request)
+    trace = {"started_at": time.monotonic()}
+    try:
+        result = await answer_chat(query_data, request, request_id, trace)
+    except HTTPException as e:
+        record_request("/api/chat", request_id, trace, e.status_code, detail=e.detail)
+        raise
+    record_request("/api/chat", request_id, trace, 200, result)
+    return JSONResponse(content=result)
+
+async def answer_chat(query_data: ChatQuery, request: Request, request_id: str, trace: dict) -> dict:
+    """/api/chatの本体。レスポンスのdictを返す（失敗はHTTPException）"""
 
     # 準備
-    request_id = query_data.request_id or str(uuid.uuid4()) # request_idの生成
     if not query_data.query.strip(): # queryが空なら、400を返す
         raise HTTPException(status_code=400, detail="質問が空です")
+    timeout = request_timeout(query_data, request)
+
+    # 同じ質問の回答がキャッシュにあれば、実行せずに返す（実行枠も使わない）
+    key, read_cache, write_cache = cache_policy(query_data, request.headers.get("Cache-Control", ""))
+    if key and read_cache:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            logger.info("キャッシュヒット")
+            return cached_result(query_data, request_id, cached)
+
+    # 同時実行数の上限を超えていたら空くまで待つ（待ちきれなければ429/503）
+    # 相乗りする場合は、まとめた実行が枠を取る
+    flight_key = coalesce_key(query_data, request, "chat")
+    release = (lambda: None) if flight_key else await admit()
 
     # 処理
     try:
-        options = ClaudeCodeOptions(
-            system_prompt="あなたは親切なAIアシスタントです。質問に丁寧に答えてください。",
-            max_turns=10
-        )
+        # クライアントが切断したら、CLIを止めて枠をすぐに返す
+        result = await cancel_on_disconnect(request, run_chat(query_data, request_id, timeout, flight_key, trace))
+
+        if write_cache:
+            await store_result(key, result)
+        return result
+
+    except ClientDisconnected:
+        logger.info("クライアントが切断したため中断")
+        # 499: Client Closed Request（返しても届かないが、ログ用）
+        raise HTTPException(status_code=499, detail="クライアントが切断しました")
+    except HTTPException:
+        # 相乗りした実行が枠を取れなかった（429/503）、時間内に実行を開始できなかった（504）
+        raise
+    except Exception as e:
+        logger.exception("エラー詳細: %s", e)
+        raise HTTPException(status_code=500, detail=f"AI応答エラー: {str(e)}")
+    finally:
+        release()
+
 
-        if query_data.resume_session:
-            # セッション継続の場合
-            options.continue_conversation = True
-            options.resume = query_data.resume_session
-            print(f"セッション継続: {query_data.resume_session}")
-        else:
-            # 新規セッションの場合
-            options.continue_conversation = False
-            print("新しいセッションを開始")
-
-        # Claude Code SDKのquery関数を使用
-        messages = []
-        session_id = None
-
-        # ストリーミング形式である必要がないので、for文で回す必要ない変更必要かも
-        # queryメソッドで、リクエストし、messageを受ける
-        async for message in query(prompt=query_data.query, options=options):
+async def run_chat(
+    query_data: ChatQuery,
+    request_id: str,
+    timeout: Optional[float] = None,
+    flight_key: Optional[str] = None,
+    trace: Optional[dict] = None,
+) -> dict:
+    """1件のチャットを実行して、レスポンスのdictを返す（flight_keyがあれば同じ実行に相乗りする）
+
+    traceを渡すと、最初のメッセージの時刻と最後のResultMessageを記録する（リクエストログ用）
+    """
+    if trace is None:
+        trace = {}
+    options = prepare_options(query_data, timeout)
+
+    # Claude Code SDKのquery関数を使用
+    messages = []
+    session_id = None
+    timed_out = False
+    is_error = False
+
+    # 途中経過のトークン（StreamEvent）やツール結果（UserMessage）は使わないので受け取らない
+    async with chat_messages(
+        query_data.query, options, message_types=CHAT_MESSAGE_TYPES, flight_key=flight_key
+    ) as (stream, leader):
+        async for message in stream:
             messages.append(message)
-            print(f"受信メッセージ: {message}")
+            # 受信メッセージはDEBUGを出すリクエストだけ（ツール結果は大きいので切り詰める）
+            if debug_enabled():
+                logger.debug("受信メッセージ: %s", truncated(message))
+            trace.setdefault("first_message_at", time.monotonic())
+            if isinstance(message, ResultMessage):
+                trace["result"] = message
+            elif (
+                "first_text_at" not in trace
+                and isinstance(message, AssistantMessage)
+                and any(isinstance(block, TextBlock) for block in message.content)
+            ):
+                trace["first_text_at"] = time.monotonic()
+
+            # 制限時間切れ（SDKが打ち切って、それまでの応答の後にerror_timeoutを返す）
+            if isinstance(message, ResultMessage) and message.subtype == "error_timeout":
+                timed_out = True
+                logger.info("制限時間切れで打ち切り")
+                continue
+            if isinstance(message, ResultMessage):
+                is_error = message.is_error
 
             # セッションIDを取得
             if hasattr(message, 'session_id') and message.session_id:
                 session_id = message.session_id
-                print(f"取得したセッションID: {session_id}")
+                logger.debug("取得したセッションID: %s", session_id)
             elif hasattr(message, 'data') and isinstance(message.data, dict):
                 if 'session_id' in message.data:
                     session_id = message.data['session_id']
-                    print(f"データからセッションID取得: {session_id}")
-
-        # レスポンステキストを連結していく
-        # messageの中にcontentが含まれるので、繋ぎ合わせていく
-        response_text = ""
-        for message in messages:
-            if hasattr(message, 'content'):
-                for block in message.content:
-                    if hasattr(block, 'text'):
-                        response_text += block.text
-
-        # 既存セッション: セッション指定された場合、それを返す新規の場合は生成されたID
-        # 新規セッション: session_idを返す
-        final_session_id = query_data.resume_session if query_data.resume_session else session_id #最後に受信したメッセージのsession_idなので、不安定になってるかも
-
-        return JSONResponse(content={
-            "request_id": request_id,
-            "session_id": final_session_id,  # 次回の会話継続用セッションID
-            "query": query_data.query,
-            "response": response_text,
-            "is_continuation": bool(query_data.resume_session),  # 継続セッションかどうかを示す
-            # "messages": [msg.dict() if hasattr(msg, 'dict') else str(msg) for msg in messages]  # デバッグ用
-        })
+                    logger.debug("データからセッションID取得: %s", session_id)
+
+    # レスポンステキストを連結していく
+    # messageの中にcontentが含まれるので、繋ぎ合わせていく
+    response_text = ""
+    for message in messages:
+        if hasattr(message, 'content'):
+            for block in message.content:
+                if hasattr(block, 'text'):
+                    response_text += block.text
+
+    # 既存セッション: セッション指定された場合、それを返す新規の場合は生成されたID
+    # 新規セッション: session_idを返す
+    final_session_id = query_data.resume_session if query_data.resume_session else session_id #最後に受信したメッセージのsession_idなので、不安定になってるかも
+    # 相乗りした場合: 会話は実行を開始したリクエストのものなので、セッションIDは返さない
+    if not leader:
+        final_session_id = None
+
+    return {
+        "request_id": request_id,
+        "session_id": final_session_id,  # 次回の会話継続用セッションID
+        "query": query_data.query,
+        "response": response_text,
+        "is_continuation": bool(query_data.resume_session),  # 継続セッションかどうかを示す
+        "timed_out": timed_out,  # 制限時間で打ち切った場合はTrue（responseは途中まで）
+        "is_error": is_error,
+        "cached": False,  # キャッシュした回答を返した場合はTrue
+        "coalesced": not leader,  # 同じ質問の実行中のものに相乗りした場合はTrue
+        # "messages": [msg.dict() if hasattr(msg, 'dict') else str(msg) for msg in messages]  # デバッグ用
+    }
+
+
+
+# ストリーミングチャットAPI（Server-Sent Events）
+# /api/chatは全メッセージを受け取ってから返すので、ツールを使うと数十秒何も返らない
+# こちらは届いたメッセージから順にイベントとして送る
+# curl -N -X POST "http://localhost:8002/api/chat/stream" \
+#      -H "Content-Type: application/json" \
+#      -d '{"query": "こんにちは"}'
+#
+# イベントの種類:
+#   start       : {"request_id"}
+#   text        : {"text"} 生成中のテキスト（CHAT_PARTIAL_MESSAGES=0のときはTextBlock単位）
+#   tool_use    : {"id", "name", "input"} ツール呼び出しの開始
+#   tool_result : {"tool_use_id", "is_error"} ツールの実行完了
+#   done        : {"request_id", "session_id", "is_continuation", "coalesced", "timed_out", "total_cost_usd", "usage", ...}
+#   error       : {"request_id", "detail"}
+@app.post("/api/chat/stream")
+async def chat_stream(query_data: ChatQuery, request: Request):
+
+    # 準備
+    request_id = query_data.request_id or str(uuid.uuid4())
+    begin_request(request_id, request)
+    trace = {"started_at": time.monotonic()}
+    try:
+        if not query_data.query.strip():
+            raise HTTPException(status_code=400, detail="質問が空です")
+        timeout = request_timeout(query_data, request)
+
+        # 相乗りする場合は、まとめた実行が枠を取る
+        flight_key = coalesce_key(query_data, request, "stream")
+        release = (lambda: None) if flight_key else await admit()
+    except HTTPException as e:
+        record_request("/api/chat/stream", request_id, trace, e.status_code, detail=e.detail)
+        raise
+    options = prepare_options(query_data, timeout)
+
+    def event(name: str, data: dict) -> dict:
+        return {"event": name, "data": json.dumps(data, ensure_ascii=False)}
+
+    async def event_stream():
+        status, detail, result = 200, None, None
+        yield event("start", {"request_id": request_id})
+        try:
+            async with chat_messages(query_data.query, options, flight_key=flight_key) as (stream, leader):
+                async for message in stream:
+                    trace.setdefault("first_message_at", time.monotonic())
+                    if isinstance(message, StreamEvent):
+                        # トークン単位のテキスト（CHAT_PARTIAL_MESSAGES=1のとき）
+                        if isinstance(message.delta, TextDelta) and message.parent_tool_use_id is None:
+                            trace.setdefault("first_text_at", time.monotonic())
+                            yield event("text", {"text": message.delta.text})
+                    elif isinstance(message, AssistantMessage):
+                        for block in message.content:
+                            # 部分メッセージ有効時は同じテキストをデルタで送り済み
+                            if isinstance(block, TextBlock) and not options.include_partial_messages:
+                                trace.setdefault("first_text_at", time.monotonic())
+                                yield event("text", {"text": block.text})
+                            elif isinstance(block, ToolUseBlock):
+                                yield event("tool_use", {
+                                    "id": block.id,
+                                    "name": block.name,
+                                    "input": block.input,
+                                })
+                    elif isinstance(message, UserMessage) and isinstance(message.content, list):
+                        # ツールの結果はuserメッセージとして届く（中身は大きいので送らない）
+                        for block in message.content:
+                            if isinstance(block, ToolResultBlock):
+                                yield event("tool_result", {
+                                    "tool_use_id": block.tool_use_id,
+                                    "is_error": bool(block.is_error),
+                                })
+                    elif isinstance(message, ResultMessage):
+                        trace["result"] = message
+                        result = {
+                            # /api/chatと同じく、継続時は指定されたセッションIDを返す（相乗りした場合は返さない）
+                            "session_id": (query_data.resume_session or message.session_id) if leader else None,
+                            "is_continuation": bool(query_data.resume_session),
+                            "timed_out": message.subtype == "error_timeout",
+                            "is_error": message.is_error,
+                            "cached": False,
+                            "coalesced": not leader,
+                        }
+                        yield event("done", {
+                            "request_id": request_id,
+                            **result,
+                            "num_turns": message.num_turns,
+                            "duration_ms": message.duration_ms,
+                            "total_cost_usd": message.total_cost_usd,
+                            "usage": message.usage,
+                        })
+        except HTTPException as e:
+            # 相乗りした実行が枠を取れなかった（429/503）、時間内に実行を開始できなかった（504）
+            status, detail = e.status_code, e.detail
+            yield event("error", {"request_id": request_id, "detail": e.detail, "status": e.status_code})
+        except asyncio.CancelledError:
+            # クライアントが切断した
+            status, detail = 499, "クライアントが切断しました"
+            raise
+        except Exception as e:
+            logger.exception("エラー詳細: %s", e)
+            status, detail = 500, f"AI応答エラー: {str(e)}"
+            yield event("error", {"request_id": request_id, "detail": detail})
+        finally:
+            release()
+            record_request("/api/chat/stream", request_id, trace, status, result, detail=detail)
+
+    # ストリームが始まらずに終わった場合も、レスポンス後に枠を返す
+    return EventSourceResponse(event_stream(), background=BackgroundTask(release))
+
+
+
+# バッチチャットAPI
+# 独立した大量の質問を1リクエストで送り、サーバー側で同時実行数を制限して処理する
+# 結果は終わった順にNDJSON（1行1件）で返す。1件が失敗してもバッチは止まらない
+# curl -N -X POST "http://localhost:8002/api/chat/batch?concurrency=4" \
+#      -H "Content-Type: application/json" \
+#      -d '[{"query": "質問1"}, {"query": "質問2", "request_id": "q2"}]'
+# curl -N -X POST "http://localhost:8002/api/chat/batch" -F "file=@questions.jsonl"
+#
+# 各行: {"index": 入力の何件目か, "status": 200, ...（/api/chatと同じ内容）}
+#       失敗した場合は {"index", "request_id", "status": 400/422/429/500など, "detail"}
+BATCH_MAX_CONCURRENCY = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "10000"))
+# 実行枠が空かないとき（429/503）に待って再試行する回数
+BATCH_ADMISSION_RETRIES = int(os.getenv("CHAT_BATCH_ADMISSION_RETRIES", "20"))
+
+@app.post("/api/chat/batch")
+async def chat_batch(request: Request, concurrency: int = BATCH_MAX_CONCURRENCY):
+    items = await read_batch_items(request)
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"1回のバッチは{BATCH_MAX_ITEMS}件までです")
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    # 各件のログには、その件のrequest_idを付ける（X-Debug-Logはバッチ全体に効く）
+    begin_request(None, request)
+    logger.info("バッチ開始: %d件 同時実行数%d", len(items), concurrency)
+    return StreamingResponse(batch_results(items, concurrency), media_type="application/x-ndjson")
 
+async def read_batch_items(request: Request) -> list:
+    """JSONの配列、JSONLのファイル（multipartのfile）、JSONLの本文のどれかから質問を読む
+
+    JSONとして読めない行は、エラーとして結果に出すために例外のまま入れておく
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            raise HTTPException(status_code=400, detail="fileにJSONLのファイルを指定してください")
+        return parse_jsonl(await upload.read())
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return parse_jsonl(await request.body())
+
+    try:
+        items = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="JSONの配列を送ってください")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="JSONの配列を送ってください")
+    return items
+
+def parse_jsonl(data: bytes) -> list:
+    items = []
+    for line in data.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError as e:
+            items.append(e)
+    return items
+
+async def batch_results(items: list, concurrency: int):
+    """concurrency個のワーカーで順に処理し、終わった順にNDJSONの行を返す"""
+    results: asyncio.Queue = asyncio.Queue()
+    indexes = iter(range(len(items)))  # ワーカーで共有する（次に処理する番号）
+
+    async def worker():
+        for index in indexes:
+            trace = {"started_at": time.monotonic()}
+            row = await run_batch_item(index, items[index], trace)
+            ok = row["status"] == 200
+            record_request("/api/chat/batch", row["request_id"], trace, row["status"],
+                           row if ok else None, detail=row.get("detail"), index=index)
+            await results.put(row)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(items)))]
+    try:
+        for _ in range(len(items)):
+            yield json.dumps(await results.get(), ensure_ascii=False) + "\n"
+    finally:
+        # クライアントが切断した場合は、実行中のものも止める
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+async def run_batch_item(index: int, item, trace: Optional[dict] = None) -> dict:
+    """バッチの1件を処理する。失敗はstatusとdetailの行にして返す（例外は投げない）"""
+    request_id = item.get("request_id") if isinstance(item, dict) else None
+    if isinstance(item, Exception):
+        return {"index": index, "request_id": None, "status": 400, "detail": f"JSONとして読めません: {item}"}
+    try:
+        query_data = ChatQuery.model_validate(item)
+    except ValidationError as e:
+        return {"index": index, "request_id": request_id, "status": 422, "detail": str(e)}
+
+    request_id = query_data.request_id or str(uuid.uuid4())
+    set_request_id(request_id)
+    if not query_data.query.strip():
+        return {"index": index, "request_id": request_id, "status": 400, "detail": "質問が空です"}
+
+    try:
+        key, read_cache, write_cache = cache_policy(query_data)
+        if key and read_cache:
+            cached = await response_cache.get(key)
+            if cached is not None:
+                return {"index": index, "status": 200, **cached_result(query_data, request_id, cached)}
+
+        timeout = request_timeout(query_data)
+        release = await admit_batch()
+        try:
+            result = await run_chat(query_data, request_id, timeout, trace=trace)
+        finally:
+            release()
+        if write_cache:
+            await store_result(key, result)
+        return {"index": index, "status": 200, **result}
+
+    except HTTPException as e:
+        return {"index": index, "request_id": request_id, "status": e.status_code, "detail": e.detail}
     except Exception as e:
-        print(f"エラー詳細: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"AI応答エラー: {str(e)}")
+        logger.exception("エラー詳細: %s", e)
+        return {"index": index, "request_id": request_id, "status": 500, "detail": f"AI応答エラー: {str(e)}"}
+
+async def admit_batch():
+    """バッチとジョブ用の実行枠。満杯ならRetry-Afterの秒数だけ待って取り直す（対話のリクエストを優先する）"""
+    for _ in range(BATCH_ADMISSION_RETRIES):
+        try:
+            return await admission.acquire()
+        except AdmissionRejected as e:
+            await asyncio.sleep(e.retry_after)
+    return await admit()
+
+
+
+# 非同期ジョブAPI
+# 長い実行をHTTP接続を開いたまま待たずに、ジョブとして受け付けてIDをすぐに返す
+# ジョブはsqliteに保存され（再起動しても残る）、ワーカーが順に実行する
+# 実行するときは/api/chatと同じ実行枠を取る（バッチと同じく、空くまで待って取り直す）
+# curl -X POST "http://localhost:8002/api/jobs" \
+#      -H "Content-Type: application/json" \
+#      -d '{"query": "このリポジトリを調べてレポートを書いて"}'
+# curl http://localhost:8002/api/jobs/{job_id}
+# curl -N http://localhost:8002/api/jobs/{job_id}/stream
+#
+# CHAT_JOB_WORKERS=0 で無効化
+job_workers: Optional[JobWorkerPool] = None
+JOB_POLL_INTERVAL = float(os.getenv("CHAT_JOB_POLL_INTERVAL", "1"))
+
+async def run_job(job: dict) -> dict:
+    """ジョブを1件実行する（例外は再試行の対象になる）"""
+    query_data = ChatQuery.model_validate(job["request"])
+    begin_request(query_data.request_id)
+    trace = {"started_at": time.monotonic()}
+    fields = {"job_id": job["job_id"], "attempt": job["attempts"]}
+    try:
+        timeout = request_timeout(query_data)
+        release = await admit_batch()
+        try:
+            result = await run_chat(query_data, query_data.request_id, timeout, trace=trace)
+        finally:
+            release()
+    except HTTPException as e:
+        # 実行枠が取れなかった（429/503）、時間内に実行を開始できなかった（504）
+        record_request("/api/jobs", query_data.request_id, trace, e.status_code, detail=e.detail, **fields)
+        raise
+    except Exception as e:
+        record_request("/api/jobs", query_data.request_id, trace, 500, detail=str(e), **fields)
+        raise
+    record_request("/api/jobs", query_data.request_id, trace, 200, result, **fields)
+    return result
+
+if int(os.getenv("CHAT_JOB_WORKERS", "2")) > 0:
+    job_workers = JobWorkerPool(
+        JobQueue(
+            os.getenv("CHAT_JOB_DB", "jobs.sqlite3"),
+            visibility_timeout=float(os.getenv("CHAT_JOB_VISIBILITY_TIMEOUT", "60")),
+            max_attempts=int(os.getenv("CHAT_JOB_MAX_ATTEMPTS", "3")),
+            retry_delay=float(os.getenv("CHAT_JOB_RETRY_DELAY", "5")),
+        ),
+        run_job,
+        concurrency=int(os.getenv("CHAT_JOB_WORKERS", "2")),
+        poll_interval=JOB_POLL_INTERVAL,
+    )
+
+def get_job_queue() -> JobQueue:
+    if not job_workers:
+        raise HTTPException(status_code=404, detail="ジョブAPIは無効です")
+    return job_workers.queue
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(query_data: ChatQuery):
+    queue = get_job_queue()
+    if not query_data.query.strip():
+        raise HTTPException(status_code=400, detail="質問が空です")
+    # request_idは受け付けた時点で決めて、結果にも同じものを入れる
+    query_data.request_id = query_data.request_id or str(uuid.uuid4())
+    job_id = await queue.enqueue(query_data.model_dump())
+    logger.info("ジョブ受付: %s", job_id)
+    return {"job_id": job_id, "request_id": query_data.request_id, "status": "queued"}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return job
+
+# ジョブの状態をSSEで送る（状態が変わるたびにstatus、終わったらdoneかerror）
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    queue = get_job_queue()
+    if await queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+
+    def event(name: str, data: dict) -> dict:
+        return {"event": name, "data": json.dumps(data, ensure_ascii=False)}
+
+    async def event_stream():
+        last = None
+        while True:
+            job = await queue.get(job_id)
+            state = (job["status"], job["attempts"])
+            if state != last:
+                last = state
+                yield event("status", {"job_id": job_id, "status": job["status"], "attempts": job["attempts"]})
+            if job["status"] == SUCCEEDED:
+                yield event("done", {"job_id": job_id, "result": job["result"]})
+                return
+            if job["status"] == FAILED:
+                yield event("error", {"job_id": job_id, "detail": job["error"]})
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
 
+    return EventSourceResponse(event_stream())
@@ -1,7 +1,6 @@
 import uvicorn
 
-app = FastAPI(title="AI チャット API", description="Claude AIとのシンプルなチャット")
-
+# appはapi_requestで作る（uvicorn api_server:app でも api_request:app でも起動できる）
 from api_request import *
 
 if __name__ == "__main__":
@@ -0,0 +1,188 @@
+"""Compare JSON codecs on a realistic stream-json trace.
+
+Builds a trace shaped like a tool-heavy session: init, partial-message stream
+events, assistant text and tool_use messages, large tool results, control
+requests/responses and a final result. It then times decoding every record from
+bytes (the reader path) and encoding the outgoing control and user messages (the
+write path) with each installed codec.
+
+Usage:
+    python benchmarks/bench_codec.py [--turns 50] [--tool-result-size 20000] [--repeat 5]
+"""
+
+import argparse
+import json
+import time
+from typing import Any
+
+from claude_code_sdk._internal.codec import available_codecs, get_codec
+
+
+def build_trace(turns: int, tool_result_size: int) -> tuple[list[bytes], list[dict[str, Any]]]:
+    """Return (incoming records as bytes, outgoing messages as dicts)."""
+    session = "5f0c9a5e-8a0b-4d4b-9c51-0c5c4f3f2f7e"
+    incoming: list[dict[str, Any]] = [
+        {
+            "type": "system",
+            "subtype": "init",
+            "session_id": session,
+            "cwd": "/home/user/project",
+            "tools": ["Bash", "Read", "Edit", "Grep", "Glob", "Write"],
+            "mcp_servers": [],
+            "model": "claude-sonnet-4",
+            "permissionMode": "default",
+        }
+    ]
+    outgoing: list[dict[str, Any]] = [
+        {
+            "type": "control_request",
+            "request_id": "req_1_abcd",
+            "request": {"subtype": "initialize", "hooks": None},
+        },
+        {
+            "type": "user",
+            "message": {"role": "user", "content": "Refactor the parser module"},
+            "parent_tool_use_id": None,
+            "session_id": "default",
+        },
+    ]
+    for turn in range(turns):
+        tool_id = f"toolu_{turn:06d}"
+        for word in "Let me look at the relevant file first .".split():
+            incoming.append(
+                {
+                    "type": "stream_event",
+                    "uuid": f"ev-{turn}",
+                    "session_id": session,
+                    "parent_tool_use_id": None,
+                    "event": {
+                        "type": "content_block_delta",
+                        "index": 0,
+                        "delta": {"type": "text_delta", "text": word + " "},
+                    },
+                }
+            )
+        incoming.append(
+            {
+                "type": "assistant",
+                "message": {
+                    "id": f"msg_{turn}",
+                    "model": "claude-sonnet-4",
+                    "role": "assistant",
+                    "content": [
+                        {"type": "text", "text": "Let me look at the relevant file first."},
+                        {
+                            "type": "tool_use",
+                            "id": tool_id,
+                            "name": "Read",
+                            "input": {"file_path": f"/home/user/project/src/mod_{turn}.py"},
+                        },
+                    ],
+                    "usage": {"input_tokens": 1200 + turn, "output_tokens": 85},
+                },
+                "parent_tool_use_id": None,
+                "session_id": session,
+            }
+        )
+        incoming.append(
+            {
+                "type": "control_request",
+                "request_id": f"cli_{turn}",
+                "request": {
+                    "subtype": "can_use_tool",
+                    "tool_name": "Read",
+                    "input": {"file_path": f"/home/user/project/src/mod_{turn}.py"},
+                    "permission_suggestions": None,
+                },
+            }
+        )
+        outgoing.append(
+            {
+                "type": "control_response",
+                "response": {
+                    "subtype": "success",
+                    "request_id": f"cli_{turn}",
+                    "response": {"allow": True},
+                },
+            }
+        )
+        incoming.append(
+            {
+                "type": "user",
+                "message": {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "tool_result",
+                            "tool_use_id": tool_id,
+                            "content": ("    def parse(self, data):  # ünïcode\n"
+                                        * (tool_result_size // 40 + 1))[:tool_result_size],
+                        }
+                    ],
+                },
+                "parent_tool_use_id": None,
+                "session_id": session,
+            }
+        )
+    incoming.append(
+        {
+            "type": "result",
+            "subtype": "success",
+            "duration_ms": 48211,
+            "duration_api_ms": 40122,
+            "is_error": False,
+            "num_turns": turns,
+            "session_id": session,
+            "total_cost_usd": 0.4312,
+            "usage": {"input_tokens": 120000, "output_tokens": 8500},
+            "result": "Done.",
+        }
+    )
+    return [json.dumps(m).encode() for m in incoming], outgoing
+
+
+def best_of(repeat: int, func: Any) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--tool-result-size", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    incoming, outgoing = build_trace(args.turns, args.tool_result_size)
+    in_bytes = sum(len(r) for r in incoming)
+    print(
+        f"trace: {len(incoming)} incoming records ({in_bytes / 1024 / 1024:.1f} MB), "
+        f"{len(outgoing)} outgoing messages"
+    )
+    print(f"{'codec':<8} {'decode MB/s':>12} {'decode rec/s':>14} {'encode msg/s':>14}")
+
+    for name in available_codecs():
+        codec = get_codec(name)
+
+        def decode() -> None:
+            for record in incoming:
+                codec.loads(bytearray(record))
+
+        def encode() -> None:
+            for message in outgoing:
+                codec.dumps(message)
+
+        decode_time = best_of(args.repeat, decode)
+        encode_time = best_of(args.repeat, encode)
+        print(
+            f"{codec.name:<8} {in_bytes / decode_time / 1024 / 1024:>12.1f} "
+            f"{len(incoming) / decode_time:>14.0f} {len(outgoing) / encode_time:>14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
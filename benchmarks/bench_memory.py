@@ -0,0 +1,121 @@
+"""Memory per message for slotted vs. dict-backed message dataclasses.
+
+Parses a representative mix of messages (assistant text + tool_use, user
+tool_result, result) with parse_message and measures the retained size with
+tracemalloc. The comparison baseline rebuilds the same dataclasses without
+slots, i.e. with a per-instance __dict__ as before.
+
+The payload strings and dicts are shared between both runs, so the numbers
+isolate the overhead of the message and content-block objects themselves.
+
+Usage:
+    python benchmarks/bench_memory.py [--messages 100000]
+"""
+
+import argparse
+import dataclasses
+import gc
+import tracemalloc
+from typing import Any
+
+from claude_code_sdk._internal import message_parser
+
+SLOTTED = [
+    "TextBlock",
+    "ThinkingBlock",
+    "ToolUseBlock",
+    "ToolResultBlock",
+    "UserMessage",
+    "AssistantMessage",
+    "SystemMessage",
+    "ResultMessage",
+]
+
+
+def unslotted(cls: type) -> type:
+    """Rebuild a dataclass with the same fields but a regular __dict__."""
+    fields: list[Any] = []
+    for f in dataclasses.fields(cls):
+        if f.default is dataclasses.MISSING:
+            fields.append((f.name, f.type))
+        else:
+            fields.append((f.name, f.type, dataclasses.field(default=f.default)))
+    return dataclasses.make_dataclass(cls.__name__, fields)
+
+
+def sample_messages() -> list[dict[str, Any]]:
+    tool_input = {"file_path": "/home/user/project/src/parser.py"}
+    return [
+        {
+            "type": "assistant",
+            "message": {
+                "model": "claude-sonnet-4",
+                "content": [
+                    {"type": "text", "text": "Let me read the parser."},
+                    {"type": "tool_use", "id": "toolu_1", "name": "Read", "input": tool_input},
+                ],
+            },
+        },
+        {
+            "type": "user",
+            "message": {
+                "content": [
+                    {"type": "tool_result", "tool_use_id": "toolu_1", "content": "def parse(): ..."}
+                ]
+            },
+        },
+        {
+            "type": "result",
+            "subtype": "success",
+            "duration_ms": 1000,
+            "duration_api_ms": 800,
+            "is_error": False,
+            "num_turns": 1,
+            "session_id": "s",
+            "total_cost_usd": 0.01,
+            "usage": {"input_tokens": 10, "output_tokens": 5},
+            "result": "ok",
+        },
+    ]
+
+
+def measure(count: int) -> float:
+    samples = sample_messages()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    retained = [message_parser.parse_message(samples[i % len(samples)]) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # Exclude the list holding the messages
+    size -= retained.__sizeof__()
+    del retained
+    return size / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    slotted_size = measure(args.messages)
+
+    originals = {name: getattr(message_parser, name) for name in SLOTTED}
+    try:
+        for name, cls in originals.items():
+            setattr(message_parser, name, unslotted(cls))
+        dict_size = measure(args.messages)
+    finally:
+        for name, cls in originals.items():
+            setattr(message_parser, name, cls)
+
+    print(f"messages parsed: {args.messages} (assistant / user tool_result / result mix)")
+    print(f"{'variant':<10} {'bytes/message':>14}")
+    print(f"{'__dict__':<10} {dict_size:>14.1f}")
+    print(f"{'slots':<10} {slotted_size:>14.1f}")
+    print(f"saved: {100 * (1 - slotted_size / dict_size):.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Throughput benchmark for the stream-json stdout reader.
+
+Feeds newline-framed assistant messages of 10 KB, 1 MB and 50 MB through the
+transport's reader in 64 KB chunks (the size of a typical pipe read) and
+reports MB/s and messages/s. The previous speculative-parse reader is included
+for comparison; it is quadratic in record size, so it only runs on the large
+case with --legacy-all.
+
+Usage:
+    python benchmarks/bench_reader.py [--sizes 10K,1M,50M] [--repeat 3] [--legacy-all]
+                                      [--codec auto|orjson|msgspec|json]
+"""
+
+import argparse
+import json
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+import anyio
+
+from claude_code_sdk._internal.codec import JSONCodec, get_codec
+from claude_code_sdk._internal.transport.subprocess_cli import _read_json_lines
+
+CHUNK_SIZE = 64 * 1024
+TOTAL_BYTES = 64 * 1024 * 1024  # per size: send about this many bytes in total
+LEGACY_LIMIT = 1024 * 1024
+
+
+def parse_size(text: str) -> int:
+    units = {"K": 1024, "M": 1024 * 1024}
+    text = text.strip().upper()
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def make_record(size: int) -> bytes:
+    """An assistant message whose serialized form is roughly ``size`` bytes."""
+    message: dict[str, Any] = {
+        "type": "assistant",
+        "message": {
+            "model": "claude-sonnet-4",
+            "content": [{"type": "text", "text": ""}],
+        },
+        "parent_tool_use_id": None,
+        "session_id": "bench",
+    }
+    overhead = len(json.dumps(message))
+    message["message"]["content"][0]["text"] = "x" * max(0, size - overhead)
+    return json.dumps(message).encode() + b"\n"
+
+
+async def chunked(payload: bytes) -> AsyncIterator[bytes]:
+    view = memoryview(payload)
+    for i in range(0, len(view), CHUNK_SIZE):
+        yield bytes(view[i : i + CHUNK_SIZE])
+
+
+async def legacy_read(stream: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """The previous reader: accumulate text and re-parse the whole buffer."""
+    json_buffer = ""
+    async for chunk in stream:
+        line_str = chunk.decode().strip()
+        if not line_str:
+            continue
+        for json_line in line_str.split("\n"):
+            json_line = json_line.strip()
+            if not json_line:
+                continue
+            json_buffer += json_line
+            try:
+                data = json.loads(json_buffer)
+                json_buffer = ""
+                yield data
+            except json.JSONDecodeError:
+                continue
+
+
+async def run_reader(name: str, payload: bytes, count: int, codec: JSONCodec) -> float:
+    start = time.perf_counter()
+    received = 0
+    if name == "framed":
+        reader = _read_json_lines(
+            chunked(payload), max_buffer_size=len(payload), codec=codec
+        )
+    else:
+        reader = legacy_read(chunked(payload))
+    async for _ in reader:
+        received += 1
+    elapsed = time.perf_counter() - start
+    assert received == count, f"{name}: expected {count} messages, got {received}"
+    return elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10K,1M,50M")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--legacy-all", action="store_true")
+    parser.add_argument("--codec", default="json")
+    args = parser.parse_args()
+    codec = get_codec(args.codec)
+    print(f"codec: {codec.name}")
+
+    print(f"{'reader':<8} {'size':>8} {'msgs':>6} {'MB/s':>10} {'msgs/s':>12}")
+    for size_text in args.sizes.split(","):
+        size = parse_size(size_text)
+        record = make_record(size)
+        count = max(1, TOTAL_BYTES // len(record))
+        payload = record * count
+
+        readers = ["framed"]
+        if size <= LEGACY_LIMIT or args.legacy_all:
+            readers.append("legacy")
+        for name in readers:
+            best = min(
+                [
+                    await run_reader(name, payload, count, codec)
+                    for _ in range(args.repeat)
+                ]
+            )
+            mb_per_s = len(payload) / best / (1024 * 1024)
+            print(
+                f"{name:<8} {size_text:>8} {count:>6} {mb_per_s:>10.1f} {count / best:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    anyio.run(main)
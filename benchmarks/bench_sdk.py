@@ -0,0 +1,471 @@
+"""Micro-benchmark suite for the SDK's message path, run against in-memory transports.
+
+Cases (no CLI or network is involved):
+    parse          parse_message per message type, eager and lazy
+    framing        SubprocessCLITransport._read_messages_impl over chunked stdout
+    routing        Query._read_messages routing a session's messages to receive_messages
+    control        _send_control_request round trip (latency percentiles)
+    control_burst  permission responses to a burst of can_use_tool requests,
+                   written through a real file descriptor (one syscall per write)
+    stream_input   Query.stream_input writing user messages to the transport
+    mcp            control-protocol dispatch of SDK MCP tools/call requests
+
+Each case reports operations per second (higher is better) and, where it
+applies, latency percentiles in microseconds (lower is better). --json writes
+the results with the environment they were measured in, and --compare prints
+the change against a previous --json file, so a run before and after a change
+gives a before/after number for each case.
+
+Usage:
+    python benchmarks/bench_sdk.py [--cases parse,framing,...] [--repeat 5]
+                                   [--codec auto|orjson|msgspec|json]
+                                   [--json results.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable
+from typing import Any
+
+import anyio
+
+import claude_code_sdk
+from bench_codec import build_trace
+from claude_code_sdk import ClaudeCodeOptions
+from claude_code_sdk._internal.codec import JSONCodec, get_codec
+from claude_code_sdk._internal.message_parser import parse_message
+from claude_code_sdk._internal.query import Query
+from claude_code_sdk._internal.transport import Transport
+from claude_code_sdk._internal.transport.subprocess_cli import SubprocessCLITransport
+
+CHUNK_SIZE = 64 * 1024
+
+
+class MemoryTransport(Transport):
+    """Transport that reads preloaded messages and answers writes in-process.
+
+    ``respond`` is called with every written line and may return messages for
+    the reader, which is how the control round trip is simulated.
+    """
+
+    def __init__(
+        self,
+        messages: list[dict[str, Any]] | None = None,
+        respond: Callable[[str], list[dict[str, Any]]] | None = None,
+        codec: JSONCodec | None = None,
+    ):
+        self._codec = codec or get_codec()
+        self._respond = respond
+        self._send, self._receive = anyio.create_memory_object_stream[
+            dict[str, Any] | None
+        ](max_buffer_size=len(messages or []) + 1000)
+        for message in messages or []:
+            self._send.send_nowait(message)
+        if respond is None:
+            self._send.send_nowait(None)
+        self.bytes_written = 0
+        self.writes = 0
+
+    async def connect(self) -> None:
+        pass
+
+    async def write(self, data: str) -> None:
+        self.bytes_written += len(data)
+        self.writes += 1
+        if self._respond is not None:
+            for line in data.splitlines():
+                for message in self._respond(line):
+                    await self._send.send(message)
+
+    def read_messages(self) -> AsyncIterator[dict[str, Any]]:
+        return self._read()
+
+    async def _read(self) -> AsyncIterator[dict[str, Any]]:
+        async for message in self._receive:
+            if message is None:
+                return
+            yield message
+
+    async def close(self) -> None:
+        self._send.close()
+
+    def is_ready(self) -> bool:
+        return True
+
+    async def end_input(self) -> None:
+        pass
+
+
+class DevNullTransport(MemoryTransport):
+    """MemoryTransport whose writes also go to /dev/null, costing a syscall each.
+
+    The preloaded messages are yielded back to back, the way the stdout reader
+    yields every record of one pipe read before awaiting the next.
+    """
+
+    def __init__(self, messages: list[dict[str, Any]], expected_lines: int):
+        super().__init__(respond=lambda line: [])
+        self._messages = messages
+        self._fd = os.open(os.devnull, os.O_WRONLY)
+        self.lines = 0
+        self._expected_lines = expected_lines
+        self.done = anyio.Event()
+
+    async def _read(self) -> AsyncIterator[dict[str, Any]]:
+        for message in self._messages:
+            yield message
+        # Keep the stream open like a live CLI until the transport is closed
+        async for _ in self._receive:
+            pass
+
+    async def write(self, data: str) -> None:
+        # A checkpoint and a syscall per write, like sending to the CLI's stdin
+        await anyio.lowlevel.checkpoint()
+        os.write(self._fd, data.encode())
+        await super().write(data)
+        self.lines += data.count("\n")
+        if self.lines >= self._expected_lines:
+            self.done.set()
+
+    async def close(self) -> None:
+        await super().close()
+        os.close(self._fd)
+
+
+def best_of(repeat: int, func: Callable[[], Awaitable[float]]) -> float:
+    """Smallest wall time of ``repeat`` runs of an async case."""
+    return min(anyio.run(func) for _ in range(repeat))
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def session_messages(turns: int) -> list[dict[str, Any]]:
+    incoming, _ = build_trace(turns, tool_result_size=2000)
+    return [json.loads(record) for record in incoming]
+
+
+# Cases: each returns {metric: value}
+
+
+def bench_parse(args: argparse.Namespace) -> dict[str, float]:
+    by_type: dict[str, dict[str, Any]] = {}
+    for message in session_messages(1):
+        by_type.setdefault(message["type"], message)
+    results = {}
+    count = 20000
+    for type_name, message in by_type.items():
+        if type_name == "control_request":
+            continue  # routed by Query, never parsed into a Message
+        for lazy in (False, True):
+
+            async def run(message: dict[str, Any] = message, lazy: bool = lazy) -> float:
+                start = time.perf_counter()
+                for _ in range(count):
+                    parse_message(message, lazy=lazy)
+                return time.perf_counter() - start
+
+            key = f"{type_name}{'_lazy' if lazy else ''}_per_s"
+            results[key] = count / best_of(args.repeat, run)
+    return results
+
+
+class _FinishedProcess:
+    returncode = 0
+
+    async def wait(self) -> int:
+        return 0
+
+
+def bench_framing(args: argparse.Namespace) -> dict[str, float]:
+    codec = get_codec(args.codec)
+    incoming, _ = build_trace(200, tool_result_size=20000)
+    payload = b"\n".join(incoming) + b"\n"
+
+    async def chunks() -> AsyncIterator[bytes]:
+        view = memoryview(payload)
+        for i in range(0, len(view), CHUNK_SIZE):
+            yield bytes(view[i : i + CHUNK_SIZE])
+
+    async def run() -> float:
+        transport = SubprocessCLITransport(
+            "", ClaudeCodeOptions(cli_path="claude", json_codec=codec.name)
+        )
+        transport._process = _FinishedProcess()  # type: ignore[assignment]
+        transport._stdout_stream = chunks()  # type: ignore[assignment]
+        received = 0
+        start = time.perf_counter()
+        async for _ in transport.read_messages():
+            received += 1
+        elapsed = time.perf_counter() - start
+        assert received == len(incoming), f"expected {len(incoming)}, got {received}"
+        return elapsed
+
+    elapsed = best_of(args.repeat, run)
+    return {
+        "messages_per_s": len(incoming) / elapsed,
+        "mb_per_s": len(payload) / elapsed / (1024 * 1024),
+    }
+
+
+def bench_routing(args: argparse.Namespace) -> dict[str, float]:
+    messages = [
+        m for m in session_messages(500) if m["type"] != "control_request"
+    ]
+    # Responses to requests this Query never sent exercise the control branch
+    messages += [
+        {"type": "control_response", "response": {"subtype": "success", "request_id": f"x{i}"}}
+        for i in range(len(messages) // 10)
+    ]
+
+    async def run() -> float:
+        query = Query(MemoryTransport(messages), is_streaming_mode=True)
+        received = 0
+        start = time.perf_counter()
+        await query.start()
+        async for _ in query.receive_messages():
+            received += 1
+        elapsed = time.perf_counter() - start
+        await query.close()
+        return elapsed
+
+    elapsed = best_of(args.repeat, run)
+    return {"messages_per_s": len(messages) / elapsed}
+
+
+def bench_control(args: argparse.Namespace) -> dict[str, float]:
+    codec = get_codec(args.codec)
+    count = 5000
+    latencies: list[float] = []
+
+    def respond(line: str) -> list[dict[str, Any]]:
+        request = codec.loads(line)
+        return [
+            {
+                "type": "control_response",
+                "response": {
+                    "subtype": "success",
+                    "request_id": request["request_id"],
+                    "response": {},
+                },
+            }
+        ]
+
+    async def run() -> float:
+        query = Query(MemoryTransport(respond=respond, codec=codec), True, codec=codec)
+        await query.start()
+        latencies.clear()
+        start = time.perf_counter()
+        for _ in range(count):
+            sent = time.perf_counter()
+            await query._send_control_request({"subtype": "interrupt"})
+            latencies.append(time.perf_counter() - sent)
+        elapsed = time.perf_counter() - start
+        await query.close()
+        return elapsed
+
+    elapsed = best_of(args.repeat, run)
+    return {
+        "round_trips_per_s": count / elapsed,
+        "p50_us": percentile(latencies, 50) * 1e6,
+        "p99_us": percentile(latencies, 99) * 1e6,
+    }
+
+
+def bench_control_burst(args: argparse.Namespace) -> dict[str, float]:
+    codec = get_codec(args.codec)
+    count = 2000
+    requests = [
+        {
+            "type": "control_request",
+            "request_id": f"cli_{i}",
+            "request": {
+                "subtype": "can_use_tool",
+                "tool_name": "Read",
+                "input": {"file_path": f"/src/mod_{i}.py"},
+                "permission_suggestions": None,
+            },
+        }
+        for i in range(count)
+    ]
+
+    async def allow(name: str, tool_input: dict[str, Any], context: Any) -> Any:
+        return claude_code_sdk.PermissionResultAllow()
+
+    writes = {"count": 0}
+
+    async def run() -> float:
+        transport = DevNullTransport(requests, count)
+        query = Query(transport, True, can_use_tool=allow, codec=codec)
+        start = time.perf_counter()
+        await query.start()
+        await transport.done.wait()
+        elapsed = time.perf_counter() - start
+        writes["count"] = transport.writes
+        await query.close()
+        return elapsed
+
+    elapsed = best_of(args.repeat, run)
+    return {"responses_per_s": count / elapsed, "writes_per_response": writes["count"] / count}
+
+
+def bench_stream_input(args: argparse.Namespace) -> dict[str, float]:
+    codec = get_codec(args.codec)
+    count = 20000
+    message = {
+        "type": "user",
+        "message": {"role": "user", "content": "Summarize the last tool result " * 8},
+        "parent_tool_use_id": None,
+        "session_id": "default",
+    }
+
+    async def messages() -> AsyncIterable[dict[str, Any]]:
+        for _ in range(count):
+            yield message
+
+    written = {"bytes": 0}
+
+    async def run() -> float:
+        transport = MemoryTransport([], codec=codec)
+        query = Query(transport, is_streaming_mode=True, codec=codec)
+        start = time.perf_counter()
+        await query.stream_input(messages())
+        elapsed = time.perf_counter() - start
+        written["bytes"] = transport.bytes_written
+        await query.close()
+        return elapsed
+
+    elapsed = best_of(args.repeat, run)
+    return {
+        "messages_per_s": count / elapsed,
+        "mb_per_s": written["bytes"] / elapsed / (1024 * 1024),
+    }
+
+
+def bench_mcp(args: argparse.Namespace) -> dict[str, float]:
+    codec = get_codec(args.codec)
+    count = 5000
+
+    @claude_code_sdk.tool("add", "Add two numbers", {"a": int, "b": int})
+    async def add(arguments: dict[str, Any]) -> dict[str, Any]:
+        return {"content": [{"type": "text", "text": str(arguments["a"] + arguments["b"])}]}
+
+    server = claude_code_sdk.create_sdk_mcp_server("calc", tools=[add])
+    request = {
+        "type": "control_request",
+        "request_id": "cli_1",
+        "request": {
+            "subtype": "mcp_message",
+            "server_name": "calc",
+            "message": {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "tools/call",
+                "params": {"name": "add", "arguments": {"a": 2, "b": 3}},
+            },
+        },
+    }
+
+    async def run() -> float:
+        transport = MemoryTransport([], codec=codec)
+        query = Query(
+            transport, True, sdk_mcp_servers={"calc": server["instance"]}, codec=codec
+        )
+        start = time.perf_counter()
+        for _ in range(count):
+            await query._handle_control_request(request)  # type: ignore[arg-type]
+        elapsed = time.perf_counter() - start
+        assert transport.writes == count
+        await query.close()
+        return elapsed
+
+    return {"calls_per_s": count / best_of(args.repeat, run)}
+
+
+CASES: dict[str, Callable[[argparse.Namespace], dict[str, float]]] = {
+    "parse": bench_parse,
+    "framing": bench_framing,
+    "routing": bench_routing,
+    "control": bench_control,
+    "control_burst": bench_control_burst,
+    "stream_input": bench_stream_input,
+    "mcp": bench_mcp,
+}
+
+
+def lower_is_better(metric: str) -> bool:
+    return metric.endswith("_us") or metric.startswith("writes_per")
+
+
+def print_results(results: dict[str, dict[str, float]], baseline: dict[str, Any] | None) -> None:
+    base = baseline["results"] if baseline else {}
+    header = f"{'case':<14} {'metric':<24} {'value':>14}"
+    print(header + (f" {'baseline':>14} {'change':>9}" if baseline else ""))
+    for case, metrics in results.items():
+        if "skipped" in metrics:
+            print(f"{case:<14} skipped: {metrics['skipped']}")
+            continue
+        for metric, value in metrics.items():
+            line = f"{case:<14} {metric:<24} {value:>14,.1f}"
+            old = base.get(case, {}).get(metric)
+            if isinstance(old, (int, float)) and old:
+                change = value / old - 1
+                if lower_is_better(metric):
+                    change = -change
+                line += f" {old:>14,.1f} {change:>+8.1%}"
+            print(line)
+    if baseline:
+        print("(change: positive is an improvement)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--codec", default="auto")
+    parser.add_argument("--json", dest="json_path")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+    args.codec = get_codec(args.codec).name
+
+    results: dict[str, dict[str, Any]] = {}
+    for name in args.cases.split(","):
+        if name not in CASES:
+            parser.error(f"unknown case: {name} (choose from {', '.join(CASES)})")
+        try:
+            results[name] = CASES[name](args)
+        except ImportError as e:
+            results[name] = {"skipped": str(e)}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(f"codec: {args.codec}  python: {platform.python_version()}")
+    print_results(results, baseline)
+
+    if args.json_path:
+        report = {
+            "environment": {
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "machine": platform.machine(),
+                "sdk": claude_code_sdk.__version__,
+                "codec": args.codec,
+                "repeat": args.repeat,
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            },
+            "results": results,
+        }
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import dataclasses
+import logging
+import os
+import queue
+import random
+import reprlib
+import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+# サーバーのログ（"chat"ロガーとその子）
+# print()はイベントループ上で同期的にstdoutへ書くので、大きなツール結果を
+# メッセージごとに出すと1件数ミリ秒かかり、ログもあふれる
+#
+# - 出力はキュー経由で別スレッドが書く（キューが満杯なら捨てて数える）
+# - レベルはCHAT_LOG_LEVEL（デフォルトINFO）
+# - DEBUGログ（受信メッセージなど）はリクエスト単位で出すかを決める
+#   CHAT_LOG_DEBUG_SAMPLE_RATEの割合のリクエストと、X-Debug-Log: 1を付けたリクエストだけ出す
+# - 大きな値はtruncated()で包むと、出力するときだけreprを作り、CHAT_LOG_MAX_CHARSで切り詰める
+#   （reprは切り詰めながら作るので、大きなツール結果でも全体の文字列は作らない）
+
+logger = logging.getLogger("chat")
+
+LOG_LEVEL = logging.getLevelName(os.getenv("CHAT_LOG_LEVEL", "INFO").upper())
+DEBUG_SAMPLE_RATE = float(os.getenv("CHAT_LOG_DEBUG_SAMPLE_RATE", "0"))
+# 0にするとX-Debug-Logヘッダーを無視する（クライアントにログを増やさせない）
+DEBUG_HEADER_ENABLED = os.getenv("CHAT_LOG_DEBUG_HEADER", "1") == "1"
+MAX_CHARS = int(os.getenv("CHAT_LOG_MAX_CHARS", "2000"))
+QUEUE_SIZE = int(os.getenv("CHAT_LOG_QUEUE_SIZE", "10000"))
+if not isinstance(LOG_LEVEL, int):
+    raise ValueError(f"不明なログレベル: {LOG_LEVEL}（DEBUG / INFO / WARNING / ERROR）")
+
+# 今処理しているリクエスト（asyncioのタスクごと。作ったタスクにも引き継がれる）
+_request_id: ContextVar[str] = ContextVar("request_id", default="-")
+_debug: ContextVar[bool] = ContextVar("debug", default=False)
+
+
+def begin_request(request_id: Optional[str], request=None) -> None:
+    """このリクエストのログにrequest_idを付け、DEBUGログを出すかを決める
+
+    requestにX-Debug-Log: 1があれば必ず出す。なければサンプリングで決める
+    """
+    set_request_id(request_id)
+    header = request.headers.get("X-Debug-Log", "") if request is not None else ""
+    forced = DEBUG_HEADER_ENABLED and header.strip().lower() in ("1", "true", "on")
+    _debug.set(forced or (DEBUG_SAMPLE_RATE > 0 and random.random() < DEBUG_SAMPLE_RATE))
+
+
+def set_request_id(request_id: Optional[str]) -> None:
+    """ログに付けるrequest_idだけ変える（バッチの各件など。DEBUGを出すかは引き継ぐ）"""
+    _request_id.set(request_id or "-")
+
+
+def debug_enabled() -> bool:
+    """このリクエストでDEBUGログを出すか（引数を作る前にこれで確認する）"""
+    return _debug.get() or LOG_LEVEL <= logging.DEBUG
+
+
+class _LimitedRepr(reprlib.Repr):
+    """文字列やリストを切り詰めながらreprを作る
+
+    メッセージやブロック（dataclass）もフィールドごとに切り詰める
+    （reprlibのままだと、知らない型は全体のreprを作ってから切り詰める）
+    """
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.maxstring = limit
+        self.maxother = limit
+        self.maxlist = self.maxtuple = 20
+        self.maxdict = 20
+
+    def repr_instance(self, x: Any, level: int) -> str:
+        if not dataclasses.is_dataclass(x) or isinstance(x, type):
+            return super().repr_instance(x, level)
+        if level <= 0:
+            return f"{type(x).__name__}(...)"
+        fields = ", ".join(
+            f"{field.name}={self.repr1(getattr(x, field.name), level - 1)}"
+            for field in dataclasses.fields(x)
+            if field.repr
+        )
+        return f"{type(x).__name__}({fields})"
+
+
+class truncated:
+    """ログの引数を包む。出力するときに初めて文字列にし、長ければ切り詰める"""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int = 0):
+        self.value = value
+        self.limit = limit or MAX_CHARS
+
+    def __str__(self) -> str:
+        if isinstance(self.value, str):
+            if len(self.value) <= self.limit:
+                return self.value
+            return f"{self.value[:self.limit]}…（{len(self.value)}文字）"
+        text = _LimitedRepr(self.limit).repr(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}…"
+
+
+class _RequestFilter(logging.Filter):
+    """request_idを付け、DEBUGを出さないリクエストのDEBUGログを捨てる"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < LOG_LEVEL and not _debug.get():
+            return False
+        record.request_id = _request_id.get()
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """キューが満杯なら待たずに捨てる（ログのせいでリクエストを遅くしない）"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue: queue.Queue = queue.Queue(QUEUE_SIZE)
+_handler = _DroppingQueueHandler(_queue)
+_handler.addFilter(_RequestFilter())
+_output = logging.StreamHandler(sys.stdout)
+_output.setFormatter(
+    logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+)
+_listener = QueueListener(_queue, _output)
+_listening = False  # 書き込みスレッドが動いているか
+
+# レベルの判定はフィルターで行う（サンプリングしたリクエストのDEBUGを通すため）
+logger.setLevel(logging.DEBUG)
+logger.addHandler(_handler)
+logger.propagate = False
+
+
+def start() -> None:
+    """書き込みスレッドを開始する（それまでのログはキューに溜まる）"""
+    global _listening
+    if not _listening:
+        _listener.start()
+        _listening = True
+
+
+def stop() -> None:
+    """キューに残っているログを書き出してスレッドを止める"""
+    global _listening
+    if _listening:
+        _listener.stop()
+        _listening = False
+
+
+def stats() -> dict:
+    return {
+        "level": logging.getLevelName(LOG_LEVEL),
+        "debug_sample_rate": DEBUG_SAMPLE_RATE,
+        "queued": _queue.qsize(),
+        "dropped": _handler.dropped,
+    }
@@ -0,0 +1,566 @@
+import asyncio
+import logging
+import subprocess
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, Callable, Optional
+
+from claude_code_sdk import ClaudeCodeOptions, ClaudeSDKClient
+
+# Claude CLIプロセスのウォームプール
+# query()はリクエストごとにNodeのCLIプロセスを起動するので、起動時間が毎回かかる
+# ここではストリーミングモードで接続・初期化済みのClaudeSDKClientを事前に用意しておき、
+# リクエストに貸し出して、使い終わったら返却 or 作り直す
+
+logger = logging.getLogger("chat.pool")
+
+
+class PooledClient:
+    """プールで管理するClaudeSDKClient（CLIプロセス1つ分）
+
+    on_spawnを渡すと、起動と初期化が終わったときに呼ぶ（起動時間の計測用）
+    """
+
+    def __init__(
+        self,
+        options: ClaudeCodeOptions,
+        on_spawn: Optional[Callable[["PooledClient"], None]] = None,
+    ):
+        self.client = ClaudeSDKClient(options=options)
+        self._on_spawn = on_spawn
+        self.uses = 0  # 貸し出し回数
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        self.broken = False  # 利用中にエラーが起きたらTrue（返却時に破棄する）
+        self.detached = False  # プールから切り離された（セッションキャッシュへ移った）らTrue
+        self.turn_stopped = False  # 実行中のターンをinterruptで止められたらTrue（プロセスは再利用できる）
+        self.lock = asyncio.Lock()  # 同じプロセスへの同時送信を防ぐ
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+
+    async def start(self) -> None:
+        """CLIを起動して初期化が終わるまで待つ"""
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self._error:
+            raise self._error
+        if self._on_spawn:
+            self._on_spawn(self)
+
+    async def _run(self) -> None:
+        # SDK内部のanyioタスクグループは、接続したタスクと同じタスクで閉じる必要がある
+        # なので接続から切断までをこの専用タスクで行い、貸し出し先では送受信だけ行う
+        try:
+            await self.client.connect()
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            with suppress(Exception):
+                await self.client.disconnect()
+            return
+        self._ready.set()
+        try:
+            await self._closing.wait()
+        finally:
+            with suppress(Exception):
+                await self.client.disconnect()
+
+    def is_alive(self) -> bool:
+        """ヘルスチェック: CLIプロセスが生きていて送受信できる状態か"""
+        if self.broken or self._error or self._task is None or self._task.done():
+            return False
+        transport = self.client._transport
+        if transport is None or not transport.is_ready():
+            return False
+        process = getattr(transport, "_process", None)
+        return process is not None and process.returncode is None
+
+    async def stop_turn(self, grace: float) -> bool:
+        """実行中のターンをinterruptで止め、ResultMessageまで読み捨てる
+
+        grace秒以内に止まらなければFalse（プロセスは壊れたものとして扱う）
+        """
+        try:
+            await asyncio.wait_for(self._interrupt_and_drain(), grace)
+        except Exception as e:
+            logger.warning("interruptで止まらなかったのでプロセスを破棄: %r", e)
+            self.broken = True
+            return False
+        self.turn_stopped = True
+        return True
+
+    async def _interrupt_and_drain(self) -> None:
+        await self.client.interrupt()
+        async for _ in self.client.receive_response(message_types=()):
+            pass
+
+    @property
+    def pid(self) -> Optional[int]:
+        transport = self.client._transport
+        process = getattr(transport, "_process", None) if transport else None
+        return process.pid if process else None
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_used_at
+
+    async def close(self) -> None:
+        """CLIを終了する（接続したタスク側で切断される）"""
+        self._closing.set()
+        if self._task:
+            with suppress(Exception):
+                await self._task
+
+
+class ClaudeClientPool:
+    """接続済みClaudeSDKClientのプール
+
+    - min_size: 常に待機させておくプロセス数
+    - max_size: 同時に存在できるプロセス数の上限（貸し出し中を含む）
+    - idle_timeout: min_sizeを超えた分のプロセスを、この秒数使われなければ終了する
+    - max_uses: 1プロセスを貸し出す回数の上限。CLIは会話の文脈をプロセス内に持つので、
+      別リクエストと文脈を混ぜないためにデフォルトは1（1会話ごとに作り直す）
+    - health_check_interval: 待機中プロセスの生存確認・補充の間隔（秒）
+    - on_spawn: プロセスの起動が終わるたびに呼ぶ関数
+    """
+
+    def __init__(
+        self,
+        options_factory: Callable[[], ClaudeCodeOptions],
+        min_size: int = 1,
+        max_size: int = 4,
+        idle_timeout: float = 300.0,
+        max_uses: int = 1,
+        health_check_interval: float = 10.0,
+        on_spawn: Optional[Callable[[PooledClient], None]] = None,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("プールサイズの指定が不正です (0 <= min_size <= max_size, max_size >= 1)")
+        self._options_factory = options_factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_uses = max_uses
+        self.health_check_interval = health_check_interval
+        self._on_spawn = on_spawn
+
+        self._idle: list[PooledClient] = []  # 待機中（末尾が最近返却されたもの）
+        self._leased: set[PooledClient] = set()  # 貸し出し中
+        self._spawning = 0  # 起動中の数
+        self._cond = asyncio.Condition()
+        self._background: set[asyncio.Task] = set()
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    @property
+    def size(self) -> int:
+        """起動中を含めたプロセス数"""
+        return len(self._idle) + len(self._leased) + self._spawning
+
+    def stats(self) -> dict:
+        return {
+            "idle": len(self._idle),
+            "leased": len(self._leased),
+            "spawning": self._spawning,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+        }
+
+    def clients(self) -> list[PooledClient]:
+        """待機中と貸し出し中のプロセス"""
+        return self._idle + list(self._leased)
+
+    async def start(self) -> None:
+        """min_size分のプロセスを起動し、メンテナンスタスクを開始する"""
+        self._closed = False
+        await asyncio.gather(
+            *(self._spawn_idle() for _ in range(self.min_size)), return_exceptions=True
+        )
+        self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+
+    async def stop(self) -> None:
+        """全プロセスを終了する"""
+        self._closed = True
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._maintenance_task
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        async with self._cond:
+            clients = self._idle + list(self._leased)
+            self._idle.clear()
+            self._leased.clear()
+            self._cond.notify_all()
+        await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[PooledClient]:
+        """プロセスを1つ借りる。with文を抜けると返却（または破棄）される"""
+        pooled = await self._acquire()
+        try:
+            yield pooled
+        except BaseException:
+            pooled.broken = True
+            raise
+        finally:
+            await self._release(pooled)
+
+    async def _acquire(self) -> PooledClient:
+        async with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("プールは停止しています")
+                # 最近返却されたものから使う（古いものはアイドル回収されやすくする）
+                while self._idle:
+                    pooled = self._idle.pop()
+                    if pooled.is_alive():
+                        self._leased.add(pooled)
+                        return pooled
+                    self._discard(pooled)
+                if self.size < self.max_size:
+                    self._spawning += 1
+                    break
+                await self._cond.wait()
+
+        # 空きがなければその場で起動する（ロックの外で行う）
+        pooled = PooledClient(self._options_factory(), self._on_spawn)
+        try:
+            await pooled.start()
+        except BaseException:
+            async with self._cond:
+                self._spawning -= 1
+                self._cond.notify()
+            await pooled.close()
+            raise
+        async with self._cond:
+            self._spawning -= 1
+            self._leased.add(pooled)
+        return pooled
+
+    def detach(self, pooled: PooledClient) -> None:
+        """貸し出し中のプロセスをプールの管理から外す（返却時に閉じずに手放す）
+
+        切り離したプロセスは呼び出し側が close() する責任を持つ
+        """
+        pooled.detached = True
+
+    async def _release(self, pooled: PooledClient) -> None:
+        pooled.uses += 1
+        pooled.last_used_at = time.monotonic()
+        async with self._cond:
+            self._leased.discard(pooled)
+            if pooled.detached and not pooled.broken:
+                self._replenish()
+            elif (
+                self._closed
+                or pooled.uses >= self.max_uses
+                or not pooled.is_alive()
+            ):
+                self._discard(pooled)
+                self._replenish()
+            else:
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    def _discard(self, pooled: PooledClient) -> None:
+        """プロセスをバックグラウンドで終了する"""
+        self._run_background(pooled.close())
+
+    def _replenish(self) -> None:
+        """待機中のプロセスがmin_sizeに満たなければ補充する"""
+        if self._closed:
+            return
+        missing = self.min_size - len(self._idle) - self._spawning
+        for _ in range(max(0, min(missing, self.max_size - self.size))):
+            self._run_background(self._spawn_idle())
+
+    async def _spawn_idle(self) -> None:
+        async with self._cond:
+            if self._closed or self.size >= self.max_size:
+                return
+            self._spawning += 1
+        pooled = PooledClient(self._options_factory(), self._on_spawn)
+        try:
+            await pooled.start()
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                logger.error("プロセス起動エラー: %s", e)
+            await pooled.close()
+            async with self._cond:
+                self._spawning -= 1
+                self._cond.notify()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        async with self._cond:
+            self._spawning -= 1
+            if self._closed:
+                self._discard(pooled)
+            else:
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    def _run_background(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            async with self._cond:
+                keep: list[PooledClient] = []
+                for pooled in self._idle:
+                    if not pooled.is_alive():
+                        # ヘルスチェック失敗: 死んだプロセスは破棄
+                        self._discard(pooled)
+                    else:
+                        keep.append(pooled)
+                # アイドル回収: min_sizeを超えた分で、長く使われていないものを終了
+                # keepは古い順なので先頭から回収する
+                surplus = len(keep) - self.min_size
+                reaped: list[PooledClient] = []
+                for pooled in keep:
+                    if surplus <= 0:
+                        break
+                    if pooled.idle_seconds() >= self.idle_timeout:
+                        reaped.append(pooled)
+                        surplus -= 1
+                for pooled in reaped:
+                    keep.remove(pooled)
+                    self._discard(pooled)
+                self._idle = keep
+                self._replenish()
+                self._cond.notify_all()
+
+
+def child_rss_bytes(pid: int) -> Optional[int]:
+    """子プロセス（CLI）の常駐メモリ量をバイトで返す。取得できなければNone"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # /procがない環境（macOS）はpsで取得する
+    try:
+        out = subprocess.run(
+            ["ps", "-o", "rss=", "-p", str(pid)],
+            capture_output=True, text=True, timeout=2,
+        ).stdout.strip()
+        return int(out) * 1024 if out else None
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+
+class SessionClientCache:
+    """セッションIDごとに接続済みのClaudeSDKClientを保持するLRUキャッシュ
+
+    続きの会話は起動済みプロセスにclient.query()で送るので、
+    --resumeでCLIが履歴をディスクから読み直す必要がない
+    キャッシュにない（追い出された・サーバー再起動後）場合だけ--resumeで起動する
+
+    - max_sessions: 保持するセッション数の上限。超えたら最も古く使われたものから終了
+    - idle_ttl: この秒数使われなかったセッションは終了
+    - max_rss_bytes: CLIプロセスのメモリ使用量がこれを超えたら終了（次回は--resumeで復帰）
+    - reap_interval: 追い出しチェックの間隔（秒）
+    - on_spawn: --resumeでプロセスを起動するたびに呼ぶ関数
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 16,
+        idle_ttl: float = 600.0,
+        max_rss_bytes: Optional[int] = None,
+        reap_interval: float = 30.0,
+        on_spawn: Optional[Callable[[PooledClient], None]] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_rss_bytes = max_rss_bytes
+        self.reap_interval = reap_interval
+        self._on_spawn = on_spawn
+        self._sessions: "OrderedDict[str, PooledClient]" = OrderedDict()  # 末尾が最近使われたもの
+        self._lock = asyncio.Lock()
+        # セッションIDごとのキャッシュミス処理の排他（[ロック, 待っている数]）
+        self._starting: dict[str, list] = {}
+        self._reaper_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def clients(self) -> list[PooledClient]:
+        return list(self._sessions.values())
+
+    async def start(self) -> None:
+        self._reaper_task = asyncio.create_task(self._reaper_loop())
+
+    async def stop(self) -> None:
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._reaper_task
+        async with self._lock:
+            clients = list(self._sessions.values())
+            self._sessions.clear()
+        await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+
+    async def adopt(self, session_id: str, pooled: PooledClient) -> None:
+        """初回の会話を終えたプロセスをセッションIDで登録する
+
+        同じセッションの古いプロセスは閉じる。利用中ならそのターンが終わってから
+        lease()の最後で閉じる（実行中のターンを巻き込まない）
+        """
+        async with self._lock:
+            old = self._sessions.pop(session_id, None)
+            self._sessions[session_id] = pooled
+            evicted = self._evict_overflow()
+        if old is not None and old is not pooled and not old.lock.locked():
+            evicted.append(old)
+        await self._close_all(evicted)
+
+    @asynccontextmanager
+    async def lease(
+        self, session_id: str, options_factory: Callable[[], ClaudeCodeOptions]
+    ) -> AsyncIterator[PooledClient]:
+        """セッションのプロセスを借りる。なければoptions_factory()の設定（--resume）で起動する
+
+        同じセッションへの同時リクエストは順番に処理される
+        """
+        while True:
+            pooled = await self._get_or_start(session_id, options_factory)
+            async with pooled.lock:
+                # 順番を待っている間に追い出された・置き換えられたら、今のプロセスを取り直す
+                if self._sessions.get(session_id) is not pooled:
+                    continue
+                pooled.turn_stopped = False
+                try:
+                    yield pooled
+                except asyncio.CancelledError:
+                    # stop_turn()で止められていればプロセスはそのまま使える
+                    if not pooled.turn_stopped:
+                        pooled.broken = True
+                    raise
+                except BaseException:
+                    pooled.broken = True
+                    raise
+                finally:
+                    pooled.uses += 1
+                    pooled.last_used_at = time.monotonic()
+                    if self._sessions.get(session_id) is not pooled:
+                        # 利用中にadopt()で置き換えられたプロセス（キャッシュにないのでevictでは閉じない）
+                        await pooled.close()
+                    elif pooled.broken:
+                        await self.evict(session_id, pooled)
+            return
+
+    async def _get_or_start(
+        self, session_id: str, options_factory: Callable[[], ClaudeCodeOptions]
+    ) -> PooledClient:
+        """キャッシュのプロセスを返す。なければ--resumeで起動して登録する
+
+        同じセッションのキャッシュミスは1つずつ処理するので、
+        同時に届いたリクエストがそれぞれ--resumeで起動して互いを閉じることはない
+        """
+        entry = self._starting.get(session_id)
+        if entry is None:
+            entry = self._starting[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._lock:
+                    pooled = self._sessions.get(session_id)
+                    if pooled is not None and pooled.is_alive():
+                        self._sessions.move_to_end(session_id)
+                        self.hits += 1
+                        return pooled
+                self.misses += 1
+                pooled = PooledClient(options_factory(), self._on_spawn)
+                try:
+                    await pooled.start()
+                except BaseException:
+                    await pooled.close()
+                    raise
+                await self.adopt(session_id, pooled)
+                return pooled
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._starting[session_id]
+
+    async def evict(
+        self,
+        session_id: str,
+        pooled: Optional[PooledClient] = None,
+        idle_since: Optional[float] = None,
+    ) -> None:
+        """セッションのプロセスを終了してキャッシュから外す
+
+        idle_since（last_used_atの値）を渡すと、利用中か、それより後に使われたプロセスは外さない
+        （追い出しチェックの判定中に始まったターンを巻き込まない）
+        """
+        async with self._lock:
+            current = self._sessions.get(session_id)
+            if current is None or (pooled is not None and current is not pooled):
+                return
+            if idle_since is not None and (current.lock.locked() or current.last_used_at != idle_since):
+                return
+            del self._sessions[session_id]
+        self.evictions += 1
+        await current.close()
+
+    def _evict_overflow(self) -> list[PooledClient]:
+        """max_sessionsを超えた分を古い順に外す（利用中のものは除く）。ロック内で呼ぶ"""
+        evicted = []
+        for sid in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            pooled = self._sessions[sid]
+            if pooled.lock.locked():
+                continue
+            del self._sessions[sid]
+            evicted.append(pooled)
+        self.evictions += len(evicted)
+        return evicted
+
+    async def _close_all(self, clients: list[PooledClient]) -> None:
+        await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+
+    async def _reaper_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            async with self._lock:
+                candidates = [
+                    (sid, pooled, pooled.last_used_at)
+                    for sid, pooled in self._sessions.items()
+                    if not pooled.lock.locked()
+                ]
+            expired = []
+            for sid, pooled, last_used_at in candidates:
+                if not pooled.is_alive() or pooled.idle_seconds() >= self.idle_ttl:
+                    expired.append((sid, pooled, last_used_at))
+                elif self.max_rss_bytes and pooled.pid:
+                    rss = await asyncio.to_thread(child_rss_bytes, pooled.pid)
+                    if rss is not None and rss > self.max_rss_bytes:
+                        logger.warning("メモリ超過のためセッションを終了: %s (%d bytes)", sid, rss)
+                        expired.append((sid, pooled, last_used_at))
+            # 判定の間に借りられた・使われたものは、evictの中で除く
+            for sid, pooled, last_used_at in expired:
+                await self.evict(sid, pooled, idle_since=last_used_at)
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+# 非同期ジョブのキュー（sqliteに保存するので、サーバーを再起動してもジョブは残る）
+# 長いエージェントの実行を/api/chatでHTTP接続を開いたまま待つと、プロキシで切られる
+# ジョブとして受け付けてIDをすぐに返し、ワーカーが順に実行する
+#
+# ジョブの状態: queued → running → succeeded / failed
+# - ワーカーはジョブを取り出すと、visibility_timeout秒の間だけ自分のものにする
+#   （実行中は定期的に延長する。ワーカーが落ちたら期限切れで他のワーカーが取り直す）
+# - 実行に失敗したらmax_attempts回まで再試行する
+# - 結果の記録・延長・返却は、取り出したときの試行回数（attempts）がまだ実行中の場合だけ行う
+#   （期限切れで他のワーカーに取り直されたジョブを、遅れて終わった古い実行が上書きしない）
+
+logger = logging.getLogger("chat.jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueue:
+    """sqliteのジョブキュー（読み書きはブロックするので、スレッドで実行する）"""
+
+    def __init__(
+        self,
+        path: str,
+        visibility_timeout: float = 60.0,
+        max_attempts: int = 3,
+        retry_delay: float = 5.0,
+    ):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " visible_at REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " result TEXT,"
+            " error TEXT)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, visible_at, created_at)"
+        )
+
+    async def enqueue(self, payload: dict) -> str:
+        """ジョブを追加してIDを返す"""
+        job_id = str(uuid.uuid4())
+        await asyncio.to_thread(self._enqueue_sync, job_id, json.dumps(payload, ensure_ascii=False))
+        return job_id
+
+    async def claim(self) -> Optional[dict]:
+        """実行できるジョブを1つ取り出して実行中にする（なければNone）
+
+        attemptsが今回の試行回数。以下のメソッドにはこの値を渡す
+        """
+        return await asyncio.to_thread(self._claim_sync)
+
+    async def extend(self, job_id: str, attempt: int) -> None:
+        """実行中のジョブの期限を延長する"""
+        await asyncio.to_thread(self._extend_sync, job_id, attempt)
+
+    async def complete(self, job_id: str, attempt: int, result: dict) -> bool:
+        """結果を記録する。他のワーカーに取り直されていたら記録せずにFalseを返す"""
+        return await asyncio.to_thread(
+            self._finish_sync, job_id, attempt, SUCCEEDED, json.dumps(result, ensure_ascii=False), None
+        )
+
+    async def fail(self, job_id: str, attempt: int, error: str) -> Optional[str]:
+        """失敗を記録する。再試行できればqueuedに戻す。新しい状態を返す
+
+        他のワーカーに取り直されていたら記録せずにNoneを返す
+        """
+        return await asyncio.to_thread(self._fail_sync, job_id, attempt, error)
+
+    async def release(self, job_id: str, attempt: int) -> None:
+        """実行を中断したジョブを、試行回数を増やさずにキューへ戻す（サーバー停止時など）"""
+        await asyncio.to_thread(self._release_sync, job_id, attempt)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._get_sync, job_id)
+
+    async def stats(self) -> dict:
+        """状態ごとのジョブ数"""
+        return await asyncio.to_thread(self._stats_sync)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _stats_sync(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def _enqueue_sync(self, job_id: str, payload: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, payload, status, visible_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, payload, QUEUED, now, now, now),
+            )
+
+    def _claim_sync(self) -> Optional[dict]:
+        # 複数のワーカー（プロセス）が同じファイルを使っても1件を取り合わないように、
+        # 書き込みロックを取ってから選んで更新する
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._db.execute(
+                        "SELECT * FROM jobs WHERE status IN (?, ?) AND visible_at <= ?"
+                        " ORDER BY created_at LIMIT 1",
+                        (QUEUED, RUNNING, now),
+                    ).fetchone()
+                    if row is None:
+                        self._db.execute("COMMIT")
+                        return None
+                    if row["status"] == RUNNING and row["attempts"] >= self.max_attempts:
+                        # 実行中のまま期限が切れ続けた（ワーカーが落ち続けた）ジョブは諦める
+                        self._db.execute(
+                            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                            (FAILED, "ワーカーが応答しなくなりました", now, row["id"]),
+                        )
+                        continue
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, visible_at = ?,"
+                        " updated_at = ? WHERE id = ?",
+                        (RUNNING, now + self.visibility_timeout, now, row["id"]),
+                    )
+                    self._db.execute("COMMIT")
+                    job = self._to_dict(row)
+                    job["status"] = RUNNING
+                    job["attempts"] += 1
+                    return job
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _extend_sync(self, job_id: str, attempt: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET visible_at = ?, updated_at = ?"
+                " WHERE id = ? AND status = ? AND attempts = ?",
+                (now + self.visibility_timeout, now, job_id, RUNNING, attempt),
+            )
+
+    def _finish_sync(
+        self, job_id: str, attempt: int, status: str, result: Optional[str], error: Optional[str]
+    ) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?"
+                " WHERE id = ? AND status = ? AND attempts = ?",
+                (status, result, error, time.time(), job_id, RUNNING, attempt),
+            )
+            return cursor.rowcount > 0
+
+    def _fail_sync(self, job_id: str, attempt: int, error: str) -> Optional[str]:
+        now = time.time()
+        status = QUEUED if attempt < self.max_attempts else FAILED
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, visible_at = ?, updated_at = ?"
+                " WHERE id = ? AND status = ? AND attempts = ?",
+                (status, error, now + self.retry_delay, now, job_id, RUNNING, attempt),
+            )
+            return status if cursor.rowcount > 0 else None
+
+    def _release_sync(self, job_id: str, attempt: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), visible_at = ?,"
+                " updated_at = ? WHERE id = ? AND status = ? AND attempts = ?",
+                (QUEUED, now, now, job_id, RUNNING, attempt),
+            )
+
+    def _get_sync(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        return {
+            "job_id": row["id"],
+            "request": json.loads(row["payload"]),
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+        }
+
+
+class JobWorkerPool:
+    """キューからジョブを取り出して実行するワーカー
+
+    - handler: ジョブ（dict）を受け取って結果のdictを返すコルーチン関数
+    - concurrency: 同時に実行するジョブ数
+    - poll_interval: キューが空のときに次を見にいくまでの秒数
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[dict], Awaitable[dict]],
+        concurrency: int = 2,
+        poll_interval: float = 1.0,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.running = 0
+        self._workers: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._worker_loop()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def stats(self) -> dict:
+        return {"workers": len(self._workers), "running": self.running, **await self.queue.stats()}
+
+    async def _worker_loop(self) -> None:
+        while True:
+            try:
+                job = await self.queue.claim()
+            except Exception as e:
+                logger.error("ジョブの取り出しに失敗: %s", e)
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict) -> None:
+        job_id, attempt = job["job_id"], job["attempts"]
+        logger.info("ジョブ開始: %s（%d回目）", job_id, attempt)
+        self.running += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, attempt))
+        try:
+            result = await self.handler(job)
+        except asyncio.CancelledError:
+            # サーバー停止: 次に起動したワーカーが最初から実行する
+            await asyncio.shield(self.queue.release(job_id, attempt))
+            raise
+        except Exception as e:
+            status = await self.queue.fail(job_id, attempt, str(e))
+            if status is None:
+                logger.warning("ジョブ失敗: %s %s（他のワーカーが実行中のため記録しない）", job_id, e)
+            else:
+                logger.warning("ジョブ失敗: %s %s（%s）", job_id, e, status)
+        else:
+            if await self.queue.complete(job_id, attempt, result):
+                logger.info("ジョブ完了: %s", job_id)
+            else:
+                logger.warning("ジョブ完了: %s（他のワーカーが実行中のため記録しない）", job_id)
+        finally:
+            heartbeat.cancel()
+            self.running -= 1
+
+    async def _heartbeat(self, job_id: str, attempt: int) -> None:
+        # 期限の1/3ごとに延長する（失敗しても止めずに次の回で延長し直す）
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                await self.queue.extend(job_id, attempt)
+            except Exception as e:
+                logger.error("ジョブの期限の延長に失敗: %s %s", job_id, e)
@@ -1,5 +1,5 @@
 import asyncio
-from claude_code_sdk import ClaudeSDKClient, ClaudeCodeOptions, query
+from claude_code_sdk import ClaudeSDKClient, ClaudeCodeOptions, ResultMessage, query
 
 async def start_new_session():
     async with ClaudeSDKClient() as client:
@@ -20,12 +20,13 @@ async def start_new_session():
 # 方法2：セッション管理でquery関数を使用
 async def resume_session():
     # 最新の会話を継続
+    # 最終結果だけ必要なので、ResultMessage以外はパースせずに捨てる
     async for message in query(
         prompt="今度はパフォーマンス向上のためにこれをリファクタリングしてください",
-        options=ClaudeCodeOptions(continue_conversation=True)
+        options=ClaudeCodeOptions(continue_conversation=True),
+        message_types=[ResultMessage]
     ):
-        if type(message).__name__ == "ResultMessage":
-            print(message.result)
+        print(message.result)
 
     # 特定のセッションを再開（実際のセッションIDが必要）
     # 注意: 以下のIDはサンプル用のダミーIDです
@@ -36,10 +37,10 @@ async def resume_session():
             options=ClaudeCodeOptions(
                 resume="550e8400-e29b-41d4-a716-446655440000",  # ダミーID
                 max_turns=3
-            )
+            ),
+            message_types=[ResultMessage]
         ):
-            if type(message).__name__ == "ResultMessage":
-                print(message.result)
+            print(message.result)
     except Exception as e:
         print(f"セッション再開エラー: {e}")
         print("有効なセッションIDが必要です")
@@ -0,0 +1,182 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+# リクエストログ（JSONL、1行1リクエスト）
+# リクエストごとのレイテンシ・コスト・トークン数・セッションIDを残す
+#
+# リクエストの処理中はdequeに積むだけにして、ファイルへの書き込みは
+# まとめてスレッドで行う（イベントループを止めない）
+# ファイルがmax_bytesを超えるか、max_age秒たったらローテーションして、
+# 古いファイルはgzipで圧縮する
+
+logger = logging.getLogger("chat.request_log")
+
+
+class RequestLogWriter:
+    """バッファ付きのJSONLライター
+
+    - path: 書き込むファイル
+    - flush_interval: 書き込む間隔（秒）
+    - batch_size: この件数たまったら間隔を待たずに書き込む
+    - max_pending: 書き込み待ちの上限（超えたら古いものから捨てる。ディスクが詰まっても
+      メモリを使い切らないように）
+    - max_bytes / max_age: ローテーションする大きさ / 経過秒数（0で無効）
+    - backup_count: 残すローテーション済みファイルの数
+    - compress: ローテーションしたファイルをgzipで圧縮するか
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 1.0,
+        batch_size: int = 256,
+        max_pending: int = 10000,
+        max_bytes: int = 100 * 1024 * 1024,
+        max_age: float = 0,
+        backup_count: int = 10,
+        compress: bool = True,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.compress = compress
+
+        self._pending: deque[dict] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # ファイル操作は書き込みスレッドだけが行う（stop()の最後の書き込みとも重ならないように）
+        self._file_lock = threading.Lock()
+        self._file = None
+        self._opened_at = 0.0
+
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.errors = 0
+
+    def log(self, record: dict) -> None:
+        """1件追加する（ブロックしない）。recordは渡した後に変更しないこと"""
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append(record)
+        if self._wakeup is not None and len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """残っている分を書き込んでファイルを閉じる"""
+        if self._task:
+            # 書き込みの途中でキャンセルするとそのバッチが消えるので、ループを抜けるのを待つ
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        await asyncio.to_thread(self._close)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+            "errors": self.errors,
+        }
+
+    async def flush(self) -> None:
+        batch = list(self._pending)
+        self._pending.clear()
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+            self.written += len(batch)
+        except Exception as e:
+            # ログが書けなくてもリクエストの処理は止めない
+            self.errors += 1
+            logger.error("リクエストログの書き込みに失敗: %s", e)
+
+    async def _flush_loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    # ここから下は書き込みスレッドで実行する
+
+    def _write_batch(self, batch: list[dict]) -> None:
+        # JSONへの変換もスレッド側で行う
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+        with self._file_lock:
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            if self._should_rotate():
+                self._rotate()
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._opened_at = time.time()
+
+    def _should_rotate(self) -> bool:
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return bool(self.max_age) and time.time() - self._opened_at >= self.max_age
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}"
+        suffix = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}.{suffix}"
+            suffix += 1
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+        self.rotations += 1
+        self._remove_old_backups()
+
+    def _remove_old_backups(self) -> None:
+        directory = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path) + "."
+        backups = sorted(
+            (os.path.join(directory, name) for name in os.listdir(directory) if name.startswith(prefix)),
+            key=os.path.getmtime,
+        )
+        for old in backups[: max(0, len(backups) - self.backup_count)]:
+            os.remove(old)
+
+    def _close(self) -> None:
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
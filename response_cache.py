@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from claude_code_sdk import ClaudeCodeOptions
+
+# 完全一致のレスポンスキャッシュ
+# resume_sessionなしの/api/chatは、同じシステムプロンプトで同じ質問（FAQ）が多い
+# 毎回エージェントを実行せず、同じ設定・同じ質問の回答を一定時間使い回す
+#
+# 注意: キャッシュした回答は別の会話のものなので、セッションIDは返さない
+# （他人のセッションを--resumeできてしまわないように）
+# セッション継続のリクエストは会話の文脈で答えが変わるので、キャッシュしない
+
+
+def cache_key(prompt: str, options: ClaudeCodeOptions) -> str:
+    """回答に影響する設定と質問から、キャッシュのキー（sha256）を作る"""
+    mcp_servers = options.mcp_servers
+    if isinstance(mcp_servers, dict):
+        # SDKのMCPサーバーはインスタンスを持つので、名前と種類だけ使う
+        mcp_servers = {
+            name: "sdk" if config.get("type") == "sdk" else config
+            for name, config in mcp_servers.items()
+        }
+    material = {
+        "query": prompt,
+        "system_prompt": options.system_prompt,
+        "append_system_prompt": options.append_system_prompt,
+        "model": options.model,
+        "max_turns": options.max_turns,
+        "max_thinking_tokens": options.max_thinking_tokens,
+        "allowed_tools": sorted(options.allowed_tools),
+        "disallowed_tools": sorted(options.disallowed_tools),
+        "permission_mode": options.permission_mode,
+        "mcp_servers": mcp_servers,
+        "cwd": options.cwd,
+    }
+    canonical = json.dumps(
+        material, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache(ABC):
+    """キャッシュの共通部分（統計）。保存先はサブクラスで_get・_set・_sizesを実装する
+
+    - ttl: 保持する秒数
+    - max_bytes: 保持する値の合計サイズの上限（超えたら古く使われていないものから消す）
+    """
+
+    backend = ""
+
+    def __init__(self, ttl: float = 3600.0, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = await self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: dict) -> None:
+        data = json.dumps(value, ensure_ascii=False)
+        # 1件で上限を超えるものは保持しない
+        if len(data.encode()) <= self.max_bytes:
+            await self._set(key, data)
+
+    @abstractmethod
+    async def _get(self, key: str) -> Optional[dict]:
+        """期限内の値を返す（なければNone）"""
+
+    @abstractmethod
+    async def _set(self, key: str, data: str) -> None:
+        """JSONの文字列を保存する"""
+
+    def close(self) -> None:
+        pass
+
+    @abstractmethod
+    def _sizes(self) -> tuple[int, int]:
+        """(件数, 合計バイト数)"""
+
+    def stats(self) -> dict:
+        entries, size = self._sizes()
+        return {
+            "backend": self.backend,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class MemoryResponseCache(ResponseCache):
+    """プロセス内のLRUキャッシュ（ワーカーごと・再起動で消える）"""
+
+    backend = "memory"
+
+    def __init__(self, ttl: float = 3600.0, max_bytes: int = 64 * 1024 * 1024):
+        super().__init__(ttl, max_bytes)
+        # key -> (期限, バイト数, JSON)
+        self._entries: OrderedDict[str, tuple[float, int, str]] = OrderedDict()
+        self._bytes = 0
+
+    async def _get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, data = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return json.loads(data)
+
+    async def _set(self, key: str, data: str) -> None:
+        if key in self._entries:
+            self._remove(key)
+        size = len(data.encode())
+        self._entries[key] = (time.monotonic() + self.ttl, size, data)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _sizes(self) -> tuple[int, int]:
+        return len(self._entries), self._bytes
+
+
+class SqliteResponseCache(ResponseCache):
+    """sqliteファイルのLRUキャッシュ（再起動後も残り、同じファイルを使うワーカーで共有できる）
+
+    sqliteの読み書きはブロックするので、スレッドで実行する
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, ttl: float = 3600.0, max_bytes: int = 64 * 1024 * 1024):
+        super().__init__(ttl, max_bytes)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_used_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used_at)"
+        )
+
+    async def _get(self, key: str) -> Optional[dict]:
+        data = await asyncio.to_thread(self._get_sync, key)
+        return json.loads(data) if data is not None else None
+
+    async def _set(self, key: str, data: str) -> None:
+        await asyncio.to_thread(self._set_sync, key, data)
+
+    def _get_sync(self, key: str) -> Optional[str]:
+        # ワーカー間で共有するので、時刻は壁時計を使う
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._db.execute(
+                "UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key)
+            )
+            return row[0]
+
+    def _set_sync(self, key: str, data: str) -> None:
+        now = time.time()
+        size = len(data.encode())
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, data, size, now + self.ttl, now),
+                )
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                self._evict_overflow()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _evict_overflow(self) -> None:
+        (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        # 使われていない順に、上限に収まるまで消す
+        victims = []
+        for key, size in self._db.execute(
+            "SELECT key, size FROM responses ORDER BY last_used_at"
+        ):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def _sizes(self) -> tuple[int, int]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return row[0], row[1]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def create_response_cache(
+    backend: str, path: str, ttl: float, max_bytes: int
+) -> Optional[ResponseCache]:
+    """CHAT_CACHE_BACKENDの値からキャッシュを作る（空なら無効）"""
+    if not backend:
+        return None
+    if backend == "memory":
+        return MemoryResponseCache(ttl, max_bytes)
+    if backend == "sqlite":
+        return SqliteResponseCache(path, ttl, max_bytes)
+    raise ValueError(f"不明なキャッシュのバックエンド: {backend}（memory / sqlite）")
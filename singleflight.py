@@ -0,0 +1,110 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+
+# 同じ内容の実行中リクエストをまとめる（シングルフライト）
+# 人気の質問が数秒のうちに何件も届くと、同じCLIの実行がその数だけ並行して走る
+# 同じキーの実行が進行中なら、新しく起動せずにその実行に相乗りして、
+# 届いたメッセージ（途中から参加した場合も最初から）を全員に配る
+#
+# 実行はどのリクエストからも独立したタスクで行い、
+# 最後の参加者がいなくなったら（全員切断したら）キャンセルする
+
+
+class Flight:
+    """進行中の1つの実行。メッセージを溜めておき、参加者ごとに最初から読ませる"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.messages: list[Any] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Condition()
+
+    async def run(self, source: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async for message in source():
+                async with self._changed:
+                    self.messages.append(message)
+                    self._changed.notify_all()
+        except BaseException as e:
+            self.error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def stream(self) -> AsyncIterator[Any]:
+        """メッセージを最初から順に返す。実行が失敗していたら同じ例外を投げる"""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.messages) or self.done)
+                pending = self.messages[index:]
+                finished = self.done
+            for message in pending:
+                yield message
+            index += len(pending)
+            if finished and index >= len(self.messages):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """キーごとに実行を1つにまとめる"""
+
+    def __init__(self):
+        self._flights: dict[str, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "subscribers": sum(f.subscribers for f in self._flights.values()),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+        }
+
+    @asynccontextmanager
+    async def join(
+        self, key: str, source: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncIterator[tuple[AsyncIterator[Any], bool]]:
+        """同じキーの実行に参加する。なければsource()で開始する
+
+        (メッセージのイテレーター, 自分が開始したかどうか)を返す
+        """
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = Flight(key)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(flight.run(source))
+            flight.task.add_done_callback(lambda _: self._finish(flight))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        flight.subscribers += 1
+        try:
+            yield flight.stream(), leader
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # 全員いなくなったら実行を止める（CLIの終了処理はキャンセルで行われる）
+                self.cancelled += 1
+                self._finish(flight)
+                flight.task.cancel()
+                await asyncio.gather(flight.task, return_exceptions=True)
+
+    def _finish(self, flight: Flight) -> None:
+        # 終わった実行には新しく参加させない
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# サーバーのモジュール（admission.py など）はリポジトリ直下にある
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# CLIの代わりに使うシミュレーター（動作はFAKE_CLAUDE_SCENARIOのシナリオで決まる）
+TOOLS = Path(__file__).resolve().parent.parent / "tools"
+FAKE_CLI = str(TOOLS / "fake_claude_cli.py")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """サーバーのモジュール（api_request）。設定は環境変数から読むので、インポート前に決める
+
+    プールは待機プロセスを持たず、1回使ったら作り直す（シナリオを変えたテストがすぐ反映される）
+    """
+    directory = tmp_path_factory.mktemp("api")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("CLAUDE_CLI_PATH", FAKE_CLI)
+        mp.setenv("CLAUDE_POOL_MIN_SIZE", "0")
+        mp.setenv("CLAUDE_POOL_MAX_USES", "1")
+        mp.setenv("CHAT_JOB_DB", str(directory / "jobs.sqlite3"))
+        mp.setenv("CHAT_JOB_POLL_INTERVAL", "0.05")
+        mp.setenv("CHAT_REQUEST_LOG_PATH", str(directory / "requests.jsonl"))
+        mp.setenv("CHAT_REQUEST_LOG_FLUSH_INTERVAL", "0.05")
+        mp.setenv("CHAT_DISCONNECT_POLL_INTERVAL", "0.05")
+        import api_request
+    return api_request
+
+
+@pytest.fixture(scope="session")
+def client(api):
+    """起動済みのサーバー（プールやジョブのワーカーは1つのイベントループで動かす）
+
+    サーバーのイベントループで実行したい処理は client.portal.call() で渡す
+    """
+    from fastapi.testclient import TestClient
+
+    with TestClient(api.app) as client:
+        yield client
+
+
+@pytest.fixture
+def scenario(monkeypatch):
+    """シミュレーターのシナリオを選ぶ（これから起動するプロセスに効く）"""
+
+    def use(name: str) -> None:
+        monkeypatch.setenv("FAKE_CLAUDE_SCENARIO", str(TOOLS / "scenarios" / f"{name}.json"))
+
+    return use
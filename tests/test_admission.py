@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_rejects_with_429_when_the_queue_is_full():
+    admission = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5, retry_after=7)
+    release = await admission.acquire()
+    queued = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+    assert admission.stats()["queued"] == 1
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire()
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after == 7
+    assert admission.stats()["rejected_queue_full"] == 1
+
+    # 枠を返すと待っていたリクエストに引き継がれる
+    release()
+    release_queued = await queued
+    assert admission.stats()["in_flight"] == 1
+    release_queued()
+    assert admission.stats()["in_flight"] == 0
+
+
+async def test_rejects_with_503_when_the_wait_times_out():
+    admission = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=0.05)
+    release = await admission.acquire()
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire()
+    assert rejected.value.status_code == 503
+    stats = admission.stats()
+    assert stats["rejected_timeout"] == 1
+    assert stats["queued"] == 0
+    assert stats["in_flight"] == 1
+    release()
+    assert admission.stats()["in_flight"] == 0
+
+
+async def test_release_is_idempotent():
+    admission = AdmissionController(max_concurrent=2, max_queue=4)
+    first = await admission.acquire()
+    second = await admission.acquire()
+    first()
+    first()
+    assert admission.stats()["in_flight"] == 1
+
+    # 二重に返しても、待っている人に余分な枠は渡らない
+    third = await admission.acquire()
+    queued = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+    third()
+    third()
+    await queued
+    assert admission.stats()["in_flight"] == 2
+    assert admission.stats()["queued"] == 0
+    second()
+    (await queued)()
+    assert admission.stats()["in_flight"] == 0
+
+
+async def test_cancelled_waiter_gives_up_its_place():
+    admission = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=5)
+    release = await admission.acquire()
+    queued = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    assert admission.stats()["queued"] == 0
+    release()
+    assert admission.stats()["in_flight"] == 0
+
+    async with admission.slot():
+        assert admission.stats()["in_flight"] == 1
+    assert admission.stats()["in_flight"] == 0
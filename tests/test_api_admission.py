@@ -0,0 +1,48 @@
+import pytest
+
+from admission import AdmissionController
+
+
+@pytest.fixture
+def full(api, client, monkeypatch):
+    """実行枠が1つで、それを使用中にした状態にする（テストの終わりに枠を返す）"""
+    releases = []
+
+    def use(max_queue: int, queue_timeout: float = 10.0):
+        admission = AdmissionController(
+            max_concurrent=1, max_queue=max_queue, queue_timeout=queue_timeout, retry_after=7
+        )
+        monkeypatch.setattr(api, "admission", admission)
+        release = client.portal.call(admission.acquire)
+        releases.append(release)
+        return admission
+
+    yield use
+    for release in releases:
+        client.portal.call(release)
+
+
+@pytest.mark.parametrize("endpoint", ["/api/chat", "/api/chat/stream"])
+def test_full_queue_is_a_429_with_retry_after(client, full, endpoint):
+    full(max_queue=0)
+    response = client.post(endpoint, json={"query": "hello"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_waiting_too_long_is_a_503_with_retry_after(client, full):
+    admission = full(max_queue=1, queue_timeout=0.2)
+    response = client.post("/api/chat", json={"query": "hello"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    # 諦めたリクエストは待ち行列から抜ける
+    assert admission.stats()["queued"] == 0
+
+
+def test_slot_is_returned_after_the_response(api, client, monkeypatch):
+    admission = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=1)
+    monkeypatch.setattr(api, "admission", admission)
+    for endpoint in ("/api/chat", "/api/chat/stream", "/api/chat"):
+        response = client.post(endpoint, json={"query": "hello"})
+        assert response.status_code == 200
+        assert admission.stats()["in_flight"] == 0
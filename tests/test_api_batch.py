@@ -0,0 +1,57 @@
+import json
+
+
+def batch_rows(client, items) -> list[dict]:
+    response = client.post("/api/chat/batch", json=items)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    return sorted(rows, key=lambda row: row["index"])
+
+
+def test_invalid_timeout_is_a_422_row(client):
+    rows = batch_rows(client, [
+        {"query": "a", "timeout": 0},
+        {"query": "b", "timeout": -1},
+        {"query": "c", "timeout": 5},
+    ])
+    assert [row["status"] for row in rows] == [422, 422, 200]
+    assert rows[2]["response"] == "echo:c"
+
+
+def test_invalid_timeout_is_rejected_by_every_endpoint(client):
+    assert client.post("/api/chat", json={"query": "a", "timeout": 0}).status_code == 422
+    assert client.post("/api/jobs", json={"query": "a", "timeout": -1}).status_code == 422
+    response = client.post("/api/chat", json={"query": "a"}, headers={"X-Request-Timeout": "0"})
+    assert response.status_code == 400
+
+
+def test_each_item_gets_its_own_row(client):
+    rows = batch_rows(client, [{"query": "a", "request_id": "q1"}, {"query": " "}, {"query": "c"}])
+    assert [row["status"] for row in rows] == [200, 400, 200]
+    assert rows[0]["request_id"] == "q1"
+    assert [rows[0]["response"], rows[2]["response"]] == ["echo:a", "echo:c"]
+    # 1件が失敗してもバッチは止まらない
+    assert rows[1]["detail"] == "質問が空です"
+
+
+def test_jsonl_body_and_malformed_lines(client):
+    body = '{"query": "a"}\n\nnot json\n{"query": "b"}\n'
+    response = client.post("/api/chat/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+    rows = sorted(map(json.loads, response.text.splitlines()), key=lambda row: row["index"])
+    assert [row["status"] for row in rows] == [200, 400, 200]
+    assert rows[1]["detail"].startswith("JSONとして読めません")
+
+
+def test_jsonl_file_upload(client):
+    files = {"file": ("questions.jsonl", b'{"query": "a"}\n{"query": "b"}\n', "application/jsonl")}
+    response = client.post("/api/chat/batch?concurrency=1", files=files)
+    rows = sorted(map(json.loads, response.text.splitlines()), key=lambda row: row["index"])
+    assert [row["response"] for row in rows] == ["echo:a", "echo:b"]
+
+
+def test_rejected_batches(api, client, monkeypatch):
+    assert client.post("/api/chat/batch", json={"query": "a"}).status_code == 400
+    assert client.post("/api/chat/batch", files={"other": ("x", b"")}).status_code == 400
+    monkeypatch.setattr(api, "BATCH_MAX_ITEMS", 2)
+    assert client.post("/api/chat/batch", json=[{"query": "a"}] * 3).status_code == 413
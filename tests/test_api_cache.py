@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from response_cache import MemoryResponseCache
+
+
+@pytest.fixture
+def cache(api, monkeypatch):
+    """回答キャッシュを有効にする（テストの環境では無効）"""
+    cache = MemoryResponseCache()
+    monkeypatch.setattr(api, "response_cache", cache)
+    return cache
+
+
+def ask(client, query: str, **headers) -> dict:
+    response = client.post("/api/chat", json={"query": query}, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_same_query_is_answered_from_the_cache(client, cache):
+    first = ask(client, "cached question")
+    assert not first["cached"]
+    assert first["session_id"]
+    second = ask(client, "cached question")
+    assert second["cached"]
+    assert second["response"] == first["response"] == "echo:cached question"
+    # 別の会話の回答なので、継続できるセッションは返さない
+    assert second["session_id"] is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_no_cache_runs_again_and_stores_the_result(client, cache):
+    ask(client, "refresh me")
+    refreshed = ask(client, "refresh me", **{"Cache-Control": "no-cache"})
+    assert not refreshed["cached"]
+    assert ask(client, "refresh me")["cached"]
+
+
+def test_no_store_neither_reads_nor_stores(client, cache):
+    ask(client, "private")
+    assert not ask(client, "private", **{"Cache-Control": "no-store"})["cached"]
+    assert cache.stats()["entries"] == 1
+
+    assert not ask(client, "never stored", **{"Cache-Control": "no-store"})["cached"]
+    assert not ask(client, "never stored")["cached"]
+
+
+def test_continued_sessions_are_not_cached(client, cache):
+    session_id = ask(client, "start")["session_id"]
+    for _ in range(2):
+        response = client.post("/api/chat", json={"query": "again", "resume_session": session_id})
+        assert not response.json()["cached"]
+    assert cache.stats()["entries"] == 1
+
+
+def test_batch_items_share_the_cache(client, cache):
+    ask(client, "from chat")
+    response = client.post("/api/chat/batch", json=[{"query": "from chat"}, {"query": "from chat", "no_cache": True}])
+    rows = sorted(map(json.loads, response.text.splitlines()), key=lambda row: row["index"])
+    assert [row["cached"] for row in rows] == [True, False]
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+# 1ターン目は答えて、2ターン目は終わらない
+NEVER_ENDING = {"turns": [
+    {"steps": [{"type": "echo"}]},
+    {"steps": [{"type": "text", "text": "thinking"}, {"type": "sleep", "seconds": 600}]},
+]}
+
+
+@pytest.fixture
+def never_ending(monkeypatch, tmp_path):
+    scenario = tmp_path / "scenario.json"
+    scenario.write_text(json.dumps(NEVER_ENDING))
+    monkeypatch.setenv("FAKE_CLAUDE_SCENARIO", str(scenario))
+
+
+@pytest.fixture
+def slow(scenario):
+    scenario("slow")
+
+
+def disconnect_after(api, client, path: str, body: dict, seconds: float) -> list[dict]:
+    """ASGIでリクエストを送り、seconds秒後にクライアントが切断する。送られたメッセージを返す
+
+    TestClientはレスポンスが終わるまで切断を伝えないので、アプリを直接呼ぶ
+    """
+
+    async def run() -> list[dict]:
+        disconnect_at = asyncio.get_running_loop().time() + seconds
+        sent = []
+        requested = False
+
+        async def receive() -> dict:
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+            # 切断後はすぐに返す（is_disconnected()はキャンセル済みのスコープで呼ぶ）
+            delay = disconnect_at - asyncio.get_running_loop().time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"content-type", b"application/json")],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+        await api.app(scope, receive, send)
+        return sent
+
+    return client.portal.call(run)
+
+
+def body_text(sent: list[dict]) -> str:
+    return b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body").decode()
+
+
+def test_disconnect_stops_a_new_chat(api, client, slow):
+    before = dict(api.cancel_stats)
+    started = time.monotonic()
+    sent = disconnect_after(api, client, "/api/chat", {"query": "hello"}, 0.5)
+    assert time.monotonic() - started < 5
+    assert sent[0]["status"] == 499
+    assert api.cancel_stats["disconnected"] == before["disconnected"] + 1
+    # 新規セッションはプロセスごと終了する（セッションIDを受け取る相手がいない）
+    assert api.cancel_stats["terminated"] == before["terminated"] + 1
+    assert api.client_pool.stats()["leased"] == 0
+    assert api.admission.stats()["in_flight"] == 0
+
+
+def test_disconnect_stops_a_stream(api, client, slow):
+    before = dict(api.cancel_stats)
+    started = time.monotonic()
+    sent = disconnect_after(api, client, "/api/chat/stream", {"query": "hello"}, 0.8)
+    assert time.monotonic() - started < 5
+    text = body_text(sent)
+    assert "thinking" in text
+    assert "event: done" not in text
+    assert api.cancel_stats["terminated"] == before["terminated"] + 1
+    assert api.client_pool.stats()["leased"] == 0
+    assert api.admission.stats()["in_flight"] == 0
+
+
+def test_disconnect_interrupts_a_continued_session(api, client, never_ending):
+    session_id = client.post("/api/chat", json={"query": "hello"}).json()["session_id"]
+    pooled = api.session_cache._sessions[session_id]
+    before = dict(api.cancel_stats)
+    sent = disconnect_after(
+        api, client, "/api/chat", {"query": "again", "resume_session": session_id}, 0.5
+    )
+    assert sent[0]["status"] == 499
+    # ターンだけ止めて、会話のプロセスは次のリクエストのために残す
+    assert api.cancel_stats["interrupted"] == before["interrupted"] + 1
+    assert api.cancel_stats["terminated"] == before["terminated"]
+    assert api.session_cache._sessions[session_id] is pooled
+    assert pooled.is_alive()
+    assert not pooled.lock.locked()
@@ -0,0 +1,76 @@
+import json
+import time
+
+from admission import AdmissionController
+
+
+def wait_for_job(client, job_id: str, status: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] == status:
+            return job
+        assert time.monotonic() < deadline, f"{job_id} did not reach {status}: {job}"
+        time.sleep(0.02)
+
+
+def wait_until(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_job_waits_for_an_admission_slot(api, client, monkeypatch):
+    admission = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=10)
+    monkeypatch.setattr(api, "admission", admission)
+    release = client.portal.call(admission.acquire)
+    try:
+        job_id = client.post("/api/jobs", json={"query": "later"}).json()["job_id"]
+        # ワーカーはジョブを取り出すが、/api/chatと同じ枠が空くまで実行しない
+        wait_until(lambda: admission.stats()["queued"] == 1)
+        assert client.get(f"/api/jobs/{job_id}").json()["status"] == "running"
+    finally:
+        client.portal.call(release)
+    job = wait_for_job(client, job_id, "succeeded")
+    assert job["result"]["response"] == "echo:later"
+    assert admission.stats()["in_flight"] == 0
+
+
+def test_job_runs_in_the_background(client):
+    response = client.post("/api/jobs", json={"query": "report"})
+    assert response.status_code == 202
+    accepted = response.json()
+    assert accepted["status"] == "queued"
+    job = wait_for_job(client, accepted["job_id"], "succeeded")
+    assert job["attempts"] == 1
+    assert job["result"]["response"] == "echo:report"
+    # 受け付けた時点で決めたrequest_idを結果にも使う
+    assert job["result"]["request_id"] == accepted["request_id"]
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/api/jobs/missing").status_code == 404
+    assert client.get("/api/jobs/missing/stream").status_code == 404
+    assert client.post("/api/jobs", json={"query": " "}).status_code == 400
+
+
+def test_stream_follows_the_job_until_done(client):
+    job_id = client.post("/api/jobs", json={"query": "watch me"}).json()["job_id"]
+    text = client.get(f"/api/jobs/{job_id}/stream").text
+    assert text.index("event: status") < text.index("event: done")
+    assert '"status": "succeeded"' in text
+    assert "echo:watch me" in text
+
+
+def test_failed_job_reports_its_error(api, client, monkeypatch, tmp_path):
+    scenario = tmp_path / "scenario.json"
+    scenario.write_text(json.dumps({"turns": [{"steps": [{"type": "text", "text": "partial"}], "fail": "crash"}]}))
+    monkeypatch.setenv("FAKE_CLAUDE_SCENARIO", str(scenario))
+    monkeypatch.setattr(api.job_workers.queue, "max_attempts", 1)
+    job_id = client.post("/api/jobs", json={"query": "doomed"}).json()["job_id"]
+    job = wait_for_job(client, job_id, "failed")
+    assert job["error"]
+    text = client.get(f"/api/jobs/{job_id}/stream").text
+    assert "event: error" in text
+    assert "event: done" not in text
@@ -0,0 +1,61 @@
+import json
+import time
+
+from metrics import CONTENT_TYPE
+
+
+def scrape(client) -> dict[str, float]:
+    """/metricsのサンプルを{名前とラベル: 値}にする"""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_requests_tokens_and_cost_are_counted(client, monkeypatch, tmp_path):
+    scenario = tmp_path / "scenario.json"
+    scenario.write_text(json.dumps({"turns": [{
+        "steps": [{"type": "text", "text": "answer"}],
+        "result": {"total_cost_usd": 0.25, "usage": {"input_tokens": 100, "output_tokens": 20}},
+    }]}))
+    monkeypatch.setenv("FAKE_CLAUDE_SCENARIO", str(scenario))
+    ok = 'chat_requests_total{endpoint="/api/chat",status="200"}'
+    bad = 'chat_requests_total{endpoint="/api/chat",status="400"}'
+    latency = 'chat_request_seconds_count{endpoint="/api/chat"}'
+    first_text = 'chat_first_text_seconds_count{endpoint="/api/chat"}'
+    before = scrape(client)
+
+    client.post("/api/chat", json={"query": "hello"})
+    client.post("/api/chat", json={"query": " "})
+    after = scrape(client)
+
+    def delta(name: str) -> float:
+        return after.get(name, 0) - before.get(name, 0)
+
+    assert (delta(ok), delta(bad)) == (1, 1)
+    assert (delta(latency), delta(first_text)) == (2, 1)
+    assert delta('chat_tokens_total{type="input"}') == 100
+    assert delta('chat_tokens_total{type="output"}') == 20
+    assert round(delta("chat_cost_usd_total"), 6) == 0.25
+    # プールが起動したプロセスの起動時間
+    assert delta("chat_cli_spawn_seconds_count") == 1
+
+
+def test_gauges_report_current_state(client):
+    job_id = client.post("/api/jobs", json={"query": "counted"}).json()["job_id"]
+    deadline = time.monotonic() + 10
+    while client.get(f"/api/jobs/{job_id}").json()["status"] != "succeeded":
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.02)
+    samples = scrape(client)
+    assert samples['chat_jobs{status="succeeded"}'] >= 1
+    assert samples["chat_admission_in_flight"] == 0
+    assert samples["chat_admission_queued"] == 0
+    assert samples['chat_cli_processes{owner="oneshot"}'] == 0
+    assert samples['chat_cli_processes{owner="pool_leased"}'] == 0
+    assert samples["chat_message_backlog"] == 0
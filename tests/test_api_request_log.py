@@ -0,0 +1,66 @@
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+
+def logged(api, request_id: str, timeout: float = 10.0) -> list[dict]:
+    """request_idのリクエストログの行（書き込みはまとめて行うので、出てくるまで待つ）"""
+    deadline = time.monotonic() + timeout
+    while True:
+        path = Path(api.request_log.path)
+        # 書きかけの最後の行は次に読む
+        lines = path.read_text(encoding="utf-8").split("\n")[:-1] if path.exists() else []
+        records = [r for r in map(json.loads, lines) if r["request_id"] == request_id]
+        if records:
+            return records
+        assert time.monotonic() < deadline, f"{request_id} was not logged"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def costly(monkeypatch, tmp_path):
+    scenario = tmp_path / "scenario.json"
+    scenario.write_text(json.dumps({"turns": [{
+        "steps": [{"type": "text", "text": "answer"}],
+        "result": {"num_turns": 2, "total_cost_usd": 0.25, "usage": {"input_tokens": 100, "output_tokens": 20}},
+    }]}))
+    monkeypatch.setenv("FAKE_CLAUDE_SCENARIO", str(scenario))
+
+
+def test_chat_is_logged_with_latency_cost_and_session(api, client, costly):
+    body = client.post("/api/chat", json={"query": "hello", "request_id": "log-chat"}).json()
+    [record] = logged(api, "log-chat")
+    assert record["endpoint"] == "/api/chat"
+    assert record["status"] == 200
+    assert record["session_id"] == body["session_id"]
+    assert not (record["cached"] or record["timed_out"] or record["coalesced"])
+    assert record["latency_ms"] >= record["first_text_ms"] >= record["first_message_ms"] > 0
+    assert (record["num_turns"], record["total_cost_usd"]) == (2, 0.25)
+    assert record["usage"] == {"input_tokens": 100, "output_tokens": 20}
+
+
+def test_stream_is_logged(api, client, costly):
+    client.post("/api/chat/stream", json={"query": "hello", "request_id": "log-stream"})
+    [record] = logged(api, "log-stream")
+    assert record["endpoint"] == "/api/chat/stream"
+    assert record["status"] == 200
+    assert record["total_cost_usd"] == 0.25
+
+
+def test_errors_are_logged_with_their_status(api, client):
+    client.post("/api/chat", json={"query": " ", "request_id": "log-empty"})
+    [record] = logged(api, "log-empty")
+    assert (record["status"], record["detail"]) == (400, "質問が空です")
+
+
+def test_batch_and_job_records_say_where_they_came_from(api, client):
+    client.post("/api/chat/batch", json=[{"query": "a", "request_id": "log-batch"}])
+    [record] = logged(api, "log-batch")
+    assert (record["endpoint"], record["index"]) == ("/api/chat/batch", 0)
+
+    job_id = client.post("/api/jobs", json={"query": "a", "request_id": "log-job"}).json()["job_id"]
+    [record] = logged(api, "log-job")
+    assert record["endpoint"] == "/api/jobs"
+    assert (record["job_id"], record["attempt"], record["status"]) == (job_id, 1, 200)
@@ -0,0 +1,49 @@
+import json
+
+
+def sse_events(response) -> list[tuple[str, dict]]:
+    """SSEの本文を(イベント名, data)のリストにする"""
+    events = []
+    for chunk in response.text.replace("\r\n", "\n").split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in chunk.splitlines() if ": " in line)
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_sends_text_deltas_then_done(client, monkeypatch, tmp_path):
+    scenario = tmp_path / "scenario.json"
+    scenario.write_text(json.dumps({"turns": [
+        {"steps": [{"type": "text", "text": "abcdefghij", "chunks": 5}]},
+    ]}))
+    monkeypatch.setenv("FAKE_CLAUDE_SCENARIO", str(scenario))
+    response = client.post("/api/chat/stream", json={"query": "hello", "request_id": "r1"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response)
+    names = [name for name, _ in events]
+    assert names == ["start"] + ["text"] * 5 + ["done"]
+    assert events[0][1] == {"request_id": "r1"}
+    # 部分メッセージのデルタだけを送り、最後のAssistantMessageで同じテキストを重ねない
+    assert "".join(data["text"] for name, data in events if name == "text") == "abcdefghij"
+    done = events[-1][1]
+    assert done["request_id"] == "r1"
+    assert done["session_id"]
+    assert not (done["timed_out"] or done["is_error"] or done["coalesced"])
+
+
+def test_stream_reports_tool_calls(client, scenario):
+    scenario("tool_heavy")
+    events = sse_events(client.post("/api/chat/stream", json={"query": "look around"}))
+    uses = [data for name, data in events if name == "tool_use"]
+    results = [data for name, data in events if name == "tool_result"]
+    assert [use["name"] for use in uses] == ["Glob", "Read", "Grep", "Read"]
+    assert uses[1]["input"] == {"file_path": "api_request.py"}
+    # ツールの結果は中身を送らず、どの呼び出しの結果かだけを送る
+    assert [result["tool_use_id"] for result in results] == [use["id"] for use in uses]
+    assert events[-1][0] == "done"
+
+
+def test_stream_rejects_an_empty_query_before_starting(client):
+    response = client.post("/api/chat/stream", json={"query": "  "})
+    assert response.status_code == 400
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def busy_session(api, client):
+    """会話を1ターン進めたセッションを作り、そのプロセスを使用中にする
+
+    返す関数にsecondsを渡すと、その秒数後に使用中を解除する
+    """
+    timers = []
+    held = []
+
+    def start(seconds: float = 5.0) -> str:
+        session_id = client.post("/api/chat", json={"query": "hello"}).json()["session_id"]
+        pooled = api.session_cache._sessions[session_id]
+        client.portal.call(pooled.lock.acquire)
+        held.append(pooled)
+        timer = threading.Timer(seconds, client.portal.call, [pooled.lock.release])
+        timer.start()
+        timers.append(timer)
+        return session_id
+
+    yield start
+    for timer in timers:
+        timer.cancel()
+    for pooled in held:
+        if pooled.lock.locked():
+            client.portal.call(pooled.lock.release)
+
+
+def test_waiting_for_a_busy_session_counts_against_the_timeout(client, busy_session):
+    # 先のリクエストがプロセスを使い終わるのは5秒後（時間切れを過ぎてから）
+    session_id = busy_session(5.0)
+    started = time.monotonic()
+    response = client.post(
+        "/api/chat", json={"query": "again", "resume_session": session_id, "timeout": 0.5}
+    )
+    assert response.status_code == 504
+    assert time.monotonic() - started < 3
+
+
+def test_the_turn_gets_only_the_time_left(client, busy_session, monkeypatch, tmp_path):
+    # 2ターン目は終わらない
+    scenario = tmp_path / "scenario.json"
+    scenario.write_text(json.dumps({"turns": [
+        {"steps": [{"type": "echo"}]},
+        {"steps": [{"type": "text", "text": "thinking"}, {"type": "sleep", "seconds": 600}]},
+    ]}))
+    monkeypatch.setenv("FAKE_CLAUDE_SCENARIO", str(scenario))
+    session_id = busy_session(1.0)
+    started = time.monotonic()
+    response = client.post(
+        "/api/chat", json={"query": "again", "resume_session": session_id, "timeout": 2}
+    )
+    elapsed = time.monotonic() - started
+    body = response.json()
+    assert response.status_code == 200
+    assert body["timed_out"]
+    assert body["response"] == "thinking"
+    # 順番待ちの1秒も制限時間に含める（ターンに2秒まるごと与えると3秒かかる）
+    assert elapsed < 2.7
+
+
+def test_timeout_header_stops_the_turn(client, scenario):
+    scenario("slow")
+    started = time.monotonic()
+    response = client.post("/api/chat", json={"query": "hello"}, headers={"X-Request-Timeout": "0.5"})
+    assert time.monotonic() - started < 5
+    body = response.json()
+    assert response.status_code == 200
+    assert body["timed_out"]
+    assert body["response"] == "thinking"
+
+
+def test_stream_ends_with_a_timed_out_done_event(client, scenario):
+    scenario("slow")
+    response = client.post("/api/chat/stream", json={"query": "hello", "timeout": 0.5})
+    assert response.status_code == 200
+    assert "thinking" in response.text
+    done = response.text.split("event: done")[1].split("data: ", 1)[1].splitlines()[0]
+    assert json.loads(done)["timed_out"]
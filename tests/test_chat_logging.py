@@ -0,0 +1,45 @@
+from claude_code_sdk import AssistantMessage, TextBlock, ToolResultBlock, UserMessage
+
+import chat_logging
+from chat_logging import truncated
+
+
+def test_long_string_is_cut_with_its_length():
+    assert str(truncated("x" * 50, 10)) == "x" * 10 + "…（50文字）"
+    assert str(truncated("short", 10)) == "short"
+
+
+def test_messages_are_cut_field_by_field():
+    result = ToolResultBlock(tool_use_id="t1", content="y" * 1_000_000)
+    message = UserMessage(content=[result] * 50)
+    text = str(truncated(message, 200))
+    assert text.startswith("UserMessage(content=[ToolResultBlock(tool_use_id='t1', content='yyy")
+    assert len(text) <= 201
+
+
+def test_small_values_are_not_cut():
+    message = AssistantMessage(content=[TextBlock(text="hello")], model="m")
+    assert str(truncated(message)) == repr(message)
+    assert str(truncated({"a": [1, 2]})) == "{'a': [1, 2]}"
+
+
+def test_long_containers_repr_only_their_first_items():
+    calls = []
+
+    class Counted:
+        def __repr__(self):
+            calls.append(self)
+            return "c"
+
+    text = str(truncated([Counted() for _ in range(1000)], 500))
+    assert text == "[" + ", ".join(["c"] * 20) + ", ...]"
+    assert len(calls) == 20
+
+
+def test_start_and_stop_are_idempotent():
+    chat_logging.start()
+    chat_logging.start()
+    chat_logging.stop()
+    chat_logging.stop()
+    chat_logging.start()
+    chat_logging.stop()
@@ -0,0 +1,243 @@
+import asyncio
+import os
+import signal
+import threading
+from pathlib import Path
+
+import pytest
+from claude_code_sdk import ClaudeCodeOptions
+
+import client_pool
+from client_pool import ClaudeClientPool, PooledClient, SessionClientCache
+
+pytestmark = pytest.mark.anyio
+
+# CLIの代わりにシナリオなし（promptをそのまま返す）のシミュレーターを使う
+FAKE_CLI = str(Path(__file__).resolve().parent.parent / "tools" / "fake_claude_cli.py")
+
+
+def fake_options() -> ClaudeCodeOptions:
+    return ClaudeCodeOptions(cli_path=FAKE_CLI)
+
+
+async def started_client() -> PooledClient:
+    pooled = PooledClient(fake_options())
+    await pooled.start()
+    return pooled
+
+
+async def ask(pooled: PooledClient, prompt: str) -> str:
+    await pooled.client.query(prompt)
+    result = None
+    async for message in pooled.client.receive_response():
+        result = message
+    return result.result
+
+
+async def test_session_cache_concurrent_misses_share_one_process():
+    cache = SessionClientCache()
+    spawned = []
+    cache._on_spawn = spawned.append
+    turns = []
+
+    async def turn(prompt: str) -> str:
+        async with cache.lease("s1", fake_options) as pooled:
+            turns.append(pooled)
+            answer = await ask(pooled, prompt)
+            assert pooled.is_alive()
+            return answer
+
+    try:
+        answers = await asyncio.gather(turn("a"), turn("b"))
+        assert answers == ["echo:a", "echo:b"]
+        # 2件目は1件目が起動したプロセスを順番待ちして使う
+        assert len(spawned) == 1
+        assert turns[0] is turns[1]
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["hits"] == 1
+        assert turns[0].is_alive()
+    finally:
+        await cache.stop()
+
+
+async def test_session_cache_adopt_does_not_close_a_leased_process():
+    cache = SessionClientCache()
+    old = await started_client()
+    new = await started_client()
+    try:
+        await cache.adopt("s1", old)
+        async with cache.lease("s1", fake_options) as pooled:
+            assert pooled is old
+            await cache.adopt("s1", new)
+            # 実行中のターンは最後まで続けられる
+            assert await ask(pooled, "still here") == "echo:still here"
+            assert old.is_alive()
+        # ターンが終わったら置き換えられた古いプロセスは閉じる
+        assert not old.is_alive()
+        async with cache.lease("s1", fake_options) as pooled:
+            assert pooled is new
+    finally:
+        await cache.stop()
+        await old.close()
+
+
+async def test_session_cache_closes_a_replaced_process_that_broke():
+    cache = SessionClientCache()
+    old = await started_client()
+    new = await started_client()
+    try:
+        await cache.adopt("s1", old)
+        with pytest.raises(RuntimeError):
+            async with cache.lease("s1", fake_options):
+                await cache.adopt("s1", new)
+                raise RuntimeError("turn failed")
+        # 置き換えられたプロセスは壊れていても閉じる（置き換え先は残す）
+        assert old._task.done()
+        assert new.is_alive()
+        assert cache.clients() == [new]
+    finally:
+        await cache.stop()
+        await old.close()
+
+
+async def test_session_cache_waiter_moves_to_the_replacement():
+    cache = SessionClientCache()
+    old = await started_client()
+    new = await started_client()
+    try:
+        await cache.adopt("s1", old)
+        leased = asyncio.Event()
+        release = asyncio.Event()
+
+        async def holder():
+            async with cache.lease("s1", fake_options):
+                leased.set()
+                await release.wait()
+
+        async def waiter():
+            async with cache.lease("s1", fake_options) as pooled:
+                return pooled, await ask(pooled, "next")
+
+        holding = asyncio.create_task(holder())
+        await leased.wait()
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0.05)
+        await cache.adopt("s1", new)
+        release.set()
+        await holding
+        pooled, answer = await waiting
+        assert pooled is new
+        assert answer == "echo:next"
+    finally:
+        await cache.stop()
+        await old.close()
+
+
+async def test_session_cache_reaper_skips_a_session_leased_during_the_check(monkeypatch):
+    checking = threading.Event()
+    leased = threading.Event()
+
+    def child_rss_bytes(pid):
+        # メモリ使用量を調べている間に、リクエストがプロセスを借りる
+        checking.set()
+        leased.wait(5)
+        return 1 << 40
+
+    monkeypatch.setattr(client_pool, "child_rss_bytes", child_rss_bytes)
+    cache = SessionClientCache(max_rss_bytes=1, reap_interval=0.01)
+    await cache.adopt("s1", await started_client())
+    await cache.start()
+    try:
+        await asyncio.to_thread(checking.wait, 5)
+        async with cache.lease("s1", fake_options) as pooled:
+            leased.set()
+            await asyncio.sleep(0.1)
+            assert "s1" in cache
+            assert await ask(pooled, "still here") == "echo:still here"
+        # ターンが終われば次のチェックで追い出す
+        await wait_until(lambda: "s1" not in cache)
+        assert not pooled.is_alive()
+    finally:
+        leased.set()
+        await cache.stop()
+
+
+async def wait_until(condition, timeout: float = 10.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+async def test_pool_lease_reuses_and_replaces_processes():
+    pool = ClaudeClientPool(fake_options, min_size=1, max_size=1, max_uses=2, health_check_interval=60)
+    await pool.start()
+    try:
+        assert pool.stats()["idle"] == 1
+        async with pool.lease() as first:
+            assert pool.stats()["leased"] == 1
+            assert await ask(first, "a") == "echo:a"
+        async with pool.lease() as second:
+            assert second is first
+        # max_usesに達したプロセスは破棄して補充する
+        await wait_until(lambda: pool.stats()["idle"] == 1)
+        async with pool.lease() as third:
+            assert third is not first
+        assert not first.is_alive()
+    finally:
+        await pool.stop()
+
+
+async def test_pool_discards_a_broken_lease():
+    pool = ClaudeClientPool(fake_options, min_size=1, max_size=2, max_uses=10, health_check_interval=60)
+    await pool.start()
+    try:
+        with pytest.raises(RuntimeError):
+            async with pool.lease() as broken:
+                raise RuntimeError("turn failed")
+        await wait_until(lambda: pool.stats()["idle"] == 1 and not broken.is_alive())
+        async with pool.lease() as pooled:
+            assert pooled is not broken
+    finally:
+        await pool.stop()
+
+
+async def test_pool_waits_for_a_free_process_at_max_size():
+    pool = ClaudeClientPool(fake_options, min_size=0, max_size=1, max_uses=10, health_check_interval=60)
+    await pool.start()
+    try:
+        async def second_lease() -> PooledClient:
+            async with pool.lease() as pooled:
+                return pooled
+
+        async with pool.lease() as first:
+            waiting = asyncio.create_task(second_lease())
+            await asyncio.sleep(0.1)
+            assert not waiting.done()
+            assert pool.size == 1
+        assert await waiting is first
+    finally:
+        await pool.stop()
+
+
+async def test_pool_reaps_idle_and_dead_processes():
+    pool = ClaudeClientPool(
+        fake_options, min_size=1, max_size=3, idle_timeout=0.2, max_uses=10, health_check_interval=0.05
+    )
+    await pool.start()
+    try:
+        async with pool.lease() as first, pool.lease() as second:
+            pass
+        assert pool.stats()["idle"] == 2
+        # min_sizeを超えた分は、idle_timeoutを過ぎたら終了する
+        await wait_until(lambda: pool.stats()["idle"] == 1)
+        survivor = pool.clients()[0]
+        assert survivor in (first, second)
+
+        # 死んだプロセスはヘルスチェックで破棄して、min_sizeまで補充する
+        os.kill(survivor.pid, signal.SIGKILL)
+        await wait_until(lambda: pool.clients() and pool.clients()[0] is not survivor)
+        await wait_until(lambda: pool.clients()[0].is_alive())
+        assert pool.stats()["idle"] == 1
+    finally:
+        await pool.stop()
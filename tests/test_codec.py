@@ -0,0 +1,55 @@
+"""Tests for the pluggable JSON codecs."""
+
+import json
+
+import pytest
+
+from claude_code_sdk._internal.codec import (
+    CODEC_ENV_VAR,
+    StdlibCodec,
+    available_codecs,
+    get_codec,
+)
+
+RECORD = {
+    "type": "assistant",
+    "message": {"content": [{"type": "text", "text": "こんにちは ✓ \"quoted\"\n"}]},
+    "n": 1.5,
+    "ok": True,
+    "none": None,
+}
+
+
+@pytest.fixture(params=available_codecs())
+def codec(request):
+    return get_codec(request.param)
+
+
+def test_round_trip(codec):
+    line = codec.dumps(RECORD)
+    assert "\n" not in line
+    assert json.loads(line) == RECORD
+    assert codec.loads(line) == RECORD
+    assert codec.loads(line.encode()) == RECORD
+    assert codec.loads(bytearray(line.encode())) == RECORD
+
+
+def test_malformed_input_raises_value_error(codec):
+    with pytest.raises(ValueError):
+        codec.loads(b'{"type": ')
+
+
+def test_falls_back_to_json_for_unsupported_values(codec):
+    # orjson rejects non-str keys and integers above 64 bits
+    value = {"big": 2**70, 1: "int key"}
+    assert json.loads(codec.dumps(value)) == {"big": 2**70, "1": "int key"}
+
+
+def test_get_codec(monkeypatch):
+    assert get_codec("json") is get_codec("JSON")
+    assert isinstance(get_codec("json"), StdlibCodec)
+    assert get_codec("auto").name == available_codecs()[0]
+    monkeypatch.setenv(CODEC_ENV_VAR, "json")
+    assert get_codec().name == "json"
+    with pytest.raises(ValueError):
+        get_codec("yaml")
@@ -0,0 +1,138 @@
+"""Tests for the CLI simulator itself, driven over raw stream-json."""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+TOOLS = Path(__file__).resolve().parent.parent / "tools"
+FAKE_CLI = str(TOOLS / "fake_claude_cli.py")
+STREAMING = ["--output-format", "stream-json", "--verbose", "--input-format", "stream-json"]
+STEP_TYPES = {"text", "echo", "tool_use", "mcp", "sleep"}
+
+
+def user(text: str) -> dict:
+    return {"type": "user", "message": {"role": "user", "content": text}}
+
+
+def control(request_id: str, subtype: str) -> dict:
+    return {"type": "control_request", "request_id": request_id, "request": {"subtype": subtype}}
+
+
+def run(args: list[str], messages: tuple | list = (), scenario: str | None = None):
+    """Run the simulator to the end of its input; returns (exit code, output messages)."""
+    env = {"PATH": "/usr/bin:/bin"}
+    if scenario:
+        env["FAKE_CLAUDE_SCENARIO"] = str(TOOLS / "scenarios" / f"{scenario}.json")
+    process = subprocess.run(
+        [sys.executable, FAKE_CLI, *args],
+        input="".join(json.dumps(m) + "\n" for m in messages),
+        capture_output=True,
+        text=True,
+        timeout=30,
+        env=env,
+    )
+    output = []
+    for line in process.stdout.splitlines():
+        try:
+            output.append(json.loads(line))
+        except ValueError:
+            output.append(line)
+    return process.returncode, output
+
+
+def results(output: list) -> list[dict]:
+    return [m for m in output if isinstance(m, dict) and m["type"] == "result"]
+
+
+def test_print_mode_answers_once():
+    code, output = run(["--output-format", "stream-json", "--verbose", "--print", "hi"])
+    assert code == 0
+    assert [m["type"] for m in output] == ["system", "assistant", "result"]
+    assert output[1]["message"]["content"] == [{"type": "text", "text": "echo:hi"}]
+    assert output[2]["result"] == "echo:hi"
+    assert output[0]["session_id"] == output[2]["session_id"]
+
+
+def test_streaming_session():
+    code, output = run(STREAMING, [control("req_1", "initialize"), user("a"), user("b")])
+    assert code == 0
+    assert output[0] == {
+        "type": "control_response",
+        "response": {
+            "subtype": "success",
+            "request_id": "req_1",
+            "response": {"commands": [], "output_style": "default"},
+        },
+    }
+    answers = results(output)
+    assert [r["result"] for r in answers] == ["echo:a", "echo:b"]
+    assert answers[0]["session_id"] == answers[1]["session_id"]
+
+
+def test_resume_keeps_the_session_id():
+    _, output = run([*STREAMING, "--resume", "session-1"], [user("a")])
+    assert {m["session_id"] for m in output} == {"session-1"}
+
+
+def test_partial_messages_are_opt_in():
+    _, output = run([*STREAMING, "--include-partial-messages"], [user("a")])
+    deltas = [
+        m["event"]["delta"]["text"]
+        for m in output
+        if m["type"] == "stream_event" and m["event"]["type"] == "content_block_delta"
+    ]
+    assert "".join(deltas) == "echo:a"
+    _, output = run(STREAMING, [user("a")])
+    assert not [m for m in output if m["type"] == "stream_event"]
+
+
+def test_failures_scenario():
+    code, output = run(STREAMING, [user(str(i)) for i in range(4)], scenario="failures")
+    # Turn 1 answers, turn 2 is an error result, turn 3 writes a broken line
+    # before its result, turn 4 crashes without one
+    assert code == 1
+    answers = results(output)
+    assert [(r["subtype"], r["is_error"]) for r in answers] == [
+        ("success", False),
+        ("error_during_execution", True),
+        ("success", False),
+    ]
+    assert '{"type": "assistant", "message": {' in output
+
+
+def test_interrupt_ends_the_turn():
+    process = subprocess.Popen(
+        [sys.executable, FAKE_CLI, *STREAMING],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+        env={"PATH": "/usr/bin:/bin", "FAKE_CLAUDE_SCENARIO": str(TOOLS / "scenarios" / "slow.json")},
+    )
+    try:
+        process.stdin.write(json.dumps(user("a")) + "\n")
+        process.stdin.flush()
+        # The slow turn says "thinking", then sleeps for ten minutes
+        for line in process.stdout:
+            if json.loads(line)["type"] == "assistant":
+                break
+        process.stdin.write(json.dumps(control("req_1", "interrupt")) + "\n")
+        process.stdin.close()
+        output = [json.loads(line) for line in process.stdout]
+        assert process.wait(timeout=10) == 0
+    finally:
+        process.kill()
+    assert output[0]["response"]["request_id"] == "req_1"
+    [result] = results(output)
+    assert (result["subtype"], result["is_error"]) == ("error_during_execution", True)
+
+
+@pytest.mark.parametrize("path", sorted((TOOLS / "scenarios").glob("*.json")), ids=lambda p: p.stem)
+def test_shipped_scenarios_are_valid(path):
+    scenario = json.loads(path.read_text())
+    assert scenario["turns"]
+    for turn in scenario["turns"]:
+        assert {step["type"] for step in turn["steps"]} <= STEP_TYPES
+        assert turn.get("fail") in (None, "crash", "hang", "malformed", "error")
@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobWorkerPool
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), visibility_timeout=60, max_attempts=2, retry_delay=0)
+    yield queue
+    queue.close()
+
+
+async def wait_for_status(queue: JobQueue, job_id: str, status: str) -> dict:
+    for _ in range(500):
+        job = await queue.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{job_id} did not reach {status}: {job}")
+
+
+async def test_jobs_are_claimed_once_in_order(queue):
+    first = await queue.enqueue({"query": "a"})
+    second = await queue.enqueue({"query": "b"})
+    claimed = await asyncio.gather(*(queue.claim() for _ in range(3)))
+    ids = [job["job_id"] for job in claimed if job is not None]
+    assert sorted(ids) == sorted([first, second])
+    assert claimed.count(None) == 1
+    job = await queue.get(first)
+    assert (job["status"], job["attempts"], job["request"]) == (RUNNING, 1, {"query": "a"})
+
+
+async def test_failed_job_is_retried_up_to_max_attempts(queue):
+    job_id = await queue.enqueue({"query": "a"})
+    await queue.claim()
+    assert await queue.fail(job_id, 1, "boom") == QUEUED
+    job = await queue.claim()
+    assert job["attempts"] == 2
+    assert await queue.fail(job_id, 2, "boom") == FAILED
+    assert await queue.claim() is None
+    assert (await queue.get(job_id))["error"] == "boom"
+
+
+async def test_expired_claim_is_taken_over(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), visibility_timeout=0.05, max_attempts=2)
+    try:
+        job_id = await queue.enqueue({"query": "a"})
+        await queue.claim()
+        assert await queue.claim() is None
+        # ワーカーが落ちて延長されなければ、期限切れで他のワーカーが取り直す
+        await asyncio.sleep(0.1)
+        assert (await queue.claim())["attempts"] == 2
+        # 何度も期限が切れたジョブは諦める
+        await asyncio.sleep(0.1)
+        assert await queue.claim() is None
+        assert (await queue.get(job_id))["status"] == FAILED
+    finally:
+        queue.close()
+
+
+async def test_release_does_not_count_an_attempt(queue):
+    job_id = await queue.enqueue({"query": "a"})
+    await queue.claim()
+    await queue.release(job_id, 1)
+    job = await queue.get(job_id)
+    assert (job["status"], job["attempts"]) == (QUEUED, 0)
+
+
+async def test_a_taken_over_attempt_cannot_record_its_outcome(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), visibility_timeout=0.05, max_attempts=3)
+    try:
+        job_id = await queue.enqueue({"query": "a"})
+        first = await queue.claim()
+        await asyncio.sleep(0.1)
+        second = await queue.claim()
+        assert (first["attempts"], second["attempts"]) == (1, 2)
+
+        # 期限切れの後に終わった1回目は、2回目の実行を上書きしない
+        assert not await queue.complete(job_id, 1, {"response": "stale"})
+        assert await queue.fail(job_id, 1, "stale") is None
+        await queue.release(job_id, 1)
+        job = await queue.get(job_id)
+        assert (job["status"], job["attempts"], job["result"]) == (RUNNING, 2, None)
+
+        assert await queue.complete(job_id, 2, {"response": "fresh"})
+        job = await queue.get(job_id)
+        assert (job["status"], job["result"]) == (SUCCEEDED, {"response": "fresh"})
+        # 終わったジョブはもう変わらない
+        assert await queue.fail(job_id, 2, "late") is None
+        assert (await queue.get(job_id))["status"] == SUCCEEDED
+    finally:
+        queue.close()
+
+
+async def test_worker_pool_runs_jobs(queue):
+    async def handler(job: dict) -> dict:
+        if job["request"]["query"] == "bad":
+            raise RuntimeError("bad query")
+        return {"response": "echo:" + job["request"]["query"]}
+
+    workers = JobWorkerPool(queue, handler, concurrency=2, poll_interval=0.01)
+    await workers.start()
+    try:
+        good = await queue.enqueue({"query": "a"})
+        bad = await queue.enqueue({"query": "bad"})
+        job = await wait_for_status(queue, good, SUCCEEDED)
+        assert job["result"] == {"response": "echo:a"}
+        job = await wait_for_status(queue, bad, FAILED)
+        assert (job["attempts"], job["error"]) == (2, "bad query")
+    finally:
+        await workers.stop()
+
+
+async def test_stopped_worker_returns_its_job(queue):
+    started = asyncio.Event()
+
+    async def handler(job: dict) -> dict:
+        started.set()
+        await asyncio.sleep(60)
+        return {}
+
+    workers = JobWorkerPool(queue, handler, concurrency=1, poll_interval=0.01)
+    await workers.start()
+    job_id = await queue.enqueue({"query": "a"})
+    await started.wait()
+    await workers.stop()
+    job = await queue.get(job_id)
+    assert (job["status"], job["attempts"]) == (QUEUED, 0)
+
+
+async def test_heartbeat_keeps_extending_after_an_error(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), visibility_timeout=0.15)
+    extend = queue.extend
+    calls = []
+
+    async def flaky_extend(job_id: str, attempt: int) -> None:
+        calls.append(job_id)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        await extend(job_id, attempt)
+
+    queue.extend = flaky_extend
+
+    async def handler(job: dict) -> dict:
+        await asyncio.sleep(0.4)
+        return {}
+
+    workers = JobWorkerPool(queue, handler, concurrency=1, poll_interval=0.01)
+    await workers.start()
+    try:
+        job_id = await queue.enqueue({"query": "a"})
+        await wait_for_status(queue, job_id, SUCCEEDED)
+        assert len(calls) >= 3
+        stats = await workers.stats()
+        assert (stats["workers"], stats["running"], stats[SUCCEEDED], stats[QUEUED]) == (1, 0, 1, 0)
+    finally:
+        await workers.stop()
+        queue.close()
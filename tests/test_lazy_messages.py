@@ -0,0 +1,94 @@
+"""Tests for lazy message parsing and the message-type filter."""
+
+import pytest
+
+from claude_code_sdk import (
+    AssistantMessage,
+    ResultMessage,
+    StreamEvent,
+    TextBlock,
+    ToolResultBlock,
+    ToolUseBlock,
+    UserMessage,
+)
+from claude_code_sdk._errors import MessageParseError
+from claude_code_sdk._internal.message_parser import message_type_names, parse_message
+
+ASSISTANT = {
+    "type": "assistant",
+    "message": {
+        "model": "claude",
+        "content": [
+            {"type": "text", "text": "hi"},
+            {"type": "thinking", "thinking": "hmm", "signature": "sig"},
+            {"type": "tool_use", "id": "t1", "name": "Read", "input": {"path": "a"}},
+        ],
+    },
+}
+USER = {
+    "type": "user",
+    "message": {
+        "content": [{"type": "tool_result", "tool_use_id": "t1", "content": "x", "is_error": False}]
+    },
+}
+
+
+@pytest.mark.parametrize("data", [ASSISTANT, USER, {"type": "user", "message": {"content": "plain"}}])
+def test_lazy_message_equals_eager(data):
+    eager = parse_message(data)
+    lazy = parse_message(data, lazy=True)
+    assert isinstance(lazy, type(eager))
+    assert lazy == eager
+    assert eager == lazy
+    assert not lazy != eager
+    assert repr(lazy) == repr(eager)
+
+
+def test_lazy_message_differs_from_other_messages():
+    lazy = parse_message(ASSISTANT, lazy=True)
+    assert lazy != AssistantMessage(content=[TextBlock(text="hi")], model="claude")
+    assert lazy != parse_message(USER)
+    assert lazy == parse_message(ASSISTANT, lazy=True)
+    # Like the eager dataclasses, messages are compared by value and not hashable
+    with pytest.raises(TypeError):
+        hash(lazy)
+
+
+def test_lazy_message_stays_slotted():
+    message = parse_message(ASSISTANT, lazy=True)
+    assert not hasattr(message, "__dict__")
+    with pytest.raises(AttributeError):
+        message.extra = 1
+
+
+def test_lazy_content_is_built_once():
+    message = parse_message(ASSISTANT, lazy=True)
+    blocks = message.content
+    assert blocks is message.content
+    assert isinstance(blocks[0], TextBlock)
+    assert isinstance(blocks[2], ToolUseBlock)
+    assert isinstance(parse_message(USER, lazy=True).content[0], ToolResultBlock)
+
+
+def test_lazy_content_can_be_replaced():
+    message = parse_message(ASSISTANT, lazy=True)
+    message.content = [TextBlock(text="replaced")]
+    assert message.content == [TextBlock(text="replaced")]
+
+
+def test_lazy_parse_errors_surface_on_access():
+    message = parse_message({"type": "assistant", "message": {"model": "m"}}, lazy=True)
+    with pytest.raises(MessageParseError):
+        message.content
+    with pytest.raises(MessageParseError):
+        parse_message({"type": "assistant", "message": {}}, lazy=True)
+    with pytest.raises(MessageParseError):
+        parse_message({"type": "user"}, lazy=True)
+
+
+def test_message_type_names():
+    assert message_type_names(None) is None
+    assert message_type_names([ResultMessage, StreamEvent]) == {"result", "stream_event"}
+    assert message_type_names([UserMessage, AssistantMessage]) == {"user", "assistant"}
+    with pytest.raises(ValueError):
+        message_type_names([TextBlock])
@@ -0,0 +1,51 @@
+import pytest
+
+from metrics import Registry
+
+
+def test_counter_and_gauge_samples():
+    registry = Registry()
+    requests = registry.counter("requests_total", "リクエスト数", ["endpoint", "status"])
+    requests.inc(endpoint="/api/chat", status=200)
+    requests.inc(2, endpoint="/api/chat", status=200)
+    registry.gauge("queued", "待ち", function=lambda: 3)
+    registry.gauge("processes", "プロセス数", ["owner"], function=lambda: {("pool",): 1, ("session",): 2})
+    assert registry.render().splitlines() == [
+        "# HELP requests_total リクエスト数",
+        "# TYPE requests_total counter",
+        'requests_total{endpoint="/api/chat",status="200"} 3',
+        "# HELP queued 待ち",
+        "# TYPE queued gauge",
+        "queued 3",
+        "# HELP processes プロセス数",
+        "# TYPE processes gauge",
+        'processes{owner="pool"} 1',
+        'processes{owner="session"} 2',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    seconds = registry.histogram("seconds", "時間", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 7):
+        seconds.observe(value)
+    assert registry.render().splitlines()[2:] == [
+        'seconds_bucket{le="0.1"} 2',
+        'seconds_bucket{le="1.0"} 3',
+        'seconds_bucket{le="+Inf"} 4',
+        "seconds_sum 7.65",
+        "seconds_count 4",
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("errors_total", "エラー", ["detail"]).inc(detail='a "b"\\\n')
+    assert registry.render().splitlines()[2] == 'errors_total{detail="a \\"b\\"\\\\\\n"} 1'
+
+
+def test_duplicate_names_are_rejected():
+    registry = Registry()
+    registry.counter("x", "x")
+    with pytest.raises(ValueError):
+        registry.gauge("x", "x")
@@ -0,0 +1,90 @@
+"""Tests for token-level partial messages (include_partial_messages)."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from claude_code_sdk import (
+    AssistantMessage,
+    ClaudeCodeOptions,
+    InputJsonDelta,
+    ResultMessage,
+    StreamEvent,
+    TextDelta,
+    ThinkingDelta,
+    query,
+)
+from claude_code_sdk._internal.message_parser import parse_message
+
+pytestmark = pytest.mark.anyio
+
+FAKE_CLI = str(Path(__file__).resolve().parent.parent / "tools" / "fake_claude_cli.py")
+
+
+@pytest.fixture(autouse=True)
+def chunked_text(tmp_path, monkeypatch):
+    scenario = tmp_path / "scenario.json"
+    scenario.write_text(json.dumps({"turns": [
+        {"steps": [{"type": "text", "text": "The quick brown fox", "chunks": 4}]},
+    ]}))
+    monkeypatch.setenv("FAKE_CLAUDE_SCENARIO", str(scenario))
+
+
+async def run(message_types=None, **options) -> list:
+    return [
+        message
+        async for message in query(
+            prompt="hi",
+            options=ClaudeCodeOptions(cli_path=FAKE_CLI, **options),
+            message_types=message_types,
+        )
+    ]
+
+
+async def test_text_arrives_as_deltas_before_the_assistant_message():
+    messages = await run(include_partial_messages=True)
+    events = [m for m in messages if isinstance(m, StreamEvent)]
+    [assistant] = [m for m in messages if isinstance(m, AssistantMessage)]
+    assert messages.index(events[-1]) < messages.index(assistant)
+
+    assert [e.event["type"] for e in events] == (
+        ["message_start"] + ["content_block_delta"] * 4 + ["message_stop"]
+    )
+    deltas = [e.delta for e in events if e.delta is not None]
+    assert all(isinstance(d, TextDelta) and d.index == 0 for d in deltas)
+    assert "".join(d.text for d in deltas) == assistant.content[0].text
+    assert {e.session_id for e in events} == {messages[-1].session_id}
+
+
+async def test_no_stream_events_unless_requested():
+    messages = await run()
+    assert not any(isinstance(m, StreamEvent) for m in messages)
+    assert isinstance(messages[-1], ResultMessage)
+
+
+async def test_message_types_drops_stream_events():
+    messages = await run([AssistantMessage, ResultMessage], include_partial_messages=True)
+    assert [type(m) for m in messages] == [AssistantMessage, ResultMessage]
+
+
+@pytest.mark.parametrize(
+    "delta, expected",
+    [
+        ({"type": "text_delta", "text": "a"}, TextDelta(index=2, text="a")),
+        ({"type": "thinking_delta", "thinking": "b"}, ThinkingDelta(index=2, thinking="b")),
+        ({"type": "input_json_delta", "partial_json": '{"p'}, InputJsonDelta(index=2, partial_json='{"p')),
+        ({"type": "signature_delta", "signature": "s"}, None),
+    ],
+)
+def test_delta_types(delta, expected):
+    message = parse_message({
+        "type": "stream_event",
+        "uuid": "u",
+        "session_id": "s",
+        "parent_tool_use_id": "toolu_1",
+        "event": {"type": "content_block_delta", "index": 2, "delta": delta},
+    })
+    assert message.delta == expected
+    assert message.parent_tool_use_id == "toolu_1"
+    assert message.event["delta"] == delta
@@ -0,0 +1,310 @@
+"""Tests for Query message buffering and overflow policies."""
+
+import json
+import random
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+import anyio
+import pytest
+
+from claude_code_sdk._internal.codec import get_codec
+from claude_code_sdk._internal.overflow import MemoryOverflow, SpillOverflow
+from claude_code_sdk._internal.query import Query
+from claude_code_sdk._internal.transport import Transport
+
+pytestmark = pytest.mark.anyio
+
+
+class ScriptedTransport(Transport):
+    """Yields preloaded messages with random gaps, like a CLI writing to a pipe.
+
+    ``respond`` is called with every written line and may return messages that
+    are yielded next.
+    """
+
+    def __init__(
+        self,
+        messages: list[dict[str, Any]],
+        respond: Callable[[dict[str, Any]], list[dict[str, Any]]] | None = None,
+        seed: int = 0,
+    ):
+        self._pending = deque(messages)
+        self._respond = respond
+        self._rng = random.Random(seed)
+        self._wakeup = anyio.Event()
+        self._closed = False
+        self.written: list[dict[str, Any]] = []
+
+    async def connect(self) -> None:
+        pass
+
+    async def write(self, data: str) -> None:
+        for line in data.splitlines():
+            message = json.loads(line)
+            self.written.append(message)
+            if self._respond is not None:
+                self._pending.extend(self._respond(message))
+                self._wakeup.set()
+
+    def read_messages(self) -> AsyncIterator[dict[str, Any]]:
+        return self._read()
+
+    async def _read(self) -> AsyncIterator[dict[str, Any]]:
+        while not self._closed:
+            if not self._pending:
+                if self._respond is None:
+                    return
+                self._wakeup = anyio.Event()
+                await self._wakeup.wait()
+                continue
+            # Sometimes several records arrive in one read, sometimes not
+            for _ in range(self._rng.choice([0, 0, 0, 1, 2])):
+                await anyio.lowlevel.checkpoint()
+            if self._rng.random() < 0.02:
+                await anyio.sleep(0.0005)
+            yield self._pending.popleft()
+
+    async def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+
+    def is_ready(self) -> bool:
+        return True
+
+    async def end_input(self) -> None:
+        pass
+
+
+def data_messages(count: int, pad: int = 0) -> list[dict[str, Any]]:
+    return [{"type": "assistant", "n": i, "pad": "x" * pad} for i in range(count)]
+
+
+def answer_control_requests(message: dict[str, Any]) -> list[dict[str, Any]]:
+    if message.get("type") != "control_request":
+        return []
+    return [
+        {
+            "type": "control_response",
+            "response": {
+                "subtype": "success",
+                "request_id": message["request_id"],
+                "response": {},
+            },
+        }
+    ]
+
+
+async def consume(query: Query, count: int | None, seed: int) -> list[int]:
+    """Read ``count`` messages (None: to the end), stalling at random like a slow HTTP client."""
+    rng = random.Random(seed)
+    received = []
+    async for message in query.receive_messages():
+        received.append(message["n"])
+        for _ in range(rng.choice([0, 0, 1, 3])):
+            await anyio.lowlevel.checkpoint()
+        if rng.random() < 0.02:
+            await anyio.sleep(0.001)
+        if len(received) == count:
+            break
+    return received
+
+
+@pytest.mark.parametrize(
+    ("policy", "buffer_size", "runs"),
+    [("memory", 4, 20), ("spill", 4, 20), ("memory", 5000, 2), ("spill", 5000, 2)],
+)
+async def test_messages_keep_their_order(policy, buffer_size, runs):
+    count = 2000
+    for seed in range(runs):
+        transport = ScriptedTransport(data_messages(count, pad=200), seed=seed)
+        query = Query(
+            transport,
+            is_streaming_mode=False,
+            message_buffer_size=buffer_size,
+            message_overflow_policy=policy,
+        )
+        await query.start()
+        try:
+            with anyio.fail_after(10):
+                received = await consume(query, None, seed)
+            assert received == list(range(count))
+            stats = query.stats()
+            assert stats["message_backlog"] == 0
+            assert stats["spill_bytes"] == 0
+            if buffer_size < count:
+                assert stats["message_backlog_high_water"] > buffer_size
+            else:
+                assert stats["message_overflow"] == 0
+                assert stats["spilled_messages"] == 0
+        finally:
+            await query.close()
+
+
+async def test_spill_writes_the_overflow_to_disk():
+    count = 3000
+    transport = ScriptedTransport(data_messages(count, pad=500))
+    query = Query(
+        transport,
+        is_streaming_mode=False,
+        message_buffer_size=10,
+        message_overflow_policy="spill",
+    )
+    await query.start()
+    try:
+        # Nobody consumes, so everything past the buffer overflows
+        with anyio.fail_after(5):
+            while query.stats()["message_backlog"] < count + 1:
+                await anyio.sleep(0.01)
+        stats = query.stats()
+        assert stats["message_overflow"] == count + 1 - 10
+        assert stats["spilled_messages"] > 0
+        assert stats["spill_bytes"] > 0
+
+        with anyio.fail_after(10):
+            received = await consume(query, None, seed=0)
+        assert received == list(range(count))
+        assert query.stats()["spill_bytes"] == 0
+    finally:
+        await query.close()
+
+
+@pytest.mark.parametrize("policy", ["memory", "spill"])
+async def test_interrupt_is_not_stuck_behind_a_stalled_consumer(policy):
+    transport = ScriptedTransport(
+        data_messages(2000), respond=answer_control_requests
+    )
+    query = Query(
+        transport,
+        is_streaming_mode=True,
+        message_buffer_size=50,
+        message_overflow_policy=policy,
+    )
+    await query.start()
+    try:
+        await anyio.sleep(0.05)
+        with anyio.fail_after(2):
+            await query.interrupt()
+        with anyio.fail_after(10):
+            received = await consume(query, 2000, seed=0)
+        assert received == list(range(2000))
+    finally:
+        await query.close()
+
+
+@pytest.mark.parametrize("policy", ["memory", "spill"])
+async def test_permission_request_is_answered_while_the_consumer_stalls(policy):
+    permission_request = {
+        "type": "control_request",
+        "request_id": "cli_1",
+        "request": {
+            "subtype": "can_use_tool",
+            "tool_name": "Bash",
+            "input": {"command": "ls"},
+        },
+    }
+    answered = anyio.Event()
+
+    async def can_use_tool(tool_name, tool_input, context):
+        from claude_code_sdk import PermissionResultAllow
+
+        answered.set()
+        return PermissionResultAllow()
+
+    # The CLI asks for permission after more output than the buffer holds
+    transport = ScriptedTransport(
+        [*data_messages(500), permission_request], respond=answer_control_requests
+    )
+    query = Query(
+        transport,
+        is_streaming_mode=True,
+        can_use_tool=can_use_tool,
+        message_buffer_size=10,
+        message_overflow_policy=policy,
+    )
+    await query.start()
+    try:
+        with anyio.fail_after(2):
+            await answered.wait()
+            while not any(
+                m.get("type") == "control_response" for m in transport.written
+            ):
+                await anyio.sleep(0.01)
+        response = next(
+            m for m in transport.written if m.get("type") == "control_response"
+        )
+        assert response["response"]["request_id"] == "cli_1"
+        assert response["response"]["response"] == {"allow": True}
+    finally:
+        await query.close()
+
+
+def test_invalid_overflow_policy():
+    with pytest.raises(ValueError):
+        Query(ScriptedTransport([]), True, message_overflow_policy="drop")
+    with pytest.raises(ValueError):
+        Query(ScriptedTransport([]), True, message_buffer_size=0)
+    with pytest.raises(ValueError):
+        Query(ScriptedTransport([]), True, message_overflow_limit=-1)
+
+
+@pytest.mark.parametrize("kind", ["memory", "spill"])
+async def test_overflow_is_fifo(kind, tmp_path):
+    overflow = (
+        MemoryOverflow()
+        if kind == "memory"
+        else SpillOverflow(get_codec(), directory=str(tmp_path), chunk_size=256)
+    )
+    received = []
+    try:
+        for i in range(500):
+            overflow.append({"n": i})
+            await overflow.flush()
+            # Drain in irregular steps so the head, the file and the tail interleave
+            if i % 7 == 0:
+                for _ in range(min(3, len(overflow))):
+                    received.append((await overflow.peek())["n"])
+                    overflow.pop()
+        if kind == "spill":
+            assert overflow.spilled > 0
+            assert overflow.spill_bytes > 0
+        while overflow:
+            message = await overflow.peek()
+            # Peeking again returns the same head until it is popped
+            assert await overflow.peek() is message
+            received.append(message["n"])
+            overflow.pop()
+        assert received == list(range(500))
+        assert overflow.spill_bytes == 0
+    finally:
+        overflow.close()
+
+
+@pytest.mark.parametrize("policy", ["memory", "spill"])
+async def test_overflow_limit_fails_the_stream(policy):
+    transport = ScriptedTransport(data_messages(1000))
+    query = Query(
+        transport,
+        is_streaming_mode=False,
+        message_buffer_size=10,
+        message_overflow_policy=policy,
+        message_overflow_limit=50,
+    )
+    await query.start()
+    try:
+        # The reader stops at the limit: the buffer, the overflow, then the
+        # error and end markers
+        with anyio.fail_after(5):
+            while query.stats()["message_backlog"] < 10 + 50 + 2:
+                await anyio.sleep(0.01)
+        await anyio.sleep(0.05)
+        assert query.stats()["message_backlog"] == 10 + 50 + 2
+
+        received = []
+        with pytest.raises(Exception, match="message_overflow_limit"):
+            async for message in query.receive_messages():
+                received.append(message["n"])
+        assert received == list(range(60))
+    finally:
+        await query.close()
@@ -0,0 +1,52 @@
+"""Tests for the single writer task that coalesces frames sent to the CLI."""
+
+from pathlib import Path
+
+import anyio
+import pytest
+
+from claude_code_sdk import ClaudeCodeOptions, ClaudeSDKClient, ResultMessage
+
+pytestmark = pytest.mark.anyio
+
+FAKE_CLI = str(Path(__file__).resolve().parent.parent / "tools" / "fake_claude_cli.py")
+
+
+async def results(client: ClaudeSDKClient, count: int) -> list[str]:
+    answers = []
+    async for message in client.receive_messages():
+        if isinstance(message, ResultMessage):
+            answers.append(message.result)
+            if len(answers) == count:
+                return answers
+    raise AssertionError("the CLI stopped before answering every prompt")
+
+
+async def test_concurrent_queries_are_coalesced_without_interleaving():
+    # Large enough that a write split between two frames would corrupt both lines
+    prompts = [f"{i}:" + "x" * 20_000 for i in range(50)]
+    async with ClaudeSDKClient(ClaudeCodeOptions(cli_path=FAKE_CLI)) as client:
+        before = client.get_stats()
+        async with anyio.create_task_group() as tg:
+            for prompt in prompts:
+                tg.start_soon(client.query, prompt)
+        after = client.get_stats()
+        with anyio.fail_after(30):
+            answers = await results(client, len(prompts))
+
+    assert sorted(answers) == sorted(f"echo:{prompt}" for prompt in prompts)
+    frames = after["frames_written"] - before["frames_written"]
+    writes = after["writes"] - before["writes"]
+    assert frames == len(prompts)
+    # Frames queued while a write is in progress go out together in the next one
+    assert writes < frames / 2
+    assert after["write_queue_depth"] == 0
+
+
+async def test_query_returns_once_its_frame_is_written():
+    async with ClaudeSDKClient(ClaudeCodeOptions(cli_path=FAKE_CLI)) as client:
+        before = client.get_stats()["frames_written"]
+        await client.query("hello")
+        assert client.get_stats()["frames_written"] == before + 1
+        with anyio.fail_after(10):
+            assert await results(client, 1) == ["echo:hello"]
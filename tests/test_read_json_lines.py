@@ -0,0 +1,98 @@
+"""Tests for newline framing of the CLI's stdout."""
+
+import json
+from collections.abc import AsyncIterator
+
+import pytest
+
+from claude_code_sdk._errors import CLIJSONDecodeError
+from claude_code_sdk._internal.codec import get_codec
+from claude_code_sdk._internal.transport.subprocess_cli import _read_json_lines
+
+pytestmark = pytest.mark.anyio
+
+
+class Chunks:
+    """Byte stream that records how many chunks were consumed."""
+
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = chunks
+        self.consumed = 0
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for chunk in self.chunks:
+            self.consumed += 1
+            yield chunk
+
+
+def split(data: bytes, size: int) -> list[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+async def read_all(chunks: list[bytes], max_buffer_size: int = 1024 * 1024) -> list:
+    return [
+        value
+        async for value in _read_json_lines(Chunks(chunks), max_buffer_size, get_codec())
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+async def test_records_split_across_chunks(chunk_size):
+    records = [{"n": i, "text": "é✓" * i} for i in range(50)]
+    data = b"".join(json.dumps(r, ensure_ascii=False).encode() + b"\n" for r in records)
+    assert await read_all(split(data, chunk_size)) == records
+
+
+async def test_blank_lines_and_unterminated_last_record():
+    data = b'{"a": 1}\n\n  \n{"b": 2}\r\n{"c": 3}'
+    assert await read_all([data]) == [{"a": 1}, {"b": 2}, {"c": 3}]
+
+
+async def test_record_at_the_limit_is_accepted():
+    record = {"text": "x" * 100}
+    line = json.dumps(record).encode()
+    assert await read_all(split(line + b"\n", 10), max_buffer_size=len(line)) == [record]
+
+
+async def test_oversized_record_is_rejected():
+    line = json.dumps({"text": "x" * 100}).encode()
+    with pytest.raises(CLIJSONDecodeError, match="maximum buffer size of 50"):
+        await read_all([b'{"ok": 1}\n' + line + b"\n"], max_buffer_size=50)
+
+
+async def test_oversized_partial_record_is_rejected_before_it_ends():
+    line = json.dumps({"text": "x" * 10_000}).encode() + b"\n"
+    stream = Chunks(split(line, 100))
+    with pytest.raises(CLIJSONDecodeError):
+        async for _ in _read_json_lines(stream, 1000, get_codec()):
+            pass
+    # The limit applies as soon as the buffer exceeds it, not at the newline
+    assert stream.consumed == 11
+
+
+async def test_limit_applies_per_record():
+    records = [{"n": i, "text": "x" * 80} for i in range(100)]
+    data = b"".join(json.dumps(r).encode() + b"\n" for r in records)
+    assert await read_all(split(data, 333), max_buffer_size=200) == records
+
+
+async def test_malformed_record():
+    with pytest.raises(CLIJSONDecodeError, match="not json"):
+        await read_all([b'{"ok": 1}\nnot json\n'])
+
+
+async def test_tap_sees_every_raw_line():
+    class Tap:
+        def __init__(self):
+            self.lines = []
+
+        def record(self, direction, line):
+            self.lines.append((direction, bytes(line)))
+
+    tap = Tap()
+    chunks = [b'{"a": 1}\n{"b"', b': 2}\n\n{"c": 3}']
+    values = [
+        value async for value in _read_json_lines(Chunks(chunks), 1024, get_codec(), tap)
+    ]
+    assert values == [{"a": 1}, {"b": 2}, {"c": 3}]
+    assert tap.lines == [("in", b'{"a": 1}'), ("in", b'{"b": 2}'), ("in", b'{"c": 3}')]
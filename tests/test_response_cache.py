@@ -0,0 +1,96 @@
+import time
+
+import pytest
+from claude_code_sdk import ClaudeCodeOptions
+
+from response_cache import (
+    MemoryResponseCache,
+    ResponseCache,
+    SqliteResponseCache,
+    cache_key,
+    create_response_cache,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    caches = []
+
+    def make(ttl: float = 3600.0, max_bytes: int = 1024 * 1024):
+        if request.param == "memory":
+            cache = MemoryResponseCache(ttl, max_bytes)
+        else:
+            cache = SqliteResponseCache(str(tmp_path / "cache.db"), ttl, max_bytes)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def test_cache_key_depends_on_prompt_and_options():
+    options = ClaudeCodeOptions(system_prompt="s", allowed_tools=["Read", "Grep"])
+    key = cache_key("質問", options)
+    assert key == cache_key("質問", ClaudeCodeOptions(system_prompt="s", allowed_tools=["Grep", "Read"]))
+    assert key != cache_key("別の質問", options)
+    assert key != cache_key("質問", ClaudeCodeOptions(system_prompt="t", allowed_tools=["Read", "Grep"]))
+    assert key != cache_key("質問", ClaudeCodeOptions(system_prompt="s", model="other"))
+
+
+async def test_get_and_set(make_cache):
+    cache = make_cache()
+    assert await cache.get("k") is None
+    await cache.set("k", {"response": "答え"})
+    assert await cache.get("k") == {"response": "答え"}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+async def test_expired_entries_are_misses(make_cache):
+    cache = make_cache(ttl=0.05)
+    await cache.set("k", {"response": "a"})
+    time.sleep(0.1)
+    assert await cache.get("k") is None
+
+
+async def test_least_recently_used_entries_are_evicted(make_cache):
+    value = {"response": "x" * 100}
+    cache = make_cache(max_bytes=300)
+    await cache.set("a", value)
+    time.sleep(0.01)
+    await cache.set("b", value)
+    time.sleep(0.01)
+    # aを使ったので、次に消えるのはb
+    assert await cache.get("a") == value
+    time.sleep(0.01)
+    await cache.set("c", value)
+    assert await cache.get("b") is None
+    assert await cache.get("a") == value
+    assert await cache.get("c") == value
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= 300
+
+
+async def test_oversized_value_is_not_stored(make_cache):
+    cache = make_cache(max_bytes=50)
+    await cache.set("k", {"response": "x" * 100})
+    assert await cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_create_response_cache(tmp_path):
+    assert create_response_cache("", "", 1, 1) is None
+    assert create_response_cache("memory", "", 1, 1).backend == "memory"
+    sqlite = create_response_cache("sqlite", str(tmp_path / "c.db"), 1, 1)
+    assert sqlite.backend == "sqlite"
+    sqlite.close()
+    with pytest.raises(ValueError):
+        create_response_cache("redis", "", 1, 1)
+
+
+def test_base_class_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        ResponseCache()
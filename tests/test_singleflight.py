@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+class Source:
+    """メッセージを1つずつ手動で流す実行"""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.started = 0
+        self.cancelled = False
+
+    def __call__(self):
+        self.started += 1
+        return self._run()
+
+    async def _run(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                if message is None:
+                    return
+                if isinstance(message, Exception):
+                    raise message
+                yield message
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def collect(stream) -> list:
+    return [message async for message in stream]
+
+
+async def test_late_subscriber_sees_buffered_messages():
+    flights = SingleFlight()
+    source = Source()
+    async with flights.join("k", source) as (first, leader):
+        assert leader
+        source.queue.put_nowait("a")
+        source.queue.put_nowait("b")
+        assert [await first.__anext__(), await first.__anext__()] == ["a", "b"]
+
+        # 途中から参加しても最初から受け取れる
+        async with flights.join("k", source) as (second, leader):
+            assert not leader
+            source.queue.put_nowait("c")
+            source.queue.put_nowait(None)
+            assert await collect(second) == ["a", "b", "c"]
+        assert await collect(first) == ["c"]
+
+    assert source.started == 1
+    # 実行タスクの終了コールバックを待つ
+    await asyncio.sleep(0)
+    stats = flights.stats()
+    assert (stats["leaders"], stats["coalesced"], stats["in_flight"]) == (1, 1, 0)
+
+
+async def test_error_is_raised_to_every_subscriber():
+    flights = SingleFlight()
+    source = Source()
+    async with flights.join("k", source) as (first, _):
+        async with flights.join("k", source) as (second, _):
+            source.queue.put_nowait("a")
+            source.queue.put_nowait(RuntimeError("boom"))
+            for stream in (first, second):
+                with pytest.raises(RuntimeError, match="boom"):
+                    await collect(stream)
+
+
+async def test_run_is_cancelled_when_the_last_subscriber_leaves():
+    flights = SingleFlight()
+    source = Source()
+    async with flights.join("k", source) as (first, _):
+        async with flights.join("k", source):
+            source.queue.put_nowait("a")
+            assert await first.__anext__() == "a"
+        # 1人残っているので実行は続く
+        assert not source.cancelled
+        assert flights.stats()["in_flight"] == 1
+    assert source.cancelled
+    assert flights.stats()["cancelled"] == 1
+    assert flights.stats()["in_flight"] == 0
+
+    # 止めた実行には相乗りせず、新しく開始する
+    async with flights.join("k", source) as (stream, leader):
+        assert leader
+        source.queue.put_nowait(None)
+        assert await collect(stream) == []
+    assert source.started == 2
+
@@ -0,0 +1,94 @@
+"""Tests for SubprocessCLITransport against the offline CLI simulator."""
+
+from pathlib import Path
+
+import anyio
+import pytest
+
+from claude_code_sdk import ClaudeCodeOptions
+from claude_code_sdk._internal.transport.process_reaper import get_reaper
+from claude_code_sdk._internal.transport.subprocess_cli import SubprocessCLITransport
+from claude_code_sdk._internal.transport.wiretap import read_trace
+
+pytestmark = pytest.mark.anyio
+
+FAKE_CLI = str(Path(__file__).resolve().parent.parent / "tools" / "fake_claude_cli.py")
+
+
+async def empty_stream():
+    return
+    yield
+
+
+async def test_close_from_a_cancelled_task_still_finishes_the_trace(tmp_path):
+    trace = tmp_path / "trace.jsonl.gz"
+    transport = SubprocessCLITransport(
+        empty_stream(), ClaudeCodeOptions(cli_path=FAKE_CLI, trace_path=trace)
+    )
+    await transport.connect()
+    await transport.write('{"type": "user", "message": {"role": "user", "content": "hi"}}\n')
+    process = transport._process
+    with anyio.CancelScope() as scope:
+        scope.cancel()
+        await transport.close()
+
+    assert process.returncode is not None
+
+    metadata, records = read_trace(trace)
+    assert metadata["command"][0] == FAKE_CLI
+    assert [r["dir"] for r in records if r["dir"] == "out"] == ["out"]
+
+
+def cli_with_grandchild(tmp_path: Path, ignore_sigterm: bool) -> tuple[str, Path]:
+    """A CLI that starts a long-running process (like an MCP server) before it runs."""
+    pid_file = tmp_path / "grandchild.pid"
+    child = "(trap '' TERM; exec sleep 600)" if ignore_sigterm else "sleep 600"
+    script = tmp_path / "cli.sh"
+    script.write_text(f'#!/bin/sh\n{child} &\necho $! > "{pid_file}"\nexec "{FAKE_CLI}" "$@"\n')
+    script.chmod(0o755)
+    return str(script), pid_file
+
+
+def is_running(pid: int) -> bool:
+    # A zombie has exited; it only waits for whoever adopted it to reap it
+    try:
+        state = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()[0]
+    except FileNotFoundError:
+        return False
+    return state not in ("Z", "X")
+
+
+async def started_grandchild(transport: SubprocessCLITransport, pid_file: Path) -> int:
+    await transport.connect()
+    with anyio.fail_after(10):
+        while not pid_file.exists() or not pid_file.read_text().strip():
+            await anyio.sleep(0.01)
+    pid = int(pid_file.read_text())
+    assert is_running(pid)
+    return pid
+
+
+@pytest.mark.skipif(not Path("/proc").exists(), reason="needs /proc")
+async def test_close_stops_processes_started_by_the_cli(tmp_path):
+    cli_path, pid_file = cli_with_grandchild(tmp_path, ignore_sigterm=False)
+    transport = SubprocessCLITransport(empty_stream(), ClaudeCodeOptions(cli_path=cli_path))
+    grandchild = await started_grandchild(transport, pid_file)
+    await transport.close()
+    with anyio.fail_after(5):
+        while is_running(grandchild):
+            await anyio.sleep(0.01)
+
+
+@pytest.mark.skipif(not Path("/proc").exists(), reason="needs /proc")
+async def test_reaper_kills_processes_that_ignore_sigterm(tmp_path):
+    cli_path, pid_file = cli_with_grandchild(tmp_path, ignore_sigterm=True)
+    transport = SubprocessCLITransport(
+        empty_stream(), ClaudeCodeOptions(cli_path=cli_path, close_timeout=0.5)
+    )
+    grandchild = await started_grandchild(transport, pid_file)
+    with anyio.fail_after(5):
+        await transport.close()
+    # The CLI exited on SIGTERM; the reaper sends SIGKILL once close_timeout has passed
+    with anyio.fail_after(5):
+        while is_running(grandchild) or get_reaper().pending():
+            await anyio.sleep(0.05)
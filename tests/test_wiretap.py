@@ -0,0 +1,119 @@
+"""Record a session against the CLI simulator, then replay the trace."""
+
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+from claude_code_sdk import (
+    ClaudeCodeOptions,
+    ClaudeSDKClient,
+    PermissionResultAllow,
+    ReplayTransport,
+)
+from claude_code_sdk._internal.transport.wiretap import read_trace
+
+pytestmark = pytest.mark.anyio
+
+FAKE_CLI = str(Path(__file__).resolve().parent.parent / "tools" / "fake_claude_cli.py")
+
+SESSION = {"turns": [
+    {"steps": [
+        {"type": "text", "text": "Looking."},
+        {"type": "tool_use", "name": "Read", "input": {"file_path": "a.py"}, "permission": True},
+        {"type": "sleep", "seconds": 0.3},
+        {"type": "echo"},
+    ]},
+    {"steps": [{"type": "echo"}]},
+]}
+
+
+@pytest.fixture
+def scenario(tmp_path, monkeypatch):
+    def use(turns: dict) -> None:
+        path = tmp_path / "scenario.json"
+        path.write_text(json.dumps(turns))
+        monkeypatch.setenv("FAKE_CLAUDE_SCENARIO", str(path))
+
+    return use
+
+
+class Permissions:
+    """can_use_tool callback that allows everything and remembers what it saw."""
+
+    def __init__(self):
+        self.asked = []
+
+    async def __call__(self, tool_name, tool_input, context):
+        self.asked.append((tool_name, tool_input))
+        return PermissionResultAllow()
+
+
+async def run_session(client: ClaudeSDKClient, prompts: list[str]) -> list:
+    messages = []
+    for prompt in prompts:
+        await client.query(prompt)
+        messages.extend([message async for message in client.receive_response()])
+    return messages
+
+
+async def record(tmp_path: Path, prompts: list[str]) -> tuple[Path, list, Permissions]:
+    trace = tmp_path / "session.jsonl.gz"
+    permissions = Permissions()
+    options = ClaudeCodeOptions(cli_path=FAKE_CLI, trace_path=trace, can_use_tool=permissions)
+    async with ClaudeSDKClient(options) as client:
+        messages = await run_session(client, prompts)
+    return trace, messages, permissions
+
+
+async def test_replay_reproduces_the_recorded_session(tmp_path, scenario):
+    scenario(SESSION)
+    trace, recorded, permissions = await record(tmp_path, ["first", "second"])
+    metadata, records = read_trace(trace)
+    assert metadata["command"][0] == FAKE_CLI
+    assert {r["dir"] for r in records} >= {"in", "out"}
+
+    replay_permissions = Permissions()
+    options = ClaudeCodeOptions(can_use_tool=replay_permissions)
+    async with ClaudeSDKClient(options, transport=ReplayTransport(trace, speed=None)) as client:
+        replayed = await run_session(client, ["anything", "else"])
+
+    # The initialize handshake and the permission check were answered under
+    # fresh request ids, and the live callback was asked the recorded question
+    assert replayed == recorded
+    assert replay_permissions.asked == permissions.asked == [("Read", {"file_path": "a.py"})]
+    assert recorded[-1].result == "echo:second"
+
+
+async def test_replay_keeps_the_recorded_pace(tmp_path, scenario):
+    scenario(SESSION)
+    trace, _, _ = await record(tmp_path, ["first", "second"])
+
+    async def replay(speed) -> float:
+        transport = ReplayTransport(trace, speed=speed)
+        options = ClaudeCodeOptions(can_use_tool=Permissions())
+        async with ClaudeSDKClient(options, transport=transport) as client:
+            started = time.monotonic()
+            await run_session(client, ["first"])
+            return time.monotonic() - started
+
+    assert await replay(1.0) >= 0.3
+    assert await replay(None) < 0.3
+
+
+async def test_replay_raises_the_recorded_exit(tmp_path, scenario):
+    scenario({"turns": [{"steps": [{"type": "text", "text": "partial"}], "fail": "crash"}]})
+    trace = tmp_path / "crash.jsonl.gz"
+    # The reader's ProcessError reaches receive_response() as a plain Exception
+    with pytest.raises(Exception, match="exit code 1"):
+        async with ClaudeSDKClient(ClaudeCodeOptions(cli_path=FAKE_CLI, trace_path=trace)) as client:
+            await run_session(client, ["boom"])
+
+    messages = []
+    with pytest.raises(Exception, match="exit code 1"):
+        async with ClaudeSDKClient(transport=ReplayTransport(trace, speed=None)) as client:
+            await client.query("boom")
+            async for message in client.receive_response():
+                messages.append(message)
+    assert messages[-1].content[0].text == "partial"
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""Offline stand-in for the Claude Code CLI, driven by a scenario file.
+
+Speaks the same stream-json protocol as the real CLI: messages on stdout,
+user messages and control requests/responses on stdin (``--input-format
+stream-json``), or a single prompt with ``--print``. Nothing is sent to the
+network, so the SDK and the chat server can be benchmarked and load tested
+deterministically.
+
+Usage:
+    ClaudeCodeOptions(cli_path="tools/fake_claude_cli.py")
+    CLAUDE_CLI_PATH=tools/fake_claude_cli.py python api_server.py
+
+The scenario is a JSON file named by the FAKE_CLAUDE_SCENARIO environment
+variable (see tools/scenarios/). Without one, every prompt is echoed back.
+
+Scenario keys (all optional):
+    spawn_delay     Seconds to sleep before doing anything (Node start-up)
+    init_delay      Seconds to sleep before answering the initialize request
+    exit_code       Exit immediately with this code (spawn failure)
+    model           Model name reported in messages
+    turns           List of turns, used in order for successive prompts; the
+                    last one repeats
+
+Turn keys (all optional):
+    first_message_delay   Seconds before the first message of the turn
+    message_delay         Seconds between messages
+    steps                 List of steps (below); default is one echo step
+    result                Fields merged into the result message
+                          (is_error, total_cost_usd, usage, num_turns, ...)
+    fail                  Failure injected after the steps, instead of the
+                          result: "crash" (exit 1), "hang" (stop responding),
+                          "malformed" (write a broken JSON line) or "error"
+                          (an error result)
+
+Step types:
+    {"type": "text", "text": "..."}           Assistant text. "size" pads it
+                                              to that many characters,
+                                              "chunks" sets the number of
+                                              deltas with --include-partial-messages
+    {"type": "echo"}                          Assistant text "echo:<prompt>"
+    {"type": "tool_use", "name": "Read",      Tool call and its result.
+     "input": {...}, "result_size": 1000,     "permission": true asks
+     "permission": false, "hooks": false}     can_use_tool first, "hooks": true
+                                              calls every registered hook
+    {"type": "mcp", "server": "tools",        tools/call on an SDK MCP server
+     "tool": "add", "arguments": {...}}
+    {"type": "sleep", "seconds": 1.0}         Pause (a slow tool or model)
+
+An interrupt control request ends the running turn with an
+"error_during_execution" result, like the real CLI.
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from typing import Any
+
+DEFAULT_TURN: dict[str, Any] = {"steps": [{"type": "echo"}]}
+
+
+class Interrupted(Exception):
+    """The SDK asked to stop the current turn."""
+
+
+class FakeCLI:
+    def __init__(self, args: list[str], scenario: dict[str, Any]):
+        self.args = args
+        self.scenario = scenario
+        self.streaming = "--input-format" in args
+        self.partial = "--include-partial-messages" in args
+        self.session_id = self._flag("--resume") or str(uuid.uuid4())
+        self.model = scenario.get("model", "claude-fake")
+        self.turn_index = 0
+        self.hook_ids: list[str] = []
+        self.next_request = 0
+        # stdin is read on a thread so control messages arrive during a turn
+        self.inbox: queue.Queue[dict[str, Any] | None] = queue.Queue()
+        # User messages (and end of input, None) that arrived during a turn
+        self.deferred: list[dict[str, Any] | None] = []
+        self.responses: dict[str, dict[str, Any]] = {}
+        self.interrupted = False
+
+    def _flag(self, name: str) -> str | None:
+        if name in self.args:
+            index = self.args.index(name)
+            if index + 1 < len(self.args):
+                return self.args[index + 1]
+        return None
+
+    # Output
+
+    def emit(self, message: dict[str, Any]) -> None:
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+    def emit_system_init(self) -> None:
+        self.emit(
+            {
+                "type": "system",
+                "subtype": "init",
+                "session_id": self.session_id,
+                "model": self.model,
+                "tools": ["Read", "Write", "Bash"],
+            }
+        )
+
+    def emit_assistant(self, content: list[dict[str, Any]]) -> None:
+        self.emit(
+            {
+                "type": "assistant",
+                "message": {"model": self.model, "content": content},
+                "parent_tool_use_id": None,
+                "session_id": self.session_id,
+            }
+        )
+
+    def emit_result(self, started_at: float, fields: dict[str, Any]) -> None:
+        duration_ms = int((time.monotonic() - started_at) * 1000)
+        result = {
+            "type": "result",
+            "subtype": "success",
+            "duration_ms": duration_ms,
+            "duration_api_ms": duration_ms,
+            "is_error": False,
+            "num_turns": 1,
+            "session_id": self.session_id,
+            "total_cost_usd": 0.0,
+            "usage": {"input_tokens": 0, "output_tokens": 0},
+            "result": "",
+        }
+        result.update(fields)
+        self.emit(result)
+
+    # Input
+
+    def read_stdin(self) -> None:
+        for line in sys.stdin:
+            if line.strip():
+                self.inbox.put(json.loads(line))
+        self.inbox.put(None)
+
+    def handle_control_request(self, message: dict[str, Any]) -> None:
+        request = message["request"]
+        subtype = request.get("subtype")
+        response: dict[str, Any] = {}
+        if subtype == "initialize":
+            time.sleep(self.scenario.get("init_delay", 0))
+            for matchers in (request.get("hooks") or {}).values():
+                for matcher in matchers:
+                    self.hook_ids.extend(matcher.get("hookCallbackIds", []))
+            response = {"commands": [], "output_style": "default"}
+        elif subtype == "interrupt":
+            self.interrupted = True
+        self.emit(
+            {
+                "type": "control_response",
+                "response": {
+                    "subtype": "success",
+                    "request_id": message["request_id"],
+                    "response": response,
+                },
+            }
+        )
+
+    def wait(self, seconds: float) -> None:
+        """Sleep while still answering control messages; raise on interrupt."""
+        deadline = time.monotonic() + seconds
+        while True:
+            self.drain_inbox(max(0.0, deadline - time.monotonic()))
+            if self.interrupted:
+                self.interrupted = False
+                raise Interrupted()
+            if time.monotonic() >= deadline:
+                return
+
+    def drain_inbox(self, timeout: float) -> None:
+        """Handle control traffic that arrives within ``timeout`` seconds.
+
+        User messages are deferred to the main loop.
+        """
+        end = time.monotonic() + timeout
+        while not self.interrupted:
+            try:
+                message = self.inbox.get(timeout=max(0.0, end - time.monotonic()))
+            except queue.Empty:
+                return
+            if message is None or message.get("type") == "user":
+                self.deferred.append(message)
+            else:
+                self.dispatch(message)
+
+    def dispatch(self, message: dict[str, Any]) -> None:
+        if message.get("type") == "control_request":
+            self.handle_control_request(message)
+        elif message.get("type") == "control_response":
+            response = message["response"]
+            self.responses[response["request_id"]] = response
+
+    def control_request(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Send a control request to the SDK and wait for its response."""
+        self.next_request += 1
+        request_id = f"cli_req_{self.next_request}"
+        self.emit({"type": "control_request", "request_id": request_id, "request": request})
+        while request_id not in self.responses:
+            if not self.streaming or None in self.deferred:
+                return {"subtype": "error", "error": "input closed"}
+            message = self.inbox.get()
+            if message is None or message.get("type") == "user":
+                self.deferred.append(message)
+            else:
+                self.dispatch(message)
+        return self.responses.pop(request_id)
+
+    # Turns
+
+    def next_turn(self) -> dict[str, Any]:
+        turns = self.scenario.get("turns") or [DEFAULT_TURN]
+        turn = turns[min(self.turn_index, len(turns) - 1)]
+        self.turn_index += 1
+        return turn
+
+    def run_turn(self, prompt: str) -> None:
+        turn = self.next_turn()
+        started_at = time.monotonic()
+        delay = turn.get("message_delay", 0)
+        try:
+            self.emit_system_init()
+            self.wait(turn.get("first_message_delay", 0))
+            texts = []
+            for number, step in enumerate(turn.get("steps") or DEFAULT_TURN["steps"]):
+                if number:
+                    self.wait(delay)
+                texts.append(self.run_step(step, prompt))
+        except Interrupted:
+            self.emit_result(
+                started_at,
+                {"subtype": "error_during_execution", "is_error": True, "result": ""},
+            )
+            return
+
+        fail = turn.get("fail")
+        if fail == "crash":
+            sys.stderr.write("fake CLI: injected crash\n")
+            os._exit(1)
+        if fail == "hang":
+            while True:
+                time.sleep(3600)
+        if fail == "malformed":
+            sys.stdout.write('{"type": "assistant", "message": {\n')
+            sys.stdout.flush()
+        fields = {"result": "".join(t for t in texts if t)}
+        if fail == "error":
+            fields.update(subtype="error_during_execution", is_error=True)
+        fields.update(turn.get("result", {}))
+        self.emit_result(started_at, fields)
+
+    def run_step(self, step: dict[str, Any], prompt: str) -> str | None:
+        kind = step.get("type")
+        if kind == "echo":
+            return self.send_text("echo:" + prompt, 1)
+        if kind == "text":
+            text = step.get("text", "")
+            if step.get("size", 0) > len(text):
+                text = (text or "x") * (step["size"] // max(1, len(text or "x")) + 1)
+                text = text[: step["size"]]
+            return self.send_text(text, step.get("chunks", 1))
+        if kind == "tool_use":
+            self.run_tool(step)
+        elif kind == "mcp":
+            self.run_mcp(step)
+        elif kind == "sleep":
+            self.wait(step.get("seconds", 0))
+        return None
+
+    def send_text(self, text: str, chunks: int) -> str:
+        if self.partial:
+            self.emit_stream_event({"type": "message_start"})
+            size = max(1, -(-len(text) // max(1, chunks)))
+            for start in range(0, len(text), size):
+                self.emit_stream_event(
+                    {
+                        "type": "content_block_delta",
+                        "index": 0,
+                        "delta": {"type": "text_delta", "text": text[start : start + size]},
+                    }
+                )
+            self.emit_stream_event({"type": "message_stop"})
+        self.emit_assistant([{"type": "text", "text": text}])
+        return text
+
+    def emit_stream_event(self, event: dict[str, Any]) -> None:
+        self.emit(
+            {
+                "type": "stream_event",
+                "uuid": str(uuid.uuid4()),
+                "session_id": self.session_id,
+                "parent_tool_use_id": None,
+                "event": event,
+            }
+        )
+
+    def run_tool(self, step: dict[str, Any]) -> None:
+        tool_use_id = f"toolu_{uuid.uuid4().hex[:24]}"
+        name = step.get("name", "Read")
+        tool_input = step.get("input", {})
+        self.emit_assistant(
+            [{"type": "tool_use", "id": tool_use_id, "name": name, "input": tool_input}]
+        )
+        if step.get("hooks"):
+            for callback_id in self.hook_ids:
+                self.control_request(
+                    {
+                        "subtype": "hook_callback",
+                        "callback_id": callback_id,
+                        "input": {"tool_name": name, "tool_input": tool_input},
+                        "tool_use_id": tool_use_id,
+                    }
+                )
+        content, is_error = "x" * step.get("result_size", 100), False
+        if step.get("permission"):
+            response = self.control_request(
+                {
+                    "subtype": "can_use_tool",
+                    "tool_name": name,
+                    "input": tool_input,
+                    "permission_suggestions": [],
+                }
+            )
+            decision = response.get("response", {})
+            if response.get("subtype") == "error" or not decision.get("allow"):
+                content = decision.get("reason") or response.get("error") or "denied"
+                is_error = True
+        self.emit_tool_result(tool_use_id, content, is_error)
+
+    def run_mcp(self, step: dict[str, Any]) -> None:
+        tool_use_id = f"toolu_{uuid.uuid4().hex[:24]}"
+        server, tool = step.get("server", "tools"), step.get("tool", "")
+        self.emit_assistant(
+            [
+                {
+                    "type": "tool_use",
+                    "id": tool_use_id,
+                    "name": f"mcp__{server}__{tool}",
+                    "input": step.get("arguments", {}),
+                }
+            ]
+        )
+        self.next_request += 1
+        response = self.control_request(
+            {
+                "subtype": "mcp_message",
+                "server_name": server,
+                "message": {
+                    "jsonrpc": "2.0",
+                    "id": self.next_request,
+                    "method": "tools/call",
+                    "params": {"name": tool, "arguments": step.get("arguments", {})},
+                },
+            }
+        )
+        reply = response.get("response", {})
+        result = reply.get("result", {})
+        content = json.dumps(result.get("content", reply.get("error", "")))
+        self.emit_tool_result(tool_use_id, content, "error" in reply or result.get("is_error", False))
+
+    def emit_tool_result(self, tool_use_id: str, content: str, is_error: bool) -> None:
+        self.emit(
+            {
+                "type": "user",
+                "message": {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "tool_result",
+                            "tool_use_id": tool_use_id,
+                            "content": content,
+                            "is_error": is_error,
+                        }
+                    ],
+                },
+                "parent_tool_use_id": None,
+                "session_id": self.session_id,
+            }
+        )
+
+    def main(self) -> int:
+        time.sleep(self.scenario.get("spawn_delay", 0))
+        if "exit_code" in self.scenario:
+            sys.stderr.write("fake CLI: injected start-up failure\n")
+            return int(self.scenario["exit_code"])
+
+        if not self.streaming:
+            prompt = self.args[-1] if "--print" in self.args else ""
+            self.run_turn(prompt)
+            return 0
+
+        threading.Thread(target=self.read_stdin, daemon=True).start()
+        while True:
+            message = self.deferred.pop(0) if self.deferred else self.inbox.get()
+            if message is None:
+                return 0
+            if message.get("type") == "user":
+                content = message["message"]["content"]
+                if isinstance(content, list):
+                    content = "".join(b.get("text", "") for b in content if isinstance(b, dict))
+                self.interrupted = False
+                self.run_turn(content)
+            else:
+                self.dispatch(message)
+
+
+def load_scenario() -> dict[str, Any]:
+    path = os.environ.get("FAKE_CLAUDE_SCENARIO")
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    sys.exit(FakeCLI(sys.argv[1:], load_scenario()).main())
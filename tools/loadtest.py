@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""Open-loop HTTP load generator for the chat server.
+
+Replays a JSONL corpus of ChatQuery payloads (one JSON object per line, the
+same shape as the /api/chat request body) against a running server. Arrivals
+follow a Poisson process at --rate requests/s and do not wait for earlier
+requests to finish, so queueing delay shows up in the latencies instead of
+silently lowering the offered load.
+
+A fraction of requests (--resume-ratio) continues a session returned by an
+earlier response; the rest start new sessions. Corpus lines that already set
+resume_session are sent as-is.
+
+While the test runs, /metrics is sampled for CLI process counts and admission
+queue depth. The report has p50/p95/p99 latency, time to first byte (for the
+stream endpoint, also time to the first text event), error rates by kind and
+process counts; --output saves it as JSON and --compare prints the change
+against a saved report.
+
+To run without the real CLI, start the server from the repository root
+against the offline simulator, then run the load test from another shell:
+
+    CLAUDE_CLI_PATH=tools/fake_claude_cli.py \\
+    FAKE_CLAUDE_SCENARIO=tools/scenarios/typical_chat.json \\
+    uvicorn api_server:app --port 8002
+
+    python tools/loadtest.py --url http://localhost:8002 --endpoint chat \\
+        --corpus tools/loadtest_corpus.jsonl --rate 2 --duration 60 \\
+        --output report.json
+
+Usage:
+    python tools/loadtest.py [--url http://localhost:8002] [--endpoint chat|stream]
+                             [--corpus tools/loadtest_corpus.jsonl] [--rate 2]
+                             [--duration 60] [--resume-ratio 0.3] [--timeout 300]
+                             [--max-outstanding 1000] [--seed 0]
+                             [--output report.json] [--compare before.json]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+DEFAULT_CORPUS = Path(__file__).with_name("loadtest_corpus.jsonl")
+ENDPOINTS = {"chat": "/api/chat", "stream": "/api/chat/stream"}
+# Metrics sampled from /metrics: name -> label whose values are reported separately
+SAMPLED_METRICS = {
+    "chat_cli_processes": "owner",
+    "chat_admission_in_flight": None,
+    "chat_admission_queued": None,
+}
+SAMPLE_LINE = re.compile(r'^(\w+)(?:\{(\w+)="([^"]*)"\})? (\S+)$')
+
+
+def load_corpus(path: Path) -> list[dict[str, Any]]:
+    payloads = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                payloads.append(json.loads(line))
+    if not payloads:
+        raise SystemExit(f"{path}: corpus is empty")
+    return payloads
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    """Nearest-rank percentile (p in 0-100) of an unsorted list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(values: list[float]) -> dict[str, float | None]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace, corpus: list[dict[str, Any]]):
+        self.args = args
+        self.corpus = corpus
+        self.random = random.Random(args.seed)
+        self.path = ENDPOINTS[args.endpoint]
+        self.sessions: list[str] = []
+        self.results: list[dict[str, Any]] = []
+        self.samples: dict[str, list[float]] = {}
+        self.outstanding = 0
+        self.skipped = 0
+
+    def next_payload(self, index: int) -> dict[str, Any]:
+        payload = dict(self.corpus[index % len(self.corpus)])
+        payload.setdefault("request_id", f"loadtest-{index}")
+        if (
+            "resume_session" not in payload
+            and self.sessions
+            and self.random.random() < self.args.resume_ratio
+        ):
+            payload["resume_session"] = self.random.choice(self.sessions)
+        return payload
+
+    async def run(self) -> dict[str, Any]:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+        timeout = httpx.Timeout(self.args.timeout, connect=10.0)
+        async with httpx.AsyncClient(
+            base_url=self.args.url, limits=limits, timeout=timeout
+        ) as client:
+            sampler = asyncio.create_task(self.sample_metrics(client))
+            tasks = []
+            started = time.monotonic()
+            deadline = started + self.args.duration
+            next_at = started
+            index = 0
+            while True:
+                next_at += self.random.expovariate(self.args.rate)
+                if next_at >= deadline:
+                    break
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+                if self.outstanding >= self.args.max_outstanding:
+                    # The client itself is saturated; count it rather than block the schedule
+                    self.skipped += 1
+                    continue
+                payload = self.next_payload(index)
+                index += 1
+                tasks.append(asyncio.create_task(self.send(client, payload)))
+            offered_seconds = time.monotonic() - started
+            await asyncio.gather(*tasks)
+            elapsed = time.monotonic() - started
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+        return self.report(offered_seconds, elapsed)
+
+    async def send(self, client: httpx.AsyncClient, payload: dict[str, Any]) -> None:
+        result: dict[str, Any] = {
+            "resumed": "resume_session" in payload,
+            "status": None,
+            "error": None,
+            "ttfb": None,
+            "first_text": None,
+            "latency": None,
+        }
+        self.outstanding += 1
+        started = time.monotonic()
+        try:
+            async with client.stream("POST", self.path, json=payload) as response:
+                result["status"] = response.status_code
+                if self.args.endpoint == "stream" and response.status_code == 200:
+                    await self.read_events(response, started, result)
+                else:
+                    body = b""
+                    async for chunk in response.aiter_bytes():
+                        if result["ttfb"] is None:
+                            result["ttfb"] = time.monotonic() - started
+                        body += chunk
+                    self.read_body(response.status_code, body, result)
+        except httpx.TimeoutException:
+            result["error"] = "timeout"
+        except httpx.HTTPError as e:
+            result["error"] = type(e).__name__
+        finally:
+            result["latency"] = time.monotonic() - started
+            self.outstanding -= 1
+            self.results.append(result)
+
+    def read_body(self, status: int, body: bytes, result: dict[str, Any]) -> None:
+        if status != 200:
+            result["error"] = f"http_{status}"
+            return
+        data = json.loads(body)
+        self.finish(data, result)
+
+    async def read_events(
+        self, response: httpx.Response, started: float, result: dict[str, Any]
+    ) -> None:
+        name = None
+        async for line in response.aiter_lines():
+            if result["ttfb"] is None:
+                result["ttfb"] = time.monotonic() - started
+            if line.startswith("event:"):
+                name = line[6:].strip()
+            elif line.startswith("data:") and name:
+                if name == "text" and result["first_text"] is None:
+                    result["first_text"] = time.monotonic() - started
+                elif name == "done":
+                    self.finish(json.loads(line[5:]), result)
+                elif name == "error":
+                    data = json.loads(line[5:])
+                    result["error"] = f"http_{data['status']}" if "status" in data else "stream_error"
+
+    def finish(self, data: dict[str, Any], result: dict[str, Any]) -> None:
+        if data.get("timed_out"):
+            result["error"] = "timed_out"
+        elif data.get("is_error"):
+            result["error"] = "is_error"
+        if data.get("session_id") and not data.get("is_error"):
+            self.sessions.append(data["session_id"])
+
+    async def sample_metrics(self, client: httpx.AsyncClient) -> None:
+        while True:
+            try:
+                response = await client.get("/metrics", timeout=5.0)
+                values = parse_metrics(response.text)
+            except httpx.HTTPError:
+                values = {}
+            for key, value in values.items():
+                self.samples.setdefault(key, []).append(value)
+            await asyncio.sleep(self.args.sample_interval)
+
+    def report(self, offered_seconds: float, elapsed: float) -> dict[str, Any]:
+        ok = [r for r in self.results if r["error"] is None]
+        errors = Counter(r["error"] for r in self.results if r["error"] is not None)
+        sent = len(self.results)
+        report: dict[str, Any] = {
+            "url": self.args.url,
+            "endpoint": self.path,
+            "rate": self.args.rate,
+            "duration": self.args.duration,
+            "resume_ratio": self.args.resume_ratio,
+            "seed": self.args.seed,
+            "sent": sent,
+            "skipped": self.skipped,
+            "resumed": sum(r["resumed"] for r in self.results),
+            "offered_rps": sent / offered_seconds if offered_seconds else 0.0,
+            "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+            "error_rate": (sent - len(ok)) / sent if sent else 0.0,
+            "errors": dict(errors),
+            "latency": summarize([r["latency"] for r in ok]),
+            "ttfb": summarize([r["ttfb"] for r in ok if r["ttfb"] is not None]),
+            "processes": {
+                key: {"max": max(values), "mean": sum(values) / len(values)}
+                for key, values in sorted(self.samples.items())
+            },
+        }
+        if self.args.endpoint == "stream":
+            report["first_text"] = summarize([r["first_text"] for r in ok if r["first_text"] is not None])
+        return report
+
+
+def parse_metrics(text: str) -> dict[str, float]:
+    """The sampled gauges from a /metrics page, plus a total over labelled ones."""
+    values: dict[str, float] = {}
+    for line in text.splitlines():
+        match = SAMPLE_LINE.match(line)
+        if not match or match.group(1) not in SAMPLED_METRICS:
+            continue
+        name, label, label_value, value = match.groups()
+        if label and label == SAMPLED_METRICS[name]:
+            values[f"{name}{{{label_value}}}"] = float(value)
+            values[f"{name}_total"] = values.get(f"{name}_total", 0.0) + float(value)
+        else:
+            values[name] = float(value)
+    return values
+
+
+def format_seconds(value: float | None) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(
+        f"{report['endpoint']}  rate={report['rate']}/s  duration={report['duration']}s  "
+        f"resume_ratio={report['resume_ratio']}"
+    )
+    print(
+        f"sent {report['sent']} ({report['resumed']} resumed, {report['skipped']} skipped)  "
+        f"offered {report['offered_rps']:.2f}/s  throughput {report['throughput_rps']:.2f}/s  "
+        f"errors {report['error_rate']:.1%} {report['errors'] or ''}"
+    )
+    keys = ["latency", "ttfb"] + (["first_text"] if "first_text" in report else [])
+    print(f"{'':<12}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for key in keys:
+        stats = report[key]
+        print(
+            f"{key:<12}"
+            + "".join(f"{format_seconds(stats[p]):>10}" for p in ("p50", "p95", "p99", "max"))
+        )
+    for key, stats in report["processes"].items():
+        print(f"{key:<40} max {stats['max']:>6.0f}  mean {stats['mean']:>8.1f}")
+
+
+def print_comparison(before: dict[str, Any], after: dict[str, Any]) -> None:
+    print("\ncompared with the saved report:")
+    for key in ("latency", "ttfb", "first_text"):
+        if key not in before or key not in after:
+            continue
+        for p in ("p50", "p95", "p99"):
+            old, new = before[key][p], after[key][p]
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            print(f"  {key} {p}: {format_seconds(old)} -> {format_seconds(new)} ({change:+.1%})")
+    print(f"  error_rate: {before['error_rate']:.1%} -> {after['error_rate']:.1%}")
+    print(f"  throughput: {before['throughput_rps']:.2f}/s -> {after['throughput_rps']:.2f}/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8002")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="chat")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--rate", type=float, default=2.0, help="mean arrivals per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of arrivals")
+    parser.add_argument("--resume-ratio", type=float, default=0.3)
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request timeout")
+    parser.add_argument("--max-outstanding", type=int, default=1000)
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path)
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadTest(args, load_corpus(args.corpus)).run())
+    print_report(report)
+    if args.compare:
+        print_comparison(json.loads(args.compare.read_text()), report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,13 +11,17 @@ from ._errors import (
     CLINotFoundError,
     ProcessError,
 )
+from ._internal.text_accumulator import TextAccumulator
 from ._internal.transport import Transport
+from ._internal.transport.wiretap import ReplayTransport, WireTap
 from .client import ClaudeSDKClient
 from .query import query
 from .types import (
     AssistantMessage,
     ClaudeCodeOptions,
     ContentBlock,
+    ContentBlockDelta,
+    InputJsonDelta,
     McpSdkServerConfig,
     McpServerConfig,
     Message,
@@ -27,9 +31,12 @@ from .types import (
     PermissionResultDeny,
     PermissionUpdate,
     ResultMessage,
+    StreamEvent,
     SystemMessage,
     TextBlock,
+    TextDelta,
     ThinkingBlock,
+    ThinkingDelta,
     ToolResultBlock,
     ToolUseBlock,
     UserMessage,
@@ -276,6 +283,8 @@ __all__ = [
     "query",
     # Transport
     "Transport",
+    "ReplayTransport",
+    "WireTap",
     "ClaudeSDKClient",
     # Types
     "PermissionMode",
@@ -285,6 +294,7 @@ __all__ = [
     "AssistantMessage",
     "SystemMessage",
     "ResultMessage",
+    "StreamEvent",
     "Message",
     "ClaudeCodeOptions",
     "TextBlock",
@@ -292,6 +302,12 @@ __all__ = [
     "ToolUseBlock",
     "ToolResultBlock",
     "ContentBlock",
+    # Partial messages
+    "ContentBlockDelta",
+    "TextDelta",
+    "ThinkingDelta",
+    "InputJsonDelta",
+    "TextAccumulator",
     # Permission results (keep these as they may be used by internal callbacks)
     "PermissionResult",
     "PermissionResultAllow",
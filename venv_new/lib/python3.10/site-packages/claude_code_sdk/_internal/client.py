@@ -1,13 +1,18 @@
 """Internal client implementation."""
 
-from collections.abc import AsyncIterable, AsyncIterator
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from contextlib import suppress
 from typing import Any
 
+import anyio
+
 from ..types import (
     ClaudeCodeOptions,
     Message,
 )
-from .message_parser import parse_message
+from .codec import get_codec
+from .deadline import INTERRUPT_GRACE, Deadline
+from .message_parser import message_type_names, parse_message
 from .query import Query
 from .transport import Transport
 from .transport.subprocess_cli import SubprocessCLITransport
@@ -40,8 +45,12 @@ class InternalClient:
         prompt: str | AsyncIterable[dict[str, Any]],
         options: ClaudeCodeOptions,
         transport: Transport | None = None,
+        message_types: Iterable[type[Message]] | None = None,
+        lazy: bool = False,
     ) -> AsyncIterator[Message]:
         """Process a query through transport and Query."""
+        wanted = message_type_names(message_types)
+        deadline = Deadline(options.timeout)
 
         # Use provided transport or create subprocess transport
         if transport is not None:
@@ -49,9 +58,6 @@ class InternalClient:
         else:
             chosen_transport = SubprocessCLITransport(prompt=prompt, options=options)
 
-        # Connect transport
-        await chosen_transport.connect()
-
         # Extract SDK MCP servers from options
         sdk_mcp_servers = {}
         if options.mcp_servers and isinstance(options.mcp_servers, dict):
@@ -69,15 +75,25 @@ class InternalClient:
             if options.hooks
             else None,
             sdk_mcp_servers=sdk_mcp_servers,
+            codec=get_codec(options.json_codec),
+            message_buffer_size=options.message_buffer_size,
+            message_overflow_policy=options.message_overflow_policy,
+            message_overflow_limit=options.message_overflow_limit,
         )
 
+        session_id: str | None = None
         try:
+            # Connect transport
+            with anyio.fail_after(deadline.remaining()):
+                await chosen_transport.connect()
+
             # Start reading messages
             await query.start()
 
             # Initialize if streaming
             if is_streaming:
-                await query.initialize()
+                with anyio.fail_after(deadline.remaining()):
+                    await query.initialize()
 
             # Stream input if it's an AsyncIterable
             if isinstance(prompt, AsyncIterable) and query._tg:
@@ -87,8 +103,24 @@ class InternalClient:
             # For string prompts, the prompt is already passed via CLI args
 
             # Yield parsed messages
-            async for data in query.receive_messages():
-                yield parse_message(data)
+            messages = query.receive_messages()
+            while True:
+                try:
+                    data = await deadline.next(messages)
+                except StopAsyncIteration:
+                    break
+                session_id = data.get("session_id") or session_id
+                if wanted is not None and data.get("type") not in wanted:
+                    continue
+                yield parse_message(data, lazy=lazy)
+
+        except TimeoutError:
+            # Out of time: ask the CLI to stop, then close() terminates it
+            if is_streaming and query._tg:
+                with anyio.move_on_after(INTERRUPT_GRACE), suppress(Exception):
+                    await query.interrupt()
+            if wanted is None or "result" in wanted:
+                yield deadline.timeout_result(session_id)
 
         finally:
             await query.close()
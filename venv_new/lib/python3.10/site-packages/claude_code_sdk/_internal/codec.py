@@ -0,0 +1,145 @@
+"""Pluggable JSON codecs for the stream-json wire protocol."""
+
+import importlib.util
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+CODEC_ENV_VAR = "CLAUDE_SDK_JSON_CODEC"
+
+
+class JSONCodec(ABC):
+    """Encodes and decodes the JSON records exchanged with the CLI."""
+
+    name: str
+
+    @abstractmethod
+    def loads(self, data: bytes | bytearray | str) -> Any:
+        """Decode one JSON record.
+
+        Raises:
+            ValueError: If the data is not valid JSON
+        """
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> str:
+        """Encode an object as a single-line JSON string."""
+
+
+class StdlibCodec(JSONCodec):
+    """Codec backed by the standard library ``json`` module."""
+
+    name = "json"
+
+    def loads(self, data: bytes | bytearray | str) -> Any:
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj)
+
+
+class OrjsonCodec(JSONCodec):
+    """Codec backed by orjson."""
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._orjson = orjson
+
+    def loads(self, data: bytes | bytearray | str) -> Any:
+        return self._orjson.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        try:
+            return self._orjson.dumps(obj).decode()
+        except TypeError:
+            # orjson rejects non-str keys and integers above 64 bits
+            return json.dumps(obj)
+
+
+class MsgspecCodec(JSONCodec):
+    """Codec backed by msgspec."""
+
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        import msgspec
+
+        self._decode = msgspec.json.decode
+        self._encode = msgspec.json.encode
+        self._error = msgspec.DecodeError
+
+    def loads(self, data: bytes | bytearray | str) -> Any:
+        try:
+            return self._decode(data)
+        except self._error as e:
+            raise ValueError(str(e)) from e
+
+    def dumps(self, obj: Any) -> str:
+        try:
+            return self._encode(obj).decode()
+        except TypeError:
+            return json.dumps(obj)
+
+
+_CODECS: dict[str, type[JSONCodec]] = {
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+    "json": StdlibCodec,
+}
+
+# Preference order for "auto"
+_AUTO_ORDER = ("orjson", "msgspec", "json")
+
+_cache: dict[str, JSONCodec] = {}
+
+
+def available_codecs() -> list[str]:
+    """Names of the codecs that can be used in this environment."""
+    return [
+        name
+        for name in _AUTO_ORDER
+        if name == "json" or importlib.util.find_spec(name) is not None
+    ]
+
+
+def get_codec(name: str | None = None) -> JSONCodec:
+    """Return a codec by name.
+
+    Args:
+        name: "auto", "orjson", "msgspec" or "json". When None, the
+            CLAUDE_SDK_JSON_CODEC environment variable is used, defaulting to
+            "auto", which picks the fastest importable codec.
+
+    Returns:
+        A shared codec instance. If the requested codec is not installed, the
+        standard library codec is returned instead.
+
+    Raises:
+        ValueError: If the codec name is unknown
+    """
+    name = (name or os.environ.get(CODEC_ENV_VAR) or "auto").lower()
+    if name in _cache:
+        return _cache[name]
+
+    if name == "auto":
+        codec = _CODECS[available_codecs()[0]]()
+    elif name in _CODECS:
+        try:
+            codec = _CODECS[name]()
+        except ImportError:
+            logger.warning(f"JSON codec '{name}' is not installed, using json")
+            codec = StdlibCodec()
+    else:
+        raise ValueError(
+            f"Unknown JSON codec: {name} (expected one of: auto, {', '.join(_CODECS)})"
+        )
+
+    _cache[name] = codec
+    return codec
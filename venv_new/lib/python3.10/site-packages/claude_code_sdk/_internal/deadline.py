@@ -0,0 +1,64 @@
+"""Wall-clock budgets for queries."""
+
+import time
+from collections.abc import AsyncIterator
+from typing import TypeVar
+
+import anyio
+
+from ..types import ResultMessage
+
+T = TypeVar("T")
+
+# Result subtype of the marker yielded when a query runs out of time
+TIMEOUT_SUBTYPE = "error_timeout"
+
+# How long to wait for the CLI to acknowledge an interrupt after a timeout
+INTERRUPT_GRACE = 5.0
+
+
+class Deadline:
+    """A wall-clock budget that starts when the deadline is created.
+
+    A timeout of None means no limit.
+    """
+
+    __slots__ = ("timeout", "started_at", "_expires_at")
+
+    def __init__(self, timeout: float | None):
+        self.timeout = timeout
+        self.started_at = time.monotonic()
+        self._expires_at = None if timeout is None else self.started_at + timeout
+
+    def remaining(self) -> float | None:
+        """Seconds left, or None when there is no limit."""
+        if self._expires_at is None:
+            return None
+        return max(0.0, self._expires_at - time.monotonic())
+
+    async def next(self, iterator: AsyncIterator[T]) -> T:
+        """Await the next item of an iterator within the remaining budget.
+
+        Raises:
+            TimeoutError: If the budget runs out first
+            StopAsyncIteration: If the iterator is exhausted
+        """
+        with anyio.fail_after(self.remaining()):
+            return await iterator.__anext__()
+
+    def timeout_result(self, session_id: str | None) -> ResultMessage:
+        """Build the ResultMessage that marks a query as timed out.
+
+        Args:
+            session_id: Session id seen so far, so the conversation can be
+                resumed. Empty if the CLI never reported one.
+        """
+        return ResultMessage(
+            subtype=TIMEOUT_SUBTYPE,
+            duration_ms=int((time.monotonic() - self.started_at) * 1000),
+            duration_api_ms=0,
+            is_error=True,
+            num_turns=0,
+            session_id=session_id or "",
+            result=f"Timed out after {self.timeout}s",
+        )
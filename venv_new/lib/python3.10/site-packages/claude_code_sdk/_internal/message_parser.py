@@ -1,17 +1,24 @@
 """Message parser for Claude Code SDK responses."""
 
 import logging
+from collections.abc import Iterable
+from dataclasses import fields
 from typing import Any
 
 from .._errors import MessageParseError
 from ..types import (
     AssistantMessage,
     ContentBlock,
+    ContentBlockDelta,
+    InputJsonDelta,
     Message,
     ResultMessage,
+    StreamEvent,
     SystemMessage,
     TextBlock,
+    TextDelta,
     ThinkingBlock,
+    ThinkingDelta,
     ToolResultBlock,
     ToolUseBlock,
     UserMessage,
@@ -20,12 +27,199 @@ from ..types import (
 logger = logging.getLogger(__name__)
 
 
-def parse_message(data: dict[str, Any]) -> Message:
+# Raw "type" field for each message class, used to filter before parsing
+_MESSAGE_TYPE_NAMES: dict[type, str] = {
+    UserMessage: "user",
+    AssistantMessage: "assistant",
+    SystemMessage: "system",
+    ResultMessage: "result",
+    StreamEvent: "stream_event",
+}
+
+
+def message_type_names(
+    message_types: Iterable[type[Message]] | None,
+) -> frozenset[str] | None:
+    """Map message classes to the raw CLI ``type`` values they are parsed from.
+
+    Args:
+        message_types: Message classes to keep, or None to keep everything
+
+    Returns:
+        The set of raw type names, or None when no filter applies
+
+    Raises:
+        ValueError: If a class is not a message type
+    """
+    if message_types is None:
+        return None
+    names = set()
+    for message_type in message_types:
+        for cls, name in _MESSAGE_TYPE_NAMES.items():
+            if issubclass(message_type, cls):
+                names.add(name)
+                break
+        else:
+            raise ValueError(f"Not a message type: {message_type!r}")
+    return frozenset(names)
+
+
+def _parse_content_blocks(
+    blocks: list[dict[str, Any]], include_thinking: bool
+) -> list[ContentBlock]:
+    content_blocks: list[ContentBlock] = []
+    for block in blocks:
+        match block["type"]:
+            case "text":
+                content_blocks.append(TextBlock(text=block["text"]))
+            case "thinking" if include_thinking:
+                content_blocks.append(
+                    ThinkingBlock(
+                        thinking=block["thinking"],
+                        signature=block["signature"],
+                    )
+                )
+            case "tool_use":
+                content_blocks.append(
+                    ToolUseBlock(
+                        id=block["id"],
+                        name=block["name"],
+                        input=block["input"],
+                    )
+                )
+            case "tool_result":
+                content_blocks.append(
+                    ToolResultBlock(
+                        tool_use_id=block["tool_use_id"],
+                        content=block.get("content"),
+                        is_error=block.get("is_error"),
+                    )
+                )
+    return content_blocks
+
+
+def _parse_user_content(data: dict[str, Any]) -> str | list[ContentBlock]:
+    try:
+        content = data["message"]["content"]
+        if isinstance(content, list):
+            return _parse_content_blocks(content, include_thinking=False)
+        return content  # type: ignore[no-any-return]
+    except KeyError as e:
+        raise MessageParseError(
+            f"Missing required field in user message: {e}", data
+        ) from e
+
+
+def _parse_assistant_content(data: dict[str, Any]) -> list[ContentBlock]:
+    try:
+        return _parse_content_blocks(data["message"]["content"], include_thinking=True)
+    except KeyError as e:
+        raise MessageParseError(
+            f"Missing required field in assistant message: {e}", data
+        ) from e
+
+
+# Slot descriptors of the eager classes, used by the lazy subclasses to store
+# content once it has been built
+_USER_CONTENT = UserMessage.__dict__["content"]
+_ASSISTANT_CONTENT = AssistantMessage.__dict__["content"]
+
+
+class _LazyMessage:
+    """Compares and prints a lazy message as the eager class it stands in for.
+
+    The dataclass __eq__ only matches instances of the exact same class, so
+    without this a lazy message would never equal the eager one it parses to.
+    """
+
+    __slots__ = ()
+    _eager: type
+
+    def _values(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, f.name) for f in fields(self._eager))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, self._eager):
+            return NotImplemented
+        values = tuple(getattr(other, f.name) for f in fields(self._eager))
+        return self._values() == values
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return repr(self._eager(*self._values()))
+
+
+class LazyUserMessage(_LazyMessage, UserMessage):
+    """UserMessage that builds its content blocks on first access of ``content``.
+
+    Behaves like UserMessage (including isinstance checks). Parse errors in the
+    content surface as MessageParseError when ``content`` is first read.
+    """
+
+    __slots__ = ("_raw",)
+    _eager = UserMessage
+
+    def __init__(self, data: dict[str, Any]):
+        if "message" not in data:
+            raise MessageParseError(
+                "Missing required field in user message: 'message'", data
+            )
+        self._raw: dict[str, Any] | None = data
+
+    @property  # type: ignore[override]
+    def content(self) -> str | list[ContentBlock]:
+        if self._raw is not None:
+            _USER_CONTENT.__set__(self, _parse_user_content(self._raw))
+            self._raw = None
+        return _USER_CONTENT.__get__(self, UserMessage)  # type: ignore[no-any-return]
+
+    @content.setter
+    def content(self, value: str | list[ContentBlock]) -> None:
+        self._raw = None
+        _USER_CONTENT.__set__(self, value)
+
+
+class LazyAssistantMessage(_LazyMessage, AssistantMessage):
+    """AssistantMessage that builds its content blocks on first access of ``content``.
+
+    Behaves like AssistantMessage (including isinstance checks). Parse errors in
+    the content surface as MessageParseError when ``content`` is first read.
+    """
+
+    __slots__ = ("_raw",)
+    _eager = AssistantMessage
+
+    def __init__(self, data: dict[str, Any]):
+        try:
+            self.model = data["message"]["model"]
+        except KeyError as e:
+            raise MessageParseError(
+                f"Missing required field in assistant message: {e}", data
+            ) from e
+        self._raw: dict[str, Any] | None = data
+
+    @property  # type: ignore[override]
+    def content(self) -> list[ContentBlock]:
+        if self._raw is not None:
+            _ASSISTANT_CONTENT.__set__(self, _parse_assistant_content(self._raw))
+            self._raw = None
+        return _ASSISTANT_CONTENT.__get__(self, AssistantMessage)  # type: ignore[no-any-return]
+
+    @content.setter
+    def content(self, value: list[ContentBlock]) -> None:
+        self._raw = None
+        _ASSISTANT_CONTENT.__set__(self, value)
+
+
+def parse_message(data: dict[str, Any], lazy: bool = False) -> Message:
     """
     Parse message from CLI output into typed Message objects.
 
     Args:
         data: Raw message dictionary from CLI output
+        lazy: Defer building content blocks of user and assistant messages
+            until ``content`` is accessed
 
     Returns:
         Parsed Message object
@@ -45,76 +239,20 @@ def parse_message(data: dict[str, Any]) -> Message:
 
     match message_type:
         case "user":
-            try:
-                if isinstance(data["message"]["content"], list):
-                    user_content_blocks: list[ContentBlock] = []
-                    for block in data["message"]["content"]:
-                        match block["type"]:
-                            case "text":
-                                user_content_blocks.append(
-                                    TextBlock(text=block["text"])
-                                )
-                            case "tool_use":
-                                user_content_blocks.append(
-                                    ToolUseBlock(
-                                        id=block["id"],
-                                        name=block["name"],
-                                        input=block["input"],
-                                    )
-                                )
-                            case "tool_result":
-                                user_content_blocks.append(
-                                    ToolResultBlock(
-                                        tool_use_id=block["tool_use_id"],
-                                        content=block.get("content"),
-                                        is_error=block.get("is_error"),
-                                    )
-                                )
-                    return UserMessage(content=user_content_blocks)
-                return UserMessage(content=data["message"]["content"])
-            except KeyError as e:
-                raise MessageParseError(
-                    f"Missing required field in user message: {e}", data
-                ) from e
+            if lazy:
+                return LazyUserMessage(data)
+            return UserMessage(content=_parse_user_content(data))
 
         case "assistant":
+            if lazy:
+                return LazyAssistantMessage(data)
             try:
-                content_blocks: list[ContentBlock] = []
-                for block in data["message"]["content"]:
-                    match block["type"]:
-                        case "text":
-                            content_blocks.append(TextBlock(text=block["text"]))
-                        case "thinking":
-                            content_blocks.append(
-                                ThinkingBlock(
-                                    thinking=block["thinking"],
-                                    signature=block["signature"],
-                                )
-                            )
-                        case "tool_use":
-                            content_blocks.append(
-                                ToolUseBlock(
-                                    id=block["id"],
-                                    name=block["name"],
-                                    input=block["input"],
-                                )
-                            )
-                        case "tool_result":
-                            content_blocks.append(
-                                ToolResultBlock(
-                                    tool_use_id=block["tool_use_id"],
-                                    content=block.get("content"),
-                                    is_error=block.get("is_error"),
-                                )
-                            )
-
-                return AssistantMessage(
-                    content=content_blocks, model=data["message"]["model"]
-                )
+                model = data["message"]["model"]
             except KeyError as e:
                 raise MessageParseError(
                     f"Missing required field in assistant message: {e}", data
                 ) from e
+            return AssistantMessage(content=_parse_assistant_content(data), model=model)
 
         case "system":
             try:
@@ -145,5 +283,40 @@ def parse_message(data: dict[str, Any]) -> Message:
                     f"Missing required field in result message: {e}", data
                 ) from e
 
+        case "stream_event":
+            try:
+                event = data["event"]
+                return StreamEvent(
+                    uuid=data["uuid"],
+                    session_id=data["session_id"],
+                    event=event,
+                    parent_tool_use_id=data.get("parent_tool_use_id"),
+                    delta=_parse_delta(event),
+                )
+            except KeyError as e:
+                raise MessageParseError(
+                    f"Missing required field in stream event: {e}", data
+                ) from e
+
         case _:
             raise MessageParseError(f"Unknown message type: {message_type}", data)
+
+
+def _parse_delta(event: dict[str, Any]) -> ContentBlockDelta | None:
+    """Extract a typed delta from a content_block_delta stream event."""
+    if event.get("type") != "content_block_delta":
+        return None
+
+    delta = event["delta"]
+    match delta.get("type"):
+        case "text_delta":
+            return TextDelta(index=event["index"], text=delta["text"])
+        case "thinking_delta":
+            return ThinkingDelta(index=event["index"], thinking=delta["thinking"])
+        case "input_json_delta":
+            return InputJsonDelta(
+                index=event["index"], partial_json=delta["partial_json"]
+            )
+        case _:
+            # e.g. signature_delta: not useful for incremental rendering
+            return None
@@ -0,0 +1,156 @@
+"""FIFO storage for messages the consumer has not made room for yet.
+
+Both classes share one interface: the reader calls :meth:`append` (never
+waits) followed by ``await flush()``, and the forwarder task calls
+``await peek()``, hands the message on and only then calls :meth:`pop`, so the
+overflow stays non-empty, and new messages keep queueing behind the head,
+until the head has actually been delivered.
+"""
+
+import tempfile
+from collections import deque
+from typing import IO, Any
+
+import anyio
+
+from .codec import JSONCodec
+
+# Spilled lines are written and read back in batches of about this many bytes
+_SPILL_CHUNK_BYTES = 256 * 1024
+
+
+class MemoryOverflow:
+    """Overflow kept in memory.
+
+    Unbounded: Query caps it with ``message_overflow_limit``.
+    """
+
+    def __init__(self) -> None:
+        self._messages: deque[dict[str, Any]] = deque()
+        self.spilled = 0
+        self.spill_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def append(self, message: dict[str, Any]) -> None:
+        self._messages.append(message)
+
+    async def flush(self) -> None:
+        pass
+
+    async def peek(self) -> dict[str, Any]:
+        return self._messages[0]
+
+    def pop(self) -> None:
+        self._messages.popleft()
+
+    def close(self) -> None:
+        self._messages.clear()
+
+
+class SpillOverflow:
+    """Overflow written to an anonymous temporary file.
+
+    Appended messages are encoded into an in-memory tail and written to the
+    file as JSON lines once the tail reaches ``chunk_size`` bytes; the head is
+    refilled from the file in chunks of the same size. File I/O runs in a
+    worker thread, so the event loop only encodes and decodes. The order is
+    head, file, tail, and the file is truncated whenever it has been read back
+    completely, so a consumer that catches up releases the disk space.
+    """
+
+    def __init__(
+        self,
+        codec: JSONCodec,
+        directory: str | None = None,
+        chunk_size: int = _SPILL_CHUNK_BYTES,
+    ):
+        self._codec = codec
+        self._directory = directory
+        self._chunk_size = chunk_size
+        self._file: IO[bytes] | None = None
+        # Serializes file access between the reader (flush) and the forwarder (peek)
+        self._lock = anyio.Lock()
+        self._head: deque[dict[str, Any]] = deque()
+        self._tail: list[bytes] = []
+        self._tail_bytes = 0
+        self._read_pos = 0
+        self._write_pos = 0
+        self._count = 0
+        # Messages written to disk since the query started
+        self.spilled = 0
+
+    @property
+    def spill_bytes(self) -> int:
+        """Bytes on disk not read back yet."""
+        return self._write_pos - self._read_pos
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, message: dict[str, Any]) -> None:
+        line = self._codec.dumps(message).encode() + b"\n"
+        self._tail.append(line)
+        self._tail_bytes += len(line)
+        self._count += 1
+
+    async def flush(self) -> None:
+        """Write the tail to disk once it has grown to a full chunk."""
+        if self._tail_bytes < self._chunk_size:
+            return
+        async with self._lock:
+            # The forwarder may have taken the tail while we waited
+            if self._tail_bytes < self._chunk_size:
+                return
+            lines, self._tail, self._tail_bytes = self._tail, [], 0
+            await anyio.to_thread.run_sync(self._write, b"".join(lines))
+            self.spilled += len(lines)
+
+    async def peek(self) -> dict[str, Any]:
+        if not self._head:
+            async with self._lock:
+                if not self._head:
+                    await self._refill()
+        if not self._head:
+            raise IndexError("peek at an empty overflow")
+        return self._head[0]
+
+    def pop(self) -> None:
+        self._head.popleft()
+        self._count -= 1
+
+    async def _refill(self) -> None:
+        if self._write_pos > self._read_pos:
+            lines = await anyio.to_thread.run_sync(self._read)
+        else:
+            # Nothing on disk: the tail never needs to touch it
+            lines, self._tail, self._tail_bytes = self._tail, [], 0
+        self._head.extend(self._codec.loads(line) for line in lines)
+
+    def _write(self, data: bytes) -> None:
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self._directory)
+        self._file.seek(self._write_pos)
+        self._file.write(data)
+        self._file.flush()
+        self._write_pos += len(data)
+
+    def _read(self) -> list[bytes]:
+        assert self._file is not None
+        self._file.seek(self._read_pos)
+        lines = self._file.readlines(self._chunk_size)
+        self._read_pos += sum(len(line) for line in lines)
+        if self._read_pos >= self._write_pos:
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_pos = self._write_pos = 0
+        return lines
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._head.clear()
+        self._tail.clear()
+        self._count = self._tail_bytes = self._read_pos = self._write_pos = 0
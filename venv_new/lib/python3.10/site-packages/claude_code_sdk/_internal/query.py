@@ -1,8 +1,8 @@
 """Query class for handling bidirectional control protocol."""
 
-import json
 import logging
 import os
+import time
 from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable
 from contextlib import suppress
 from typing import TYPE_CHECKING, Any
@@ -14,6 +14,7 @@ from mcp.types import (
     ListToolsRequest,
 )
 
+from .._errors import ClaudeSDKError, CLIConnectionError
 from ..types import (
     PermissionResultAllow,
     PermissionResultDeny,
@@ -23,6 +24,8 @@ from ..types import (
     SDKHookCallbackRequest,
     ToolPermissionContext,
 )
+from .codec import JSONCodec, get_codec
+from .overflow import MemoryOverflow, SpillOverflow
 from .transport import Transport
 
 if TYPE_CHECKING:
@@ -30,6 +33,38 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# Messages that may wait for the consumer in memory before the overflow policy applies
+_MESSAGE_BUFFER_SIZE = 100
+
+OVERFLOW_POLICIES = ("memory", "spill")
+
+# Messages that may wait beyond the buffer before the stream fails
+_MESSAGE_OVERFLOW_LIMIT = 10_000
+
+# Frames that may wait for the writer before write() applies backpressure
+_WRITE_QUEUE_SIZE = 1000
+
+# Upper bounds for the frames coalesced into one transport write
+_MAX_BATCH_FRAMES = 256
+_MAX_BATCH_BYTES = 1024 * 1024
+
+
+class _Frame:
+    """One newline-terminated message waiting for the writer task."""
+
+    __slots__ = ("data", "done", "error")
+
+    def __init__(self, data: str, wait: bool):
+        self.data = data
+        # Only created when the sender waits for the write
+        self.done = anyio.Event() if wait else None
+        self.error: Exception | None = None
+
+    def finish(self, error: Exception | None) -> None:
+        if self.done is not None and not self.done.is_set():
+            self.error = error
+            self.done.set()
+
 
 class Query:
     """Handles bidirectional control protocol on top of Transport.
@@ -53,6 +88,11 @@ class Query:
         | None = None,
         hooks: dict[str, list[dict[str, Any]]] | None = None,
         sdk_mcp_servers: dict[str, "McpServer"] | None = None,
+        codec: JSONCodec | None = None,
+        write_queue_size: int = _WRITE_QUEUE_SIZE,
+        message_buffer_size: int = _MESSAGE_BUFFER_SIZE,
+        message_overflow_policy: str = "memory",
+        message_overflow_limit: int | None = _MESSAGE_OVERFLOW_LIMIT,
     ):
         """Initialize Query with transport and callbacks.
 
@@ -62,12 +102,35 @@ class Query:
             can_use_tool: Optional callback for tool permission requests
             hooks: Optional hook configurations
             sdk_mcp_servers: Optional SDK MCP server instances
+            codec: JSON codec for outgoing messages (defaults to get_codec())
+            write_queue_size: Frames that may wait for the writer task before
+                write() blocks
+            message_buffer_size: Messages that may wait for the consumer in
+                memory
+            message_overflow_policy: Where data messages wait once the
+                consumer falls further behind: "memory" holds them in an
+                unbounded in-memory queue, "spill" writes them to a temporary
+                file. Either way the transport is read on, so control requests
+                and responses are handled as they arrive.
+            message_overflow_limit: Messages that may wait beyond the buffer.
+                Once exceeded, reading stops and the stream ends with an
+                error. None removes the limit.
         """
+        if message_overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"message_overflow_policy must be one of {OVERFLOW_POLICIES}, "
+                f"got {message_overflow_policy!r}"
+            )
+        if message_buffer_size < 1:
+            raise ValueError("message_buffer_size must be at least 1")
+        if message_overflow_limit is not None and message_overflow_limit < 0:
+            raise ValueError("message_overflow_limit must not be negative")
         self.transport = transport
         self.is_streaming_mode = is_streaming_mode
         self.can_use_tool = can_use_tool
         self.hooks = hooks or {}
         self.sdk_mcp_servers = sdk_mcp_servers or {}
+        self._codec = codec or get_codec()
 
         # Control protocol state
         self.pending_control_responses: dict[str, anyio.Event] = {}
@@ -76,14 +139,39 @@ class Query:
         self.next_callback_id = 0
         self._request_counter = 0
 
-        # Message stream
+        # Message stream. Control messages are routed by the reader and never
+        # queue here; data the consumer has no room for goes to the overflow,
+        # which a forwarder task feeds into the stream in order. The reader
+        # never waits for the consumer.
         self._message_send, self._message_receive = anyio.create_memory_object_stream[
             dict[str, Any]
-        ](max_buffer_size=100)
+        ](max_buffer_size=message_buffer_size)
+        self._message_buffer_size = message_buffer_size
+        self._overflow_policy = message_overflow_policy
+        self._overflow_limit = message_overflow_limit
+        self._overflow: MemoryOverflow | SpillOverflow = (
+            SpillOverflow(self._codec)
+            if message_overflow_policy == "spill"
+            else MemoryOverflow()
+        )
+        self._forwarder_wakeup = anyio.Event()
+        self._backlog_high_water = 0
+
+        # Outgoing frames: one writer task owns transport.write once started
+        self._write_send, self._write_receive = anyio.create_memory_object_stream[
+            _Frame
+        ](max_buffer_size=write_queue_size)
+        self._writer_started = False
+        self._write_error: Exception | None = None
+        self._writes = 0
+        self._frames_written = 0
+
         self._tg: anyio.abc.TaskGroup | None = None
         self._initialized = False
         self._closed = False
         self._initialization_result: dict[str, Any] | None = None
+        # Seconds spent on the initialize handshake
+        self.initialize_duration: float | None = None
 
     async def initialize(self) -> dict[str, Any] | None:
         """Initialize control protocol if in streaming mode.
@@ -120,17 +208,142 @@ class Query:
             "hooks": hooks_config if hooks_config else None,
         }
 
+        started_at = time.monotonic()
         response = await self._send_control_request(request)
+        self.initialize_duration = time.monotonic() - started_at
         self._initialized = True
         self._initialization_result = response  # Store for later access
         return response
 
+    def stats(self) -> dict[str, Any]:
+        """Snapshot of the message stream and control protocol state.
+
+        Returns:
+            Dictionary with ``message_backlog`` (messages read from the CLI
+            but not yet consumed, including the overflow),
+            ``message_backlog_high_water`` (the largest backlog so far),
+            ``message_buffer_size``, ``message_overflow`` (messages beyond the
+            buffer), ``message_overflow_policy``, ``message_overflow_limit``,
+            ``spilled_messages`` and
+            ``spill_bytes`` (messages written to disk so far and the bytes
+            not read back yet), ``pending_control_requests``,
+            ``write_queue_depth`` (frames waiting for the writer),
+            ``write_queue_size``, and ``writes`` and ``frames_written``
+            (transport writes and the frames they carried)
+        """
+        stream = self._message_send.statistics()
+        write_queue = self._write_send.statistics()
+        overflow = len(self._overflow)
+        return {
+            "message_backlog": stream.current_buffer_used + overflow,
+            "message_backlog_high_water": self._backlog_high_water,
+            "message_buffer_size": stream.max_buffer_size,
+            "message_overflow": overflow,
+            "message_overflow_policy": self._overflow_policy,
+            "message_overflow_limit": self._overflow_limit,
+            "spilled_messages": self._overflow.spilled,
+            "spill_bytes": self._overflow.spill_bytes,
+            "pending_control_requests": len(self.pending_control_responses),
+            "write_queue_depth": write_queue.current_buffer_used,
+            "write_queue_size": write_queue.max_buffer_size,
+            "writes": self._writes,
+            "frames_written": self._frames_written,
+        }
+
     async def start(self) -> None:
         """Start reading messages from transport."""
         if self._tg is None:
             self._tg = anyio.create_task_group()
             await self._tg.__aenter__()
             self._tg.start_soon(self._read_messages)
+            self._tg.start_soon(self._forward_overflow)
+            if self.is_streaming_mode:
+                self._tg.start_soon(self._write_frames)
+                self._writer_started = True
+
+    async def write(self, data: str, wait: bool = True) -> None:
+        """Send newline-terminated messages to the CLI.
+
+        Once the query has started, frames are queued for a single writer task
+        that coalesces everything pending into one transport write, so
+        concurrent control responses, stream_input and client.query() never
+        interleave or cost a write each. Blocks while the queue is full.
+
+        Args:
+            data: One or more JSON lines, each ending in a newline
+            wait: Return only after the frame has been written, raising if the
+                write failed. With False, return once it is queued.
+
+        Raises:
+            CLIConnectionError: If the query is closed or the write failed
+            Exception: The transport's error, if an earlier write failed
+        """
+        if not self._writer_started:
+            await self.transport.write(data)
+            return
+        if self._closed:
+            raise CLIConnectionError("Query is closed")
+        if self._write_error is not None:
+            raise self._write_error
+        frame = _Frame(data, wait)
+        try:
+            try:
+                self._write_send.send_nowait(frame)
+            except anyio.WouldBlock:
+                await self._write_send.send(frame)
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError) as e:
+            raise CLIConnectionError("Query is closed") from e
+        if frame.done is None:
+            return
+        await frame.done.wait()
+        if frame.error is not None:
+            raise frame.error
+
+    async def _drain_writes(self) -> None:
+        """Wait until every frame queued so far has been written."""
+        if self._writer_started and not self._closed:
+            with suppress(CLIConnectionError):
+                await self.write("")
+
+    async def _write_frames(self) -> None:
+        """Writer task: batch queued frames into single transport writes."""
+        batch: list[_Frame] = []
+        try:
+            async for frame in self._write_receive:
+                batch = [frame]
+                size = len(frame.data)
+                while len(batch) < _MAX_BATCH_FRAMES and size < _MAX_BATCH_BYTES:
+                    try:
+                        frame = self._write_receive.receive_nowait()
+                    except anyio.WouldBlock:
+                        break
+                    batch.append(frame)
+                    size += len(frame.data)
+
+                data = "".join(frame.data for frame in batch)
+                error: Exception | None = None
+                if data:
+                    try:
+                        await self.transport.write(data)
+                        self._writes += 1
+                        self._frames_written += sum(1 for f in batch if f.data)
+                    except Exception as e:
+                        # The transport is unusable after a failed write
+                        error = self._write_error = e
+                for frame in batch:
+                    frame.finish(error)
+        finally:
+            # Release anyone still waiting on a frame that will not be written
+            self._write_send.close()
+            while True:
+                try:
+                    batch.append(self._write_receive.receive_nowait())
+                except (anyio.WouldBlock, anyio.EndOfStream):
+                    break
+            for frame in batch:
+                frame.finish(CLIConnectionError("Query is closed"))
+            # Senders still blocked on a full queue get BrokenResourceError
+            self._write_receive.close()
 
     async def _read_messages(self) -> None:
         """Read messages from transport and route them."""
@@ -170,7 +383,8 @@ class Query:
                     continue
 
                 # Regular SDK messages go to the stream
-                await self._message_send.send(message)
+                self._enqueue(message, bounded=True)
+                await self._overflow.flush()
 
         except anyio.get_cancelled_exc_class():
             # Task was cancelled - this is expected behavior
@@ -179,10 +393,62 @@ class Query:
         except Exception as e:
             logger.error(f"Fatal error in message reader: {e}")
             # Put error in stream so iterators can handle it
-            await self._message_send.send({"type": "error", "error": str(e)})
+            self._enqueue({"type": "error", "error": str(e)})
         finally:
             # Always signal end of stream
-            await self._message_send.send({"type": "end"})
+            self._enqueue({"type": "end"})
+
+    def _enqueue(self, message: dict[str, Any], bounded: bool = False) -> None:
+        """Queue a message for the consumer without waiting for room.
+
+        Raises:
+            ClaudeSDKError: If ``bounded`` and the overflow already holds
+                ``message_overflow_limit`` messages (the end and error markers
+                are queued unbounded, so the stream can always end)
+        """
+        if not self._overflow:
+            try:
+                self._message_send.send_nowait(message)
+            except anyio.WouldBlock:
+                pass
+            else:
+                # Once the buffer has filled up, only the overflow can raise the mark
+                if self._backlog_high_water < self._message_buffer_size:
+                    used = self._message_send.statistics().current_buffer_used
+                    self._backlog_high_water = max(self._backlog_high_water, used)
+                return
+        if (
+            bounded
+            and self._overflow_limit is not None
+            and len(self._overflow) >= self._overflow_limit
+        ):
+            raise ClaudeSDKError(
+                f"More than {self._overflow_limit} messages are waiting for the "
+                "consumer (message_overflow_limit)"
+            )
+        self._overflow.append(message)
+        self._backlog_high_water = max(
+            self._backlog_high_water, self._message_buffer_size + len(self._overflow)
+        )
+        self._forwarder_wakeup.set()
+
+    async def _forward_overflow(self) -> None:
+        """Move overflowed messages into the stream as the consumer makes room."""
+        try:
+            while True:
+                while not self._overflow:
+                    self._forwarder_wakeup = anyio.Event()
+                    await self._forwarder_wakeup.wait()
+                # Pop only once the message is in the stream: until then the
+                # reader keeps queueing behind it instead of overtaking it
+                message = await self._overflow.peek()
+                try:
+                    self._message_send.send_nowait(message)
+                except anyio.WouldBlock:
+                    await self._message_send.send(message)
+                self._overflow.pop()
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            pass
 
     async def _handle_control_request(self, request: SDKControlRequest) -> None:
         """Handle incoming control request from CLI."""
@@ -266,7 +532,7 @@ class Query:
                     "response": response_data,
                 },
             }
-            await self.transport.write(json.dumps(success_response) + "\n")
+            await self.write(self._codec.dumps(success_response) + "\n", wait=False)
 
         except Exception as e:
             # Send error response
@@ -278,7 +544,8 @@ class Query:
                     "error": str(e),
                 },
             }
-            await self.transport.write(json.dumps(error_response) + "\n")
+            with suppress(CLIConnectionError):
+                await self.write(self._codec.dumps(error_response) + "\n", wait=False)
 
     async def _send_control_request(self, request: dict[str, Any]) -> dict[str, Any]:
         """Send control request to CLI and wait for response."""
@@ -300,7 +567,11 @@ class Query:
             "request": request,
         }
 
-        await self.transport.write(json.dumps(control_request) + "\n")
+        try:
+            await self.write(self._codec.dumps(control_request) + "\n")
+        except Exception:
+            self.pending_control_responses.pop(request_id, None)
+            raise
 
         # Wait for response
         try:
@@ -448,8 +719,9 @@ class Query:
             async for message in stream:
                 if self._closed:
                     break
-                await self.transport.write(json.dumps(message) + "\n")
-            # After all messages sent, end input
+                await self.write(self._codec.dumps(message) + "\n", wait=False)
+            # After all messages sent (and anything queued before them), end input
+            await self._drain_writes()
             await self.transport.end_input()
         except Exception as e:
             logger.debug(f"Error streaming input: {e}")
@@ -473,6 +745,7 @@ class Query:
             # Wait for task group to complete cancellation
             with suppress(anyio.get_cancelled_exc_class()):
                 await self._tg.__aexit__(None, None, None)
+        self._overflow.close()
         await self.transport.close()
 
     # Make Query an async iterator
@@ -0,0 +1,80 @@
+"""Incremental text accumulation for partial message streams."""
+
+from ..types import Message, StreamEvent, TextDelta
+
+
+class TextAccumulator:
+    """Accumulates text deltas from StreamEvent messages.
+
+    Deltas are kept as a list of chunks and only joined when ``text`` is read,
+    so appending a token never copies the text received so far. The joined
+    result is cached until the next append.
+
+    Example:
+        ```python
+        acc = TextAccumulator()
+        async for message in query(
+            prompt="Tell me a story",
+            options=ClaudeCodeOptions(include_partial_messages=True),
+        ):
+            if chunk := acc.feed(message):
+                print(chunk, end="", flush=True)
+        print(acc.text)
+        ```
+    """
+
+    __slots__ = ("_chunks", "_length", "_joined")
+
+    def __init__(self) -> None:
+        self._chunks: list[str] = []
+        self._length = 0
+        self._joined: str | None = ""
+
+    def feed(self, message: Message) -> str | None:
+        """Consume a message, returning the new text chunk if it carried one.
+
+        A ``message_start`` event marks a new assistant message and resets the
+        accumulator. Messages other than text deltas are ignored.
+        """
+        if not isinstance(message, StreamEvent):
+            return None
+        if message.event.get("type") == "message_start":
+            self.reset()
+            return None
+        if isinstance(message.delta, TextDelta):
+            self.append(message.delta.text)
+            return message.delta.text
+        return None
+
+    def append(self, chunk: str) -> None:
+        """Append a text chunk."""
+        if chunk:
+            self._chunks.append(chunk)
+            self._length += len(chunk)
+            self._joined = None
+
+    def reset(self) -> None:
+        """Discard all accumulated text."""
+        self._chunks.clear()
+        self._length = 0
+        self._joined = ""
+
+    @property
+    def chunks(self) -> list[str]:
+        """Chunks of the text so far (collapsed into one once ``text`` is read)."""
+        return self._chunks
+
+    @property
+    def text(self) -> str:
+        """The full text accumulated so far."""
+        if self._joined is None:
+            self._joined = "".join(self._chunks)
+            # Collapse so the next read after further appends joins less
+            self._chunks[:] = [self._joined]
+        return self._joined
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __str__(self) -> str:
+        return self.text
@@ -0,0 +1,133 @@
+"""Background reaper for CLI process groups that outlive their transport."""
+
+import logging
+import os
+import signal
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# How often the reaper thread re-checks the groups it is watching
+_POLL_INTERVAL = 1.0
+
+# Give up on a group after this long (e.g. a member stuck in uninterruptible sleep)
+_MAX_WATCH_SECONDS = 300.0
+
+
+@dataclass
+class _Group:
+    pgid: int
+    leader_exited: Callable[[], bool]
+    kill_at: float
+    give_up_at: float
+
+
+class ProcessGroupReaper:
+    """Kills and reaps leftover members of CLI process groups.
+
+    The CLI runs in its own session so that MCP stdio servers and shell tools it
+    starts share its process group. When the transport closes, members that
+    survived SIGTERM are handed to this reaper, which sends SIGKILL to the group
+    once its grace period expires and collects any zombies that were reparented
+    to this process (e.g. when the server runs as PID 1 in a container).
+
+    The group leader itself is reaped by the event loop's child watcher, so
+    ``waitpid`` is only used on the group after the leader has exited.
+    """
+
+    def __init__(self) -> None:
+        self._groups: dict[int, _Group] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def watch(
+        self, pgid: int, leader_exited: Callable[[], bool], grace: float = 0.0
+    ) -> None:
+        """Watch a process group until it is empty.
+
+        Args:
+            pgid: Process group id (the pid of the CLI)
+            leader_exited: Returns True once the group leader has been reaped
+            grace: Seconds to wait before killing the remaining members
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._groups[pgid] = _Group(
+                pgid, leader_exited, now + grace, now + _MAX_WATCH_SECONDS
+            )
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="claude-sdk-reaper", daemon=True
+                )
+                self._thread.start()
+
+    def pending(self) -> int:
+        """Number of process groups still being watched."""
+        with self._lock:
+            return len(self._groups)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                groups = list(self._groups.values())
+                if not groups:
+                    self._thread = None
+                    return
+            for group in groups:
+                if self._sweep(group):
+                    with self._lock:
+                        self._groups.pop(group.pgid, None)
+            time.sleep(_POLL_INTERVAL)
+
+    def _sweep(self, group: _Group) -> bool:
+        """Kill and reap one group. Returns True when it no longer needs watching."""
+        now = time.monotonic()
+        if now >= group.give_up_at:
+            logger.warning(f"Giving up on process group {group.pgid}")
+            return True
+
+        killed = now >= group.kill_at
+        try:
+            os.killpg(group.pgid, signal.SIGKILL if killed else 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            # The pgid was reused by a process we do not own
+            return True
+
+        if not group.leader_exited():
+            return False
+        has_children = _reap_group(group.pgid)
+        # After SIGKILL, whatever is left is either our child (reaped on a later
+        # sweep) or a zombie that belongs to another parent
+        return killed and not has_children
+
+
+def _reap_group(pgid: int) -> bool:
+    """Collect zombie children of this process that belong to the group.
+
+    Returns:
+        True if children of this process are still running in the group
+    """
+    while True:
+        try:
+            pid, _ = os.waitpid(-pgid, os.WNOHANG)
+        except ChildProcessError:
+            return False
+        if pid == 0:
+            return True
+        logger.debug(f"Reaped orphaned process {pid} from group {pgid}")
+
+
+_reaper: ProcessGroupReaper | None = None
+
+
+def get_reaper() -> ProcessGroupReaper:
+    """Return the process-wide reaper."""
+    global _reaper
+    if _reaper is None:
+        _reaper = ProcessGroupReaper()
+    return _reaper
@@ -4,6 +4,8 @@ import json
 import logging
 import os
 import shutil
+import signal
+import time
 from collections.abc import AsyncIterable, AsyncIterator
 from contextlib import suppress
 from pathlib import Path
@@ -11,17 +13,93 @@ from subprocess import PIPE
 from typing import Any
 
 import anyio
-from anyio.abc import Process
-from anyio.streams.text import TextReceiveStream, TextSendStream
+from anyio.abc import ByteReceiveStream, Process
+from anyio.streams.text import TextSendStream
 
 from ..._errors import CLIConnectionError, CLINotFoundError, ProcessError
 from ..._errors import CLIJSONDecodeError as SDKJSONDecodeError
 from ...types import ClaudeCodeOptions
+from ..codec import JSONCodec, get_codec
 from . import Transport
+from .process_reaper import get_reaper
+from .wiretap import WireTap, resolve_trace_path
 
 logger = logging.getLogger(__name__)
 
-_MAX_BUFFER_SIZE = 1024 * 1024  # 1MB buffer limit
+_DEFAULT_MAX_BUFFER_SIZE = 1024 * 1024  # 1MB buffer limit
+
+# How long to wait for the CLI to exit after SIGKILL before leaving it to the reaper
+_KILL_WAIT_TIMEOUT = 2.0
+
+# Run the CLI in its own process group so its children can be signalled with it
+_USE_PROCESS_GROUP = hasattr(os, "killpg")
+
+
+async def _read_json_lines(
+    stream: AsyncIterable[bytes],
+    max_buffer_size: int,
+    codec: JSONCodec,
+    tap: WireTap | None = None,
+) -> AsyncIterator[Any]:
+    """Frame a byte stream on newlines and decode each record exactly once.
+
+    Chunks are appended to a single growable buffer and only the newly received
+    bytes are scanned for the record delimiter, so a large record split across
+    many reads costs linear time instead of re-parsing the whole prefix on every
+    chunk.
+
+    Args:
+        stream: Raw stdout byte chunks
+        max_buffer_size: Maximum size in bytes of a single record
+        codec: JSON codec used to decode each record
+        tap: Wire tap that records each raw line before it is decoded
+
+    Yields:
+        Decoded JSON values, one per non-blank line
+    """
+    buffer = bytearray()
+    scan_from = 0
+
+    async for chunk in stream:
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", scan_from)) != -1:
+            if end - start > max_buffer_size:
+                _raise_too_large(end - start, max_buffer_size)
+            record = buffer[start:end]
+            start = scan_from = end + 1
+            if record.strip():
+                if tap is not None:
+                    tap.record("in", record)
+                yield _decode_record(record, codec)
+        if start:
+            del buffer[:start]
+        scan_from = len(buffer)
+
+        if len(buffer) > max_buffer_size:
+            _raise_too_large(len(buffer), max_buffer_size)
+
+    # The final record may not be newline-terminated
+    if buffer.strip():
+        if tap is not None:
+            tap.record("in", bytes(buffer))
+        yield _decode_record(buffer, codec)
+
+
+def _raise_too_large(size: int, max_buffer_size: int) -> None:
+    raise SDKJSONDecodeError(
+        f"JSON message exceeded maximum buffer size of {max_buffer_size} bytes",
+        ValueError(f"Buffer size {size} exceeds limit {max_buffer_size}"),
+    )
+
+
+def _decode_record(record: bytearray, codec: JSONCodec) -> Any:
+    try:
+        return codec.loads(record)
+    except ValueError as e:
+        raise SDKJSONDecodeError(
+            record[:200].decode("utf-8", errors="replace"), e
+        ) from e
 
 
 class SubprocessCLITransport(Transport):
@@ -36,13 +114,25 @@ class SubprocessCLITransport(Transport):
         self._prompt = prompt
         self._is_streaming = not isinstance(prompt, str)
         self._options = options
+        cli_path = cli_path or options.cli_path
         self._cli_path = str(cli_path) if cli_path else self._find_cli()
         self._cwd = str(options.cwd) if options.cwd else None
         self._process: Process | None = None
-        self._stdout_stream: TextReceiveStream | None = None
+        self._stdout_stream: ByteReceiveStream | None = None
+        self._max_buffer_size = (
+            options.max_buffer_size
+            if options.max_buffer_size is not None
+            else _DEFAULT_MAX_BUFFER_SIZE
+        )
+        self._codec = get_codec(options.json_codec)
         self._stdin_stream: TextSendStream | None = None
+        self._close_timeout = options.close_timeout
         self._ready = False
         self._exit_error: Exception | None = None  # Track process exit errors
+        self._trace_path = options.trace_path
+        self._tap: WireTap | None = None
+        # Seconds spent spawning the CLI process in connect()
+        self.connect_duration: float | None = None
 
     def _find_cli(self) -> str:
         """Find Claude Code CLI binary."""
@@ -115,6 +205,9 @@ class SubprocessCLITransport(Transport):
         if self._options.resume:
             cmd.extend(["--resume", self._options.resume])
 
+        if self._options.include_partial_messages:
+            cmd.append("--include-partial-messages")
+
         if self._options.settings:
             cmd.extend(["--settings", self._options.settings])
 
@@ -169,6 +262,7 @@ class SubprocessCLITransport(Transport):
             return
 
         cmd = self._build_command()
+        started_at = time.monotonic()
         try:
             # Merge environment variables: system -> user -> SDK required
             process_env = {
@@ -195,10 +289,11 @@ class SubprocessCLITransport(Transport):
                 stderr=stderr_dest,
                 cwd=self._cwd,
                 env=process_env,
+                start_new_session=_USE_PROCESS_GROUP,
             )
 
             if self._process.stdout:
-                self._stdout_stream = TextReceiveStream(self._process.stdout)
+                self._stdout_stream = self._process.stdout
 
             # Setup stdin for streaming mode
             if self._is_streaming and self._process.stdin:
@@ -207,7 +302,13 @@ class SubprocessCLITransport(Transport):
                 # String mode: close stdin immediately
                 await self._process.stdin.aclose()
 
+            if trace_file := resolve_trace_path(self._trace_path):
+                self._tap = WireTap(
+                    trace_file, {"command": cmd, "pid": self._process.pid}
+                )
+
             self._ready = True
+            self.connect_duration = time.monotonic() - started_at
 
         except FileNotFoundError as e:
             # Check if the error comes from the working directory or the CLI
@@ -232,30 +333,72 @@ class SubprocessCLITransport(Transport):
         if not self._process:
             return
 
-        # Close streams
-        if self._stdin_stream:
-            with suppress(Exception):
-                await self._stdin_stream.aclose()
-            self._stdin_stream = None
-
-        if self._process.stdin:
-            with suppress(Exception):
-                await self._process.stdin.aclose()
+        # Close stdin, terminate the process (and everything it started) with a
+        # bounded wait, then finish the trace. Shielded so that closing from a
+        # cancelled task still cleans up and the trace file is not left truncated.
+        with anyio.CancelScope(shield=True):
+            if self._stdin_stream:
+                with suppress(Exception):
+                    await self._stdin_stream.aclose()
+                self._stdin_stream = None
 
-        # Terminate and wait for process
-        if self._process.returncode is None:
-            with suppress(ProcessLookupError):
-                self._process.terminate()
-                # Wait for process to finish with timeout
+            if self._process.stdin:
                 with suppress(Exception):
-                    # Just try to wait, but don't block if it fails
-                    await self._process.wait()
+                    await self._process.stdin.aclose()
+
+            await self._terminate(self._process)
+            if self._tap:
+                await anyio.to_thread.run_sync(self._tap.close)
+                self._tap = None
 
         self._process = None
         self._stdout_stream = None
         self._stdin_stream = None
         self._exit_error = None
 
+    async def _terminate(self, process: Process) -> None:
+        """Stop the CLI: SIGTERM, wait close_timeout, then SIGKILL.
+
+        On POSIX the whole process group is signalled, so MCP stdio servers and
+        shell tools started by the CLI are stopped with it. Members that are
+        still running afterwards are handed to the background reaper.
+        """
+        pgid = process.pid if _USE_PROCESS_GROUP else None
+        deadline = anyio.current_time() + self._close_timeout
+
+        # Signal the group even if the CLI already exited: its children may not have
+        self._send_signal(process, pgid, kill=False)
+        if process.returncode is None:
+            with anyio.move_on_after(self._close_timeout), suppress(Exception):
+                await process.wait()
+
+        if process.returncode is None:
+            logger.warning(
+                f"Claude Code (pid {process.pid}) did not exit within "
+                f"{self._close_timeout}s of SIGTERM, sending SIGKILL"
+            )
+            self._send_signal(process, pgid, kill=True)
+            with anyio.move_on_after(_KILL_WAIT_TIMEOUT), suppress(Exception):
+                await process.wait()
+
+        if pgid is not None:
+            grace = max(0.0, deadline - anyio.current_time())
+            get_reaper().watch(
+                pgid, lambda: process.returncode is not None, grace=grace
+            )
+
+    @staticmethod
+    def _send_signal(process: Process, pgid: int | None, kill: bool) -> None:
+        if pgid is not None:
+            with suppress(ProcessLookupError, PermissionError):
+                os.killpg(pgid, signal.SIGKILL if kill else signal.SIGTERM)
+        elif process.returncode is None:
+            with suppress(ProcessLookupError):
+                if kill:
+                    process.kill()
+                else:
+                    process.terminate()
+
     async def write(self, data: str) -> None:
         """Write raw data to the transport."""
         # Check if ready (like TypeScript)
@@ -274,6 +417,9 @@ class SubprocessCLITransport(Transport):
                 f"Cannot write to process that exited with error: {self._exit_error}"
             ) from self._exit_error
 
+        if self._tap:
+            self._tap.record("out", data)
+
         try:
             await self._stdin_stream.send(data)
         except Exception as e:
@@ -299,52 +445,19 @@ class SubprocessCLITransport(Transport):
         if not self._process or not self._stdout_stream:
             raise CLIConnectionError("Not connected")
 
-        json_buffer = ""
-
         # Process stdout messages
         try:
-            async for line in self._stdout_stream:
-                line_str = line.strip()
-                if not line_str:
-                    continue
-
-                # Accumulate partial JSON until we can parse it
-                # Note: TextReceiveStream can truncate long lines, so we need to buffer
-                # and speculatively parse until we get a complete JSON object
-                json_lines = line_str.split("\n")
-
-                for json_line in json_lines:
-                    json_line = json_line.strip()
-                    if not json_line:
-                        continue
-
-                    # Keep accumulating partial JSON until we can parse it
-                    json_buffer += json_line
-
-                    if len(json_buffer) > _MAX_BUFFER_SIZE:
-                        json_buffer = ""
-                        raise SDKJSONDecodeError(
-                            f"JSON message exceeded maximum buffer size of {_MAX_BUFFER_SIZE} bytes",
-                            ValueError(
-                                f"Buffer size {len(json_buffer)} exceeds limit {_MAX_BUFFER_SIZE}"
-                            ),
-                        )
-
-                    try:
-                        data = json.loads(json_buffer)
-                        json_buffer = ""
-                        yield data
-                    except json.JSONDecodeError:
-                        # We are speculatively decoding the buffer until we get
-                        # a full JSON object. If there is an actual issue, we
-                        # raise an error after _MAX_BUFFER_SIZE.
-                        continue
+            async for data in _read_json_lines(
+                self._stdout_stream, self._max_buffer_size, self._codec, self._tap
+            ):
+                yield data
 
         except anyio.ClosedResourceError:
             pass
         except GeneratorExit:
-            # Client disconnected
-            pass
+            # Client disconnected: close() reaps the process. Awaiting it here
+            # would fail while the generator is being finalized.
+            return
 
         # Check process completion and handle errors
         try:
@@ -352,6 +465,9 @@ class SubprocessCLITransport(Transport):
         except Exception:
             returncode = -1
 
+        if self._tap and returncode is not None:
+            self._tap.record_exit(returncode)
+
         # Use exit code for error detection
         if returncode is not None and returncode != 0:
             self._exit_error = ProcessError(
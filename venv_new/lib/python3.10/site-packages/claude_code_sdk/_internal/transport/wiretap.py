@@ -0,0 +1,322 @@
+"""Record raw stream-json traffic to a trace file and replay it as a transport."""
+
+import gzip
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+import anyio
+
+from ..._errors import CLIConnectionError, ProcessError
+from ..codec import JSONCodec, get_codec
+from . import Transport
+
+logger = logging.getLogger(__name__)
+
+TRACE_ENV_VAR = "CLAUDE_SDK_TRACE"
+
+TRACE_VERSION = 1
+
+# Records waiting for the writer thread; more than this are dropped, not blocked on
+_MAX_PENDING = 10000
+
+_file_counter = itertools.count(1)
+
+_STOP = object()
+
+
+def resolve_trace_path(path: str | Path | None) -> Path | None:
+    """Pick the trace file for a new transport.
+
+    Args:
+        path: ``ClaudeCodeOptions.trace_path``; the CLAUDE_SDK_TRACE environment
+            variable is used when None. If it names a directory, every
+            transport writes its own file in it.
+
+    Returns:
+        The file to write, or None if tracing is disabled
+    """
+    path = path or os.environ.get(TRACE_ENV_VAR)
+    if not path:
+        return None
+    path = Path(path)
+    if path.is_dir():
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = f"trace-{stamp}-{os.getpid()}-{next(_file_counter)}.jsonl.gz"
+        return path / name
+    return path
+
+
+class WireTap:
+    """Tees the lines exchanged with the CLI into a gzip-compressed JSONL trace.
+
+    The transport calls :meth:`record` for every raw line it reads from stdout
+    and every string it writes to stdin. Recording only timestamps the line and
+    puts it on a queue; decoding, serialization and compression happen on a
+    writer thread so the event loop never waits for the disk. If the writer
+    falls more than ``max_pending`` records behind, new records are dropped and
+    counted instead.
+
+    The first record describes the trace (``"dir": "meta"``); the others are
+    ``{"t": seconds_since_start, "dir": "in" | "out", "line": "..."}``, plus a
+    final ``{"dir": "exit", "code": N}`` when the CLI's exit code is known.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        metadata: dict[str, Any] | None = None,
+        max_pending: int = _MAX_PENDING,
+    ):
+        self.path = Path(path)
+        self.dropped = 0
+        self._started_at = time.monotonic()
+        self._queue: queue.Queue[Any] = queue.Queue(max_pending)
+        self._closed = False
+        header = {
+            "dir": "meta",
+            "version": TRACE_VERSION,
+            "started_at": time.time(),
+            **(metadata or {}),
+        }
+        self._thread = threading.Thread(
+            target=self._run, args=(header,), name="claude-sdk-wiretap", daemon=True
+        )
+        self._thread.start()
+
+    def record(self, direction: str, line: bytes | bytearray | str) -> None:
+        """Queue one line read from ("in") or written to ("out") the CLI."""
+        self._put((time.monotonic() - self._started_at, direction, line))
+
+    def record_exit(self, code: int) -> None:
+        """Queue the CLI's exit code."""
+        self._put((time.monotonic() - self._started_at, "exit", code))
+
+    def _put(self, item: tuple[float, str, Any]) -> None:
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """Write the queued records and close the file (blocks until done)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self.dropped:
+            logger.warning(f"Wire tap dropped {self.dropped} records for {self.path}")
+
+    def _run(self, header: dict[str, Any]) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(self.path, "wt", encoding="utf-8") as f:
+                f.write(json.dumps(header) + "\n")
+                while True:
+                    item = self._queue.get()
+                    if item is _STOP:
+                        return
+                    f.write(self._format(item))
+                    # Flush whenever the queue runs dry so a crash loses little
+                    if self._queue.empty():
+                        f.flush()
+        except Exception as e:
+            logger.warning(f"Wire tap for {self.path} stopped: {e}")
+            self._closed = True
+
+    @staticmethod
+    def _format(item: tuple[float, str, Any]) -> str:
+        t, direction, payload = item
+        if direction == "exit":
+            return json.dumps({"t": round(t, 6), "dir": "exit", "code": payload}) + "\n"
+        if isinstance(payload, (bytes, bytearray)):
+            payload = payload.decode("utf-8", errors="replace")
+        lines = [line for line in payload.split("\n") if line.strip()]
+        return "".join(
+            json.dumps({"t": round(t, 6), "dir": direction, "line": line}) + "\n"
+            for line in lines
+        )
+
+
+def read_trace(path: str | Path) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """Load a trace written by :class:`WireTap`.
+
+    Returns:
+        The metadata record and the remaining records in order
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records or records[0].get("dir") != "meta":
+        raise ValueError(f"{path} is not a wire tap trace")
+    return records[0], records[1:]
+
+
+class ReplayTransport(Transport):
+    """Plays a recorded trace back to the SDK in place of the CLI.
+
+    Lines the CLI wrote ("in" records) are yielded from :meth:`read_messages`
+    with their recorded spacing divided by ``speed`` (``None`` means as fast as
+    possible). Output is kept causal: a line is only delivered after the SDK
+    has written as many user messages and control requests as the recording
+    had at that point, so the replay waits for ``client.query()`` and for
+    ``initialize`` just like the real CLI would.
+
+    The SDK generates fresh ids for its control requests, so the n-th control
+    request written during replay is matched with the n-th recorded one and
+    the ids in the recorded ``control_response`` lines are rewritten to the
+    live ids. Control requests that the CLI sent (permission checks, hook
+    callbacks, MCP calls) are replayed as recorded and answered by the live
+    callbacks. Everything else the SDK writes is accepted and discarded.
+
+    Example:
+        >>> transport = ReplayTransport("slow-session.jsonl.gz", speed=10)
+        >>> async with ClaudeSDKClient(options, transport=transport) as client:
+        ...     await client.query("anything")
+        ...     async for message in client.receive_response():
+        ...         ...
+    """
+
+    def __init__(
+        self,
+        trace_path: str | Path,
+        speed: float | None = 1.0,
+        codec: JSONCodec | None = None,
+    ):
+        """Initialize the replay.
+
+        Args:
+            trace_path: Trace file written by :class:`WireTap`
+            speed: Playback speed multiplier, or None for no delays
+            codec: JSON codec for decoding lines (defaults to get_codec())
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive or None")
+        self.trace_path = Path(trace_path)
+        self.speed = speed
+        self.metadata: dict[str, Any] = {}
+        self._codec = codec or get_codec()
+        self._records: list[dict[str, Any]] = []
+        self._exit_code = 0
+        self._ready = False
+        self._closed = False
+        # Recorded control request ids in the order they were written
+        self._recorded_request_ids: list[str] = []
+        self._request_ids: dict[str, str] = {}
+        self._written = {"user": 0, "control_request": 0}
+        self._progress = anyio.Event()
+
+    async def connect(self) -> None:
+        if self._ready:
+            return
+        self.metadata, records = await anyio.to_thread.run_sync(
+            read_trace, self.trace_path
+        )
+        gate = {"user": 0, "control_request": 0}
+        gate_t = 0.0
+        for record in records:
+            direction = record.get("dir")
+            if direction == "out":
+                message = self._codec.loads(record["line"])
+                kind = message.get("type")
+                if kind in gate:
+                    gate[kind] += 1
+                    gate_t = record["t"]
+                    if kind == "control_request":
+                        self._recorded_request_ids.append(message.get("request_id"))
+            elif direction == "in":
+                self._records.append({**record, "gate": dict(gate), "gate_t": gate_t})
+            elif direction == "exit":
+                self._exit_code = record.get("code") or 0
+        self._ready = True
+
+    async def write(self, data: str) -> None:
+        if not self._ready or self._closed:
+            raise CLIConnectionError("ReplayTransport is not ready for writing")
+        for line in data.split("\n"):
+            if not line.strip():
+                continue
+            message = self._codec.loads(line)
+            kind = message.get("type")
+            if kind not in self._written:
+                continue
+            if kind == "control_request":
+                index = self._written[kind]
+                if index < len(self._recorded_request_ids):
+                    recorded_id = self._recorded_request_ids[index]
+                    self._request_ids[recorded_id] = message.get("request_id")
+            self._written[kind] += 1
+        self._notify()
+
+    def _notify(self) -> None:
+        self._progress.set()
+        self._progress = anyio.Event()
+
+    async def end_input(self) -> None:
+        pass
+
+    def read_messages(self) -> AsyncIterator[dict[str, Any]]:
+        return self._read_messages_impl()
+
+    async def _read_messages_impl(self) -> AsyncIterator[dict[str, Any]]:
+        if not self._ready:
+            raise CLIConnectionError("Not connected")
+
+        # Live clock and recorded time of the last delivered (or unblocked) line
+        live_anchor = time.monotonic()
+        recorded_anchor = 0.0
+        for record in self._records:
+            if not self._gate_open(record["gate"]):
+                while not self._gate_open(record["gate"]):
+                    if self._closed:
+                        return
+                    await self._progress.wait()
+                live_anchor = time.monotonic()
+                recorded_anchor = max(recorded_anchor, record["gate_t"])
+            if self._closed:
+                return
+
+            if self.speed is not None:
+                due = live_anchor + (record["t"] - recorded_anchor) / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await anyio.sleep(delay)
+                live_anchor = max(due, live_anchor)
+            recorded_anchor = record["t"]
+
+            yield self._remap(self._codec.loads(record["line"]))
+
+        if self._exit_code:
+            raise ProcessError(
+                f"Command failed with exit code {self._exit_code}",
+                exit_code=self._exit_code,
+                stderr="Replayed from trace",
+            )
+
+    def _gate_open(self, gate: dict[str, int]) -> bool:
+        return all(self._written[kind] >= count for kind, count in gate.items())
+
+    def _remap(self, message: dict[str, Any]) -> dict[str, Any]:
+        if message.get("type") == "control_response":
+            response = message.get("response", {})
+            live_id = self._request_ids.get(response.get("request_id"))
+            if live_id is not None:
+                response["request_id"] = live_id
+        return message
+
+    async def close(self) -> None:
+        self._ready = False
+        self._closed = True
+        self._notify()
+
+    def is_ready(self) -> bool:
+        return self._ready
@@ -1,12 +1,18 @@
 """Claude SDK Client for interacting with Claude Code."""
 
-import json
 import os
-from collections.abc import AsyncIterable, AsyncIterator
-from typing import Any
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from contextlib import suppress
+from typing import TYPE_CHECKING, Any
+
+import anyio
 
 from ._errors import CLIConnectionError
-from .types import ClaudeCodeOptions, Message, ResultMessage
+from ._internal.codec import get_codec
+from .types import ClaudeCodeOptions, Message
+
+if TYPE_CHECKING:
+    from ._internal.transport import Transport
 
 
 class ClaudeSDKClient:
@@ -91,13 +97,26 @@ class ClaudeSDKClient:
         ```
     """
 
-    def __init__(self, options: ClaudeCodeOptions | None = None):
-        """Initialize Claude SDK client."""
+    def __init__(
+        self,
+        options: ClaudeCodeOptions | None = None,
+        transport: "Transport | None" = None,
+    ):
+        """Initialize Claude SDK client.
+
+        Args:
+            options: Configuration options
+            transport: Custom transport to use instead of starting the CLI
+                (e.g. a ReplayTransport)
+        """
         if options is None:
             options = ClaudeCodeOptions()
         self.options = options
+        self._custom_transport = transport
+        self._codec = get_codec(options.json_codec)
         self._transport: Any | None = None
         self._query: Any | None = None
+        self._deadline: Any | None = None
         os.environ["CLAUDE_CODE_ENTRYPOINT"] = "sdk-py-client"
 
     def _convert_hooks_to_internal_format(
@@ -119,8 +138,14 @@ class ClaudeSDKClient:
     async def connect(
         self, prompt: str | AsyncIterable[dict[str, Any]] | None = None
     ) -> None:
-        """Connect to Claude with a prompt or message stream."""
+        """Connect to Claude with a prompt or message stream.
 
+        Raises:
+            CLIConnectionError: If the CLI cannot be started, or if spawning and
+                initializing it takes longer than ``options.timeout``
+        """
+
+        from ._internal.deadline import Deadline
         from ._internal.query import Query
         from ._internal.transport.subprocess_cli import SubprocessCLITransport
 
@@ -134,11 +159,23 @@ class ClaudeSDKClient:
 
         actual_prompt = _empty_stream() if prompt is None else prompt
 
-        self._transport = SubprocessCLITransport(
-            prompt=actual_prompt,
-            options=self.options,
-        )
-        await self._transport.connect()
+        if self._custom_transport is not None:
+            self._transport = self._custom_transport
+        else:
+            self._transport = SubprocessCLITransport(
+                prompt=actual_prompt,
+                options=self.options,
+            )
+        deadline = Deadline(self.options.timeout)
+        try:
+            with anyio.fail_after(deadline.remaining()):
+                await self._transport.connect()
+        except TimeoutError as e:
+            await self._transport.close()
+            self._transport = None
+            raise CLIConnectionError(
+                f"Timed out after {self.options.timeout}s starting Claude Code"
+            ) from e
 
         # Extract SDK MCP servers from options
         sdk_mcp_servers = {}
@@ -156,28 +193,59 @@ class ClaudeSDKClient:
             if self.options.hooks
             else None,
             sdk_mcp_servers=sdk_mcp_servers,
+            codec=self._codec,
+            message_buffer_size=self.options.message_buffer_size,
+            message_overflow_policy=self.options.message_overflow_policy,
+            message_overflow_limit=self.options.message_overflow_limit,
         )
 
         # Start reading messages and initialize
         await self._query.start()
-        await self._query.initialize()
+        try:
+            with anyio.fail_after(deadline.remaining()):
+                await self._query.initialize()
+        except TimeoutError as e:
+            await self.disconnect()
+            raise CLIConnectionError(
+                f"Timed out after {self.options.timeout}s initializing Claude Code"
+            ) from e
+
+        # The budget of a response given as the initial prompt
+        self._deadline = Deadline(self.options.timeout)
 
         # If we have an initial prompt stream, start streaming it
         if prompt is not None and isinstance(prompt, AsyncIterable) and self._query._tg:
             self._query._tg.start_soon(self._query.stream_input, prompt)
 
-    async def receive_messages(self) -> AsyncIterator[Message]:
-        """Receive all messages from Claude."""
+    async def receive_messages(
+        self,
+        message_types: Iterable[type[Message]] | None = None,
+        lazy: bool = False,
+    ) -> AsyncIterator[Message]:
+        """Receive all messages from Claude.
+
+        Args:
+            message_types: Optional message classes to yield. Other messages
+                are dropped before they are parsed.
+            lazy: If True, user and assistant messages build their content
+                blocks only when ``content`` is first accessed.
+        """
         if not self._query:
             raise CLIConnectionError("Not connected. Call connect() first.")
 
-        from ._internal.message_parser import parse_message
+        from ._internal.message_parser import message_type_names, parse_message
 
+        wanted = message_type_names(message_types)
         async for data in self._query.receive_messages():
-            yield parse_message(data)
+            if wanted is not None and data.get("type") not in wanted:
+                continue
+            yield parse_message(data, lazy=lazy)
 
     async def query(
-        self, prompt: str | AsyncIterable[dict[str, Any]], session_id: str = "default"
+        self,
+        prompt: str | AsyncIterable[dict[str, Any]],
+        session_id: str = "default",
+        timeout: float | None = None,
     ) -> None:
         """
         Send a new request in streaming mode.
@@ -185,10 +253,18 @@ class ClaudeSDKClient:
         Args:
             prompt: Either a string message or an async iterable of message dictionaries
             session_id: Session identifier for the conversation
+            timeout: Wall-clock budget in seconds for this response, enforced by
+                receive_response(). Defaults to ``options.timeout``.
         """
         if not self._query or not self._transport:
             raise CLIConnectionError("Not connected. Call connect() first.")
 
+        from ._internal.deadline import Deadline
+
+        self._deadline = Deadline(
+            timeout if timeout is not None else self.options.timeout
+        )
+
         # Handle string prompts
         if isinstance(prompt, str):
             message = {
@@ -197,14 +273,14 @@ class ClaudeSDKClient:
                 "parent_tool_use_id": None,
                 "session_id": session_id,
             }
-            await self._transport.write(json.dumps(message) + "\n")
+            await self._query.write(self._codec.dumps(message) + "\n")
         else:
             # Handle AsyncIterable prompts - stream them
             async for msg in prompt:
                 # Ensure session_id is set on each message
                 if "session_id" not in msg:
                     msg["session_id"] = session_id
-                await self._transport.write(json.dumps(msg) + "\n")
+                await self._query.write(self._codec.dumps(msg) + "\n")
 
     async def interrupt(self) -> None:
         """Send interrupt signal (only works with streaming mode)."""
@@ -237,7 +313,68 @@ class ClaudeSDKClient:
         # Return the initialization result that was already obtained during connect
         return getattr(self._query, "_initialization_result", None)
 
-    async def receive_response(self) -> AsyncIterator[Message]:
+    def get_stats(self) -> dict[str, Any]:
+        """Get timings and buffer state of the connected CLI.
+
+        Returns:
+            Dictionary with:
+            - ``connected``: Whether the client is connected
+            - ``pid``: Process id of the CLI, or None
+            - ``connect_duration``: Seconds spent spawning the CLI
+            - ``initialize_duration``: Seconds spent on the initialize handshake
+            - ``message_backlog``: Messages read from the CLI but not yet received
+            - ``message_backlog_high_water``: Largest backlog since connecting
+            - ``message_buffer_size``: Capacity of the in-memory message buffer
+            - ``message_overflow``: Backlog beyond the buffer (in memory or on
+              disk, depending on ``message_overflow_policy``)
+            - ``message_overflow_policy``: "memory" or "spill"
+            - ``message_overflow_limit``: Most messages the overflow may hold
+              before the stream fails
+            - ``spilled_messages`` / ``spill_bytes``: Messages written to disk so
+              far and the bytes not read back yet
+            - ``pending_control_requests``: Control requests awaiting a response
+            - ``write_queue_depth``: Frames waiting for the stdin writer
+            - ``write_queue_size``: Capacity of the write queue
+            - ``writes`` / ``frames_written``: stdin writes and the messages they
+              carried (more frames than writes means writes were coalesced)
+
+        Example:
+            ```python
+            async with ClaudeSDKClient() as client:
+                stats = client.get_stats()
+                print(f"Spawned in {stats['connect_duration']:.3f}s")
+            ```
+        """
+        process = getattr(self._transport, "_process", None)
+        stats: dict[str, Any] = {
+            "connected": self._query is not None,
+            "pid": process.pid if process is not None else None,
+            "connect_duration": getattr(self._transport, "connect_duration", None),
+            "initialize_duration": None,
+            "message_backlog": 0,
+            "message_backlog_high_water": 0,
+            "message_buffer_size": 0,
+            "message_overflow": 0,
+            "message_overflow_policy": self.options.message_overflow_policy,
+            "message_overflow_limit": self.options.message_overflow_limit,
+            "spilled_messages": 0,
+            "spill_bytes": 0,
+            "pending_control_requests": 0,
+            "write_queue_depth": 0,
+            "write_queue_size": 0,
+            "writes": 0,
+            "frames_written": 0,
+        }
+        if self._query:
+            stats["initialize_duration"] = self._query.initialize_duration
+            stats.update(self._query.stats())
+        return stats
+
+    async def receive_response(
+        self,
+        message_types: Iterable[type[Message]] | None = None,
+        lazy: bool = False,
+    ) -> AsyncIterator[Message]:
         """
         Receive messages from Claude until and including a ResultMessage.
 
@@ -250,6 +387,18 @@ class ClaudeSDKClient:
         - Terminates immediately after yielding a ResultMessage
         - The ResultMessage IS included in the yielded messages
         - If no ResultMessage is received, the iterator continues indefinitely
+        - With ``message_types``, only those messages are yielded, but the
+          iterator still stops at the ResultMessage
+        - If the timeout given to query() (or ``options.timeout``) runs out, the
+          response is interrupted and a ResultMessage with subtype
+          "error_timeout" is yielded. If the CLI does not stop within a grace
+          period, it is terminated and the client can no longer be used.
+
+        Args:
+            message_types: Optional message classes to yield. Other messages
+                are dropped before they are parsed.
+            lazy: If True, user and assistant messages build their content
+                blocks only when ``content`` is first accessed.
 
         Yields:
             Message: Each message received (UserMessage, AssistantMessage, SystemMessage, ResultMessage)
@@ -273,10 +422,50 @@ class ClaudeSDKClient:
             To collect all messages: `messages = [msg async for msg in client.receive_response()]`
             The final message in the list will always be a ResultMessage.
         """
-        async for message in self.receive_messages():
-            yield message
-            if isinstance(message, ResultMessage):
+        if not self._query:
+            raise CLIConnectionError("Not connected. Call connect() first.")
+
+        from ._internal.deadline import Deadline
+        from ._internal.message_parser import message_type_names, parse_message
+
+        wanted = message_type_names(message_types)
+        deadline = self._deadline or Deadline(self.options.timeout)
+        messages = self._query.receive_messages()
+        session_id: str | None = None
+        while True:
+            try:
+                data = await deadline.next(messages)
+            except StopAsyncIteration:
+                return
+            except TimeoutError:
+                await self._stop_response()
+                if wanted is None or "result" in wanted:
+                    yield deadline.timeout_result(session_id)
                 return
+            session_id = data.get("session_id") or session_id
+            msg_type = data.get("type")
+            if wanted is None or msg_type in wanted:
+                yield parse_message(data, lazy=lazy)
+            if msg_type == "result":
+                return
+
+    async def _stop_response(self) -> None:
+        """Interrupt the current response and discard it up to its result.
+
+        Terminates the CLI if it does not stop within the grace period, so a
+        runaway response never leaks into the next query. The client is then
+        no longer usable, but disconnect() must still be called.
+        """
+        from ._internal.deadline import INTERRUPT_GRACE
+
+        with anyio.move_on_after(INTERRUPT_GRACE), suppress(Exception):
+            await self._query.interrupt()
+            async for data in self._query.receive_messages():
+                if data.get("type") == "result":
+                    return
+        # Only the transport: the query's task group belongs to the task that
+        # connected, and its reader finishes once stdout closes
+        await self._transport.close()
 
     async def disconnect(self) -> None:
         """Disconnect from Claude."""
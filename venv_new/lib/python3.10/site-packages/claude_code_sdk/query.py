@@ -1,7 +1,7 @@
 """Query function for one-shot interactions with Claude Code."""
 
 import os
-from collections.abc import AsyncIterable, AsyncIterator
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
 from typing import Any
 
 from ._internal.client import InternalClient
@@ -14,6 +14,8 @@ async def query(
     prompt: str | AsyncIterable[dict[str, Any]],
     options: ClaudeCodeOptions | None = None,
     transport: Transport | None = None,
+    message_types: Iterable[type[Message]] | None = None,
+    lazy: bool = False,
 ) -> AsyncIterator[Message]:
     """
     Query Claude Code for one-shot or unidirectional streaming interactions.
@@ -61,6 +63,10 @@ async def query(
         transport: Optional transport implementation. If provided, this will be used
                   instead of the default transport selection based on options.
                   The transport will be automatically configured with the prompt and options.
+        message_types: Optional message classes to yield (e.g. [ResultMessage]).
+                  Other messages are dropped before they are parsed.
+        lazy: If True, user and assistant messages build their content blocks
+              only when ``content`` is first accessed.
 
     Yields:
         Messages from the conversation
@@ -96,6 +102,15 @@ async def query(
             print(message)
         ```
 
+    Example - Only the final result:
+        ```python
+        async for message in query(
+            prompt="Summarize README.md",
+            message_types=[ResultMessage],
+        ):
+            print(message.result)
+        ```
+
     Example - With custom transport:
         ```python
         from claude_code_sdk import query, Transport
@@ -121,6 +136,10 @@ async def query(
     client = InternalClient()
 
     async for message in client.process_query(
-        prompt=prompt, options=options, transport=transport
+        prompt=prompt,
+        options=options,
+        transport=transport,
+        message_types=message_types,
+        lazy=lazy,
     ):
         yield message
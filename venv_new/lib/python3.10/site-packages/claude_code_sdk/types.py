@@ -150,14 +150,16 @@ McpServerConfig = (
 
 
 # Content block types
-@dataclass
+# Message and content block types are slotted: long sessions can retain
+# hundreds of thousands of them, and slots drop the per-instance __dict__.
+@dataclass(slots=True)
 class TextBlock:
     """Text content block."""
 
     text: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ThinkingBlock:
     """Thinking content block."""
 
@@ -165,7 +167,7 @@ class ThinkingBlock:
     signature: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolUseBlock:
     """Tool use content block."""
 
@@ -174,7 +176,7 @@ class ToolUseBlock:
     input: dict[str, Any]
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolResultBlock:
     """Tool result content block."""
 
@@ -187,14 +189,14 @@ ContentBlock = TextBlock | ThinkingBlock | ToolUseBlock | ToolResultBlock
 
 
 # Message types
-@dataclass
+@dataclass(slots=True)
 class UserMessage:
     """User message."""
 
     content: str | list[ContentBlock]
 
 
-@dataclass
+@dataclass(slots=True)
 class AssistantMessage:
     """Assistant message with content blocks."""
 
@@ -202,7 +204,7 @@ class AssistantMessage:
     model: str
 
 
-@dataclass
+@dataclass(slots=True)
 class SystemMessage:
     """System message with metadata."""
 
@@ -210,7 +212,7 @@ class SystemMessage:
     data: dict[str, Any]
 
 
-@dataclass
+@dataclass(slots=True)
 class ResultMessage:
     """Result message with cost and usage information."""
 
@@ -225,7 +227,50 @@ class ResultMessage:
     result: str | None = None
 
 
-Message = UserMessage | AssistantMessage | SystemMessage | ResultMessage
+# Partial message (stream event) types
+@dataclass(slots=True)
+class TextDelta:
+    """Incremental text for a text content block."""
+
+    index: int
+    text: str
+
+
+@dataclass(slots=True)
+class ThinkingDelta:
+    """Incremental thinking for a thinking content block."""
+
+    index: int
+    thinking: str
+
+
+@dataclass(slots=True)
+class InputJsonDelta:
+    """Incremental JSON fragment of a tool_use block's input."""
+
+    index: int
+    partial_json: str
+
+
+ContentBlockDelta = TextDelta | ThinkingDelta | InputJsonDelta
+
+
+@dataclass(slots=True)
+class StreamEvent:
+    """Raw API stream event, emitted when include_partial_messages is enabled.
+
+    ``delta`` is populated for ``content_block_delta`` events with a known delta
+    type; all other events only carry the raw ``event`` dictionary.
+    """
+
+    uuid: str
+    session_id: str
+    event: dict[str, Any]
+    parent_tool_use_id: str | None = None
+    delta: ContentBlockDelta | None = None
+
+
+Message = UserMessage | AssistantMessage | SystemMessage | ResultMessage | StreamEvent
 
 
 @dataclass
@@ -261,6 +306,52 @@ class ClaudeCodeOptions:
     # Hook configurations
     hooks: dict[str, list[HookMatcher]] | None = None
 
+    # Emit StreamEvent messages with token-level deltas as the model generates
+    include_partial_messages: bool = False
+
+    # Maximum size in bytes of a single stream-json record from the CLI
+    # (defaults to 1MB when None)
+    max_buffer_size: int | None = None
+
+    # JSON codec for the wire protocol: "auto", "orjson", "msgspec" or "json"
+    # (defaults to the CLAUDE_SDK_JSON_CODEC environment variable, then "auto")
+    json_codec: str | None = None
+
+    # Seconds to wait for the CLI to exit after SIGTERM when closing, before it
+    # and the processes it started are killed with SIGKILL
+    close_timeout: float = 5.0
+
+    # Wall-clock budget in seconds covering process spawn, the initialize
+    # handshake and the response. On expiry the run is interrupted and stopped,
+    # and a ResultMessage with subtype "error_timeout" follows the partial output.
+    timeout: float | None = None
+
+    # Path to the Claude Code CLI executable (found on PATH and in the usual
+    # install locations when None). Point it at tools/fake_claude_cli.py to run
+    # without the real CLI.
+    cli_path: str | Path | None = None
+
+    # Record every line exchanged with the CLI to a gzip-compressed JSONL trace
+    # that ReplayTransport can play back. A directory gets one file per process.
+    # (defaults to the CLAUDE_SDK_TRACE environment variable; unset disables it)
+    trace_path: str | Path | None = None
+
+    # Messages read from the CLI that may wait in memory for the consumer
+    message_buffer_size: int = 100
+
+    # Where messages wait once the consumer falls further behind: "memory"
+    # holds them in an unbounded in-memory queue, "spill" writes them to a
+    # temporary file. The CLI's output is read on either way, so control
+    # requests (permission checks, hooks) and responses (interrupt, ...) never
+    # wait behind a slow consumer.
+    message_overflow_policy: Literal["memory", "spill"] = "memory"
+
+    # Messages that may wait beyond message_buffer_size under either policy.
+    # Once exceeded, the CLI's output is no longer read and the stream ends with
+    # an error, so a consumer that stopped reading cannot exhaust memory or
+    # disk. None removes the limit.
+    message_overflow_limit: int | None = 10_000
+
 
 # SDK Control Protocol
 class SDKControlInterruptRequest(TypedDict):